@@ -1,20 +1,43 @@
 from __future__ import annotations
 
 import json
+import functools
 import os
-import tempfile
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import streamlit as st
 import streamlit.components.v1 as components
 from dotenv import load_dotenv, find_dotenv
-from gtts import gTTS
 import google.genai as genai
+from google.genai import types
 
 import qdrant_manager
 import notifier # Import the new notifier module
+import tts
+import warmup
+from phrases import CATEGORY_CONFIGS, OFFLINE_PHRASES
+from prompt_builder import build_suggestion_prompt, get_template, preload_templates
+from resilience import (
+    BACKGROUND,
+    CircuitOpen,
+    generation_breaker,
+    generation_limiter,
+    hedge,
+    hedge_iter,
+    in_context,
+    latency,
+    request_priority,
+    single_flight,
+    spawn,
+    start_status_log,
+)
+from suggestion_cache import SuggestionCache
 
 # --- App bootstrap & Language Configuration -------------------------------- #
 
@@ -22,23 +45,6 @@ PROJECT_ROOT = Path(__file__).resolve().parent
 
 # --- Language and Text Configuration --------------------------------------- #
 
-OFFLINE_PHRASES = {
-    "bn": {
-        "শরীর ও চাহিদা": [
-            {"text": "আমি পানি চাই", "emoji": "💧"},
-            {"text": "আমি ক্ষুধার্ত", "emoji": "🍎"},
-            {"text": "আমি বাথরুমে যেতে চাই", "emoji": "🚽"},
-        ],
-    },
-    "en": {
-        "Body & Needs": [
-            {"text": "I want water", "emoji": "💧"},
-            {"text": "I am hungry", "emoji": "🍎"},
-            {"text": "I need the bathroom", "emoji": "🚽"},
-        ],
-    },
-}
-
 TRANSLATIONS = {
     "bn": {
         "page_title": "বর্ণবন্ধু – সহজ যোগাযোগের মাধ্যম",
@@ -136,21 +142,6 @@ TRANSLATIONS = {
     },
 }
 
-CATEGORY_CONFIGS = {
-    "bn": {
-        "আমার শরীর ও প্রয়োজন": "🍎",
-        "আমার অনুভূতি জানাতে চাই": "💛",
-        "কিছু করতে চাই": "🎨",
-        "সাহায্য ও সুরক্ষা চাই": "🆘",
-    },
-    "en": {
-        "Body & Needs": "🍎",
-        "Feelings & Sensory": "💛",
-        "Activities & People": "🎨",
-        "Help & Safety": "🆘",
-    },
-}
-
 def init_session_state() -> None:
     defaults = {
         "stage": "intro",
@@ -171,6 +162,7 @@ def init_session_state() -> None:
         "predicted_audio_file": None, # New: Store audio file for predicted phrase
         "phrase_predicted": False, # New: Flag to indicate if a phrase has been predicted
         "play_count": 0, # For forcing audio replay
+        "refresh_options": False, # Bypass the suggestion cache for "show more"
     }
     for key, value in defaults.items():
         if key not in st.session_state:
@@ -203,8 +195,64 @@ if not GEMINI_API_KEY:
 
 @st.cache_resource
 def get_gemini_client():
-    return genai.Client(api_key=GEMINI_API_KEY)
+    client = genai.Client(api_key=GEMINI_API_KEY)
+    # Lets the generation circuit breaker find out in the background when Gemini is back
+    generation_breaker.probe = lambda: client.models.generate_content(model=MODEL_NAME, contents="ping")
+    return client
+
+
+SUGGESTION_CACHE_TTL = float(os.getenv("SUGGESTION_CACHE_TTL", "600"))
+SUGGESTION_CACHE_SIZE = int(os.getenv("SUGGESTION_CACHE_SIZE", "512"))
+SUGGESTION_CACHE_PATH = os.getenv("SUGGESTION_CACHE_PATH")  # Set to persist suggestions across restarts
+
+
+@st.cache_resource
+def get_suggestion_cache() -> SuggestionCache:
+    # Shared by every session in this process
+    return SuggestionCache(
+        ttl=SUGGESTION_CACHE_TTL,
+        max_entries=SUGGESTION_CACHE_SIZE,
+        path=Path(SUGGESTION_CACHE_PATH) if SUGGESTION_CACHE_PATH else None,
+    )
+
 
+STREAM_SUGGESTIONS = os.getenv("STREAM_SUGGESTIONS", "1") != "0"  # Render phrases as Gemini streams them
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+PREFETCH_MAX_AGE = float(os.getenv("PREFETCH_MAX_AGE", "300"))  # Seconds before prefetched phrases are regenerated
+
+
+@st.cache_resource
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    # Shared by every session in this process
+    return ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+PERSONALIZATION_BUDGET_MS = float(os.getenv("PERSONALIZATION_BUDGET_MS", "150"))  # Prompt goes out without it after this
+SUGGESTION_DEADLINE_SECONDS = float(os.getenv("SUGGESTION_DEADLINE_SECONDS", "8"))  # Locally ranked phrases after this
+
+
+LOOKUP_WORKERS = int(os.getenv("LOOKUP_WORKERS", "8"))
+
+
+@st.cache_resource
+def get_lookup_executor() -> ThreadPoolExecutor:
+    # Budgeted Qdrant lookups only; Gemini calls get their own threads so
+    # lookups left running past their budget can never hold them up
+    return ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="lookup")
+
+# Schema-constrained JSON output: "auto" uses it only for models that support it, "1"/"0" force it on/off
+GEMINI_JSON_MODE = os.getenv("GEMINI_JSON_MODE", "auto")
+JSON_MODE_MODELS = ("gemini-1.5", "gemini-2", "gemini-3")  # Families accepting response_schema (gemini-pro does not)
+HEDGE_MODEL = os.getenv("HEDGE_MODEL")  # Faster fallback model (e.g. a flash variant); unset disables hedging
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "2"))  # Seconds, until enough latency samples exist
+HEDGE_MIN_SAMPLES = 20
+
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "3"))
+
+
+@st.cache_resource
+def get_tts_executor() -> ThreadPoolExecutor:
+    # Shared by every session in this process; bounds concurrent gTTS calls
+    return ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
 
 
 CHILD_ID = "demo_child"
@@ -221,18 +269,35 @@ def get_current_datetime() -> Dict[str, str]:
         "now": now, # Add the datetime object itself
     }
 
-@st.cache_data(hash_funcs={gTTS: lambda _: None})
-def synthesize_audio(text: str, language: str) -> Optional[str]:
+def synthesize_audio(text: str, language: str) -> Optional[bytes]:
+    # Clip bytes from the shared clip cache; a TTS backend only runs on a miss
     try:
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        gTTS(text=text, lang=language).write_to_fp(tmp)
-        tmp.close()
-        return tmp.name
+        return tts.synthesize(text, language)
     except Exception as exc:
         st.warning(TEXT["warning_audio_gen"].format(exc=exc))
         return None
 
 
+def make_option(index: int, phrase: Dict[str, str], language: str) -> Dict:
+    """A phrase option whose audio starts synthesizing in the background right away"""
+    return {
+        "id": index,
+        **phrase,
+        "audio": get_tts_executor().submit(tts.synthesize, phrase["text"], language),
+    }
+
+
+def option_audio(option: Dict, language: str) -> Optional[bytes]:
+    """Audio for a tapped option: the pre-synthesized clip, else synthesize now"""
+    future = option.get("audio")
+    if future is not None:
+        try:
+            return future.result()
+        except Exception as exc:
+            print(f"Pre-synthesis failed for '{option['text']}': {exc}")
+    return synthesize_audio(option["text"], language)
+
+
 def inject_custom_css() -> None:
     """Inject custom CSS for a child-friendly, playful design."""
     css = """
@@ -753,6 +818,7 @@ def render_header() -> None:
     with col_lang:
         if st.button(TEXT["language_toggle"], key="lang_toggle", help="Toggle language"):
             st.session_state.language = "en" if LANG == "bn" else "bn"
+            cancel_prefetch()
             st.rerun()
 
     # Progress Indicator
@@ -784,34 +850,43 @@ def build_context(category: str) -> Dict[str, str]:
         "day_of_week": datetime_info["day_of_week"],
         "time_of_day": "morning" if datetime_info["now"].hour < 12 else "afternoon" if datetime_info["now"].hour < 17 else "evening",
         "location": location_str if location_str else "Location not available",
+        "location_name": st.session_state.location_name,
         "latitude": str(st.session_state.latitude) if st.session_state.latitude else None,
         "longitude": str(st.session_state.longitude) if st.session_state.longitude else None,
         "last_phrase": st.session_state.get("last_phrase"),
     }
 
 
+def bucket_context(context: Dict[str, str]) -> Dict[str, Optional[str]]:
+    """Coarse view of the context for cache keys (no clock time, GPS rounded to ~1 km)"""
+    latitude, longitude = context.get("latitude"), context.get("longitude")
+    return {
+        "time_of_day": context.get("time_of_day"),
+        "day_of_week": context.get("day_of_week"),
+        "area": f"{float(latitude):.2f},{float(longitude):.2f}" if latitude and longitude else None,
+        "last_phrase": context.get("last_phrase"),
+    }
+
+
 def load_prompt_template(language: str) -> str:
-    prompt_file = PROJECT_ROOT / "prompts" / f"suggestion_prompt_{language}.txt"
-    if prompt_file.exists():
-        return prompt_file.read_text(encoding="utf-8").strip()
-    # Fallback prompt if file is missing
-    return "Generate three short, simple phrases for a non-verbal child."
+    # Read from disk once per process (see prompt_builder)
+    return get_template("suggestion", language).text
 
 def load_predict_intent_prompt_template(language: str) -> str:
-    prompt_file = PROJECT_ROOT / "prompts" / f"predict_intent_prompt_{language}.txt"
-    if prompt_file.exists():
-        return prompt_file.read_text(encoding="utf-8").strip()
-    # Fallback prompt if file is missing
-    return "Rephrase the child's input into a simple, single phrase."
+    return get_template("predict_intent", language).text
 
 
-def parse_model_output(raw_text: str) -> List[Dict[str, str]]:
+def strip_code_fence(raw_text: str) -> str:
+    """Model output without a surrounding ```json fence"""
     cleaned = raw_text.strip()
     if cleaned.startswith("```"):
         cleaned = cleaned.strip("`")
         cleaned = cleaned.split("\n", 1)[-1]
-    
-    data = json.loads(cleaned)
+    return cleaned
+
+
+def parse_model_output(raw_text: str) -> List[Dict[str, str]]:
+    data = json.loads(strip_code_fence(raw_text))
 
     # Handle two possible formats:
     # Format 1: {"phrases": [...]} - dict with phrases key
@@ -829,58 +904,446 @@ def parse_model_output(raw_text: str) -> List[Dict[str, str]]:
     if len(phrases) != 3:
         raise ValueError(f"Expected exactly 3 phrases, got {len(phrases)}")
     
-    result = []
-    for item in phrases:
-        # Handle both formats: dict with "text"/"emoji" or list [text, emoji]
-        if isinstance(item, dict):
-            text = item.get("text", "").strip()
-            emoji = item.get("emoji", "").strip()
-        elif isinstance(item, (list, tuple)) and len(item) >= 2:
-            text = str(item[0]).strip()
-            emoji = str(item[1]).strip()
-        else:
-            raise ValueError(f"Expected dict or [text, emoji] list, got {type(item).__name__}")
-        
-        if not text:
-            raise ValueError("Phrase 'text' field is required and cannot be empty")
-        if not emoji:
-            raise ValueError("Phrase 'emoji' field is required and cannot be empty")
-        
-        result.append({"text": text, "emoji": emoji})
-    
-    return result
+    return [parse_phrase_item(item) for item in phrases]
+
+
+def parse_phrase_item(item) -> Dict[str, str]:
+    # Handle both formats: dict with "text"/"emoji" or list [text, emoji]
+    if isinstance(item, dict):
+        text, emoji = item.get("text", ""), item.get("emoji", "")
+        if not isinstance(text, str) or not isinstance(emoji, str):
+            raise ValueError("Phrase 'text' and 'emoji' fields must be strings")
+        text, emoji = text.strip(), emoji.strip()
+    elif isinstance(item, (list, tuple)) and len(item) >= 2:
+        text = str(item[0]).strip()
+        emoji = str(item[1]).strip()
+    else:
+        raise ValueError(f"Expected dict or [text, emoji] list, got {type(item).__name__}")
 
+    if not text:
+        raise ValueError("Phrase 'text' field is required and cannot be empty")
+    if not emoji:
+        raise ValueError("Phrase 'emoji' field is required and cannot be empty")
 
-def generate_ai_options(category: str, context: Dict[str, str], language: str) -> List[Dict[str, str]]:
-    client = get_gemini_client()
+    return {"text": text, "emoji": emoji}
 
-    prompt_template = load_prompt_template(language)
-    context_lines = [f"{k.replace('_', ' ').title()}: {v}" for k, v in context.items() if v]
 
+class PhraseStreamParser:
+    """
+    Incremental parser for streamed model output.
+    Accepts the same formats as parse_model_output and returns each phrase
+    as soon as its JSON item is complete, without waiting for the rest.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._phrases_depth: Optional[int] = None  # Stack depth inside the phrases array
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, str]]:
+        """Consume a chunk of text and return the phrases it completed"""
+        self._buffer += chunk
+        completed = []
+        while self._pos < len(self._buffer):
+            i, ch = self._pos, self._buffer[self._pos]
+            self._pos += 1
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                # The phrases array is the first array at the top level or inside the top-level object
+                if ch == "[" and self._phrases_depth is None and len(self._stack) <= 1:
+                    self._phrases_depth = len(self._stack) + 1
+                elif len(self._stack) == self._phrases_depth:
+                    self._item_start = i
+                self._stack.append(ch)
+            elif ch in "]}" and self._stack:
+                self._stack.pop()
+                if self._item_start is not None and len(self._stack) == self._phrases_depth:
+                    try:
+                        completed.append(parse_phrase_item(json.loads(self._buffer[self._item_start:self._pos])))
+                    except ValueError as e:
+                        # Drop the bad item; the caller tops up missing phrases
+                        print(f"Skipping invalid phrase: {e}")
+                    self._item_start = None
+        return completed
+
+
+def salvage_phrases(raw_text: str) -> List[Dict[str, str]]:
+    """Lenient counterpart of parse_model_output: the valid phrases (at most three) in raw_text"""
+    return PhraseStreamParser().feed(raw_text)[:3]
+
+
+def iter_stream_phrases(chunks: Iterable[str]) -> Iterator[Dict[str, str]]:
+    """Yield phrases from streamed text chunks as soon as each one is complete"""
+    parser = PhraseStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+
+
+def within_budget(func, budget: float, default, *args, key: str, **kwargs):
+    """
+    Run a lookup in the background, returning `default` if it errors or overruns the budget (seconds).
+    Lookups sharing a key join the one already in flight instead of stacking up behind it.
+    """
+    name = getattr(func, "__name__", "lookup")
+    future = single_flight.submit(key, get_lookup_executor(), in_context(func), *args, **kwargs)
     try:
-        if st.session_state.get("qdrant_initialized"):
-            personalization = qdrant_manager.get_personalization_context(
-                child_id=context["child_id"],
-                category=category,
-                context=context
-            )
-            if personalization:
-                context_lines.append(f"Personalization: {personalization}")
-    except Exception:
-        pass
+        return future.result(timeout=budget)
+    except TimeoutError:
+        # Left running: a late answer still warms the caches for the next request
+        print(f"{name} skipped after {budget * 1000:.0f} ms")
+    except Exception as e:
+        print(f"{name} failed: {e}")
+    return default
 
-    prompt = prompt_template.format(context="\n".join(context_lines))
 
-    try:
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=prompt
+def iter_before_deadline(iterable: Iterable, deadline: float) -> Iterator:
+    """Iterate in a worker thread, raising TimeoutError once time.monotonic() passes the deadline"""
+    items: "queue.Queue" = queue.Queue()
+
+    def pump():
+        try:
+            for item in iterable:
+                items.put((True, item))
+            items.put((False, None))
+        except Exception as e:
+            items.put((False, e))
+
+    spawn(pump)
+    while True:
+        try:
+            more, item = items.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            raise TimeoutError("Suggestion deadline exceeded")
+        if not more:
+            if item is not None:
+                raise item
+            return
+        yield item
+
+
+def rank_local_phrases(category: str, language: str, child_id: str, personalize: bool = True) -> List[Dict[str, str]]:
+    """Best phrases available without Gemini: the child's most used ones, then the offline set"""
+    offline = OFFLINE_PHRASES.get(language, {}).get(category, [])
+    emojis = {p["text"]: p["emoji"] for p in offline}
+    top_phrases = []
+    if personalize:
+        top_phrases = within_budget(
+            qdrant_manager.get_top_phrases_in_category,
+            PERSONALIZATION_BUDGET_MS / 1000,
+            [],
+            child_id,
+            category,
+            limit=3,
+            key=SuggestionCache.make_key(call="top_phrases", child_id=child_id, category=category),
         )
 
-        if not response.text:
-            raise ValueError("Empty Gemini response")
+    ranked = [
+        {"text": text, "emoji": emojis.get(text, CATEGORY_CONFIGS.get(language, {}).get(category, "💬"))}
+        for text in top_phrases
+    ]
+    ranked += [p for p in offline if p["text"] not in top_phrases]
+    return ranked[:3]
+
+
+def degraded_phrases(
+    suggestion_cache: SuggestionCache,
+    cache_key: Optional[str],
+    category: str,
+    language: str,
+    child_id: str,
+    personalize: bool,
+) -> List[Dict[str, str]]:
+    """Phrases without Gemini: an earlier answer for the same inputs, else locally ranked ones"""
+    cached = suggestion_cache.get(cache_key) if cache_key else None
+    return cached or rank_local_phrases(category, language, child_id, personalize)
+
+
+def top_up_phrases(
+    phrases: List[Dict[str, str]],
+    suggestion_cache: SuggestionCache,
+    cache_key: Optional[str],
+    category: str,
+    language: str,
+    child_id: str,
+    personalize: bool,
+) -> List[Dict[str, str]]:
+    """Fill a partial answer up to three phrases from degraded_phrases, skipping duplicates"""
+    if len(phrases) >= 3:
+        return phrases[:3]
+    shown = {p["text"] for p in phrases}
+    extra = degraded_phrases(suggestion_cache, cache_key, category, language, child_id, personalize)
+    return phrases + [p for p in extra if p["text"] not in shown][:3 - len(phrases)]
+
+
+PHRASE_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "text": types.Schema(type=types.Type.STRING),
+        "emoji": types.Schema(type=types.Type.STRING),
+    },
+    required=["text", "emoji"],
+)
+SUGGESTION_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={"phrases": types.Schema(type=types.Type.ARRAY, items=PHRASE_SCHEMA, min_items=3, max_items=3)},
+    required=["phrases"],
+)
+
+
+def json_mode(model: str) -> bool:
+    """Whether to constrain the model's output to a JSON schema (see GEMINI_JSON_MODE)"""
+    if GEMINI_JSON_MODE != "auto":
+        return GEMINI_JSON_MODE != "0"
+    return model.rsplit("/", 1)[-1].startswith(JSON_MODE_MODELS)
+
+
+def _gemini_config(model: str, schema: Optional[types.Schema] = None) -> types.GenerateContentConfig:
+    # The HTTP timeout stops calls that were abandoned at the deadline
+    config = types.GenerateContentConfig(
+        http_options=types.HttpOptions(timeout=int(SUGGESTION_DEADLINE_SECONDS * 1000)),
+    )
+    if schema is not None and json_mode(model):
+        # Constrained decoding: the model can only produce JSON matching the schema
+        config.response_mime_type = "application/json"
+        config.response_schema = schema
+    return config
+
+
+def suggestion_models() -> List[str]:
+    """Models raced for suggestions, primary first"""
+    if HEDGE_MODEL and HEDGE_MODEL != MODEL_NAME:
+        return [MODEL_NAME, HEDGE_MODEL]
+    return [MODEL_NAME]
+
+
+def hedge_delay(kind: str) -> float:
+    """Wait this long for the primary model before hedging: its recent p90"""
+    p90 = latency.percentile(f"{MODEL_NAME}:{kind}", 0.9, min_samples=HEDGE_MIN_SAMPLES)
+    return p90 if p90 is not None else HEDGE_DEFAULT_DELAY
+
+
+def _request_phrases(client, model: str, prompt: str) -> List[Dict[str, str]]:
+    started = time.monotonic()
+    # Sessions sending the same prompt at once share one Gemini call
+    response = single_flight.do(
+        SuggestionCache.make_key(call="generate_content", model=model, prompt=prompt),
+        generation_limiter.wrap(generation_breaker.wrap(client.models.generate_content)),
+        model=model,
+        contents=prompt,
+        config=_gemini_config(model, SUGGESTION_SCHEMA),
+    )
+    latency.record(f"{model}:generate", time.monotonic() - started)
 
+    if not response.text:
+        raise ValueError("Empty Gemini response")
+    try:
         return parse_model_output(response.text)
+    except ValueError as e:  # Includes json.JSONDecodeError
+        phrases = salvage_phrases(response.text)
+        if not phrases:
+            raise
+        print(f"Salvaged {len(phrases)} phrase(s) from invalid model output: {e}")
+        return phrases
+
+
+def _stream_phrases(client, model: str, prompt: str) -> Iterator[Dict[str, str]]:
+    started = time.monotonic()
+    # Sessions sending the same prompt at once follow one shared stream
+    stream = single_flight.do_stream(
+        SuggestionCache.make_key(call="generate_content_stream", model=model, prompt=prompt),
+        generation_limiter.wrap_stream(generation_breaker.wrap_stream(client.models.generate_content_stream)),
+        model=model,
+        contents=prompt,
+        config=_gemini_config(model, SUGGESTION_SCHEMA),
+    )
+    for count, phrase in enumerate(iter_stream_phrases(chunk.text or "" for chunk in stream)):
+        if count == 0:
+            latency.record(f"{model}:stream", time.monotonic() - started)
+        yield phrase
+
+
+def _suggestion_cache_key(
+    suggestion_cache: SuggestionCache,
+    category: str,
+    context: Dict[str, str],
+    language: str,
+    personalize: bool,
+) -> Optional[str]:
+    """
+    Suggestion cache key, read before the personalization lookup.
+    None when the child's history stamp is unavailable: the answer is then neither read from nor written to the cache.
+    """
+    stamp = None
+    if personalize:
+        # The child's newest selection (durable, shared by every worker) changes whenever personalization can
+        stamp = within_budget(
+            qdrant_manager.get_history_stamp,
+            PERSONALIZATION_BUDGET_MS / 1000,
+            None,
+            context["child_id"],
+            category,
+            key=SuggestionCache.make_key(call="history_stamp", child_id=context["child_id"], category=category),
+        )
+        if stamp is None:
+            return None
+    # Identical prompt inputs (with bucketed context) reuse an earlier answer
+    return suggestion_cache.make_key(
+        model=MODEL_NAME,
+        language=language,
+        category=category,
+        context=bucket_context(context),
+        personalization=stamp,
+    )
+
+
+def _suggestion_prompt(
+    category: str,
+    context: Dict[str, str],
+    language: str,
+    personalize: bool,
+) -> Tuple[str, bool]:
+    """Build the prompt; the flag is False when personalization missed its budget (answer not cacheable)"""
+    personalization = ""
+    if personalize:
+        personalization = within_budget(
+            qdrant_manager.get_personalization_context,
+            PERSONALIZATION_BUDGET_MS / 1000,
+            None,
+            child_id=context["child_id"],
+            category=category,
+            context=context,
+            key=SuggestionCache.make_key(
+                call="personalization",
+                key=qdrant_manager.personalization_key(context["child_id"], category, context),
+            ),
+        )
+    prompt, _ = build_suggestion_prompt(language, category, context, personalization or "")
+    return prompt, personalization is not None
+
+
+def generate_suggestions(
+    client,
+    suggestion_cache: SuggestionCache,
+    category: str,
+    context: Dict[str, str],
+    language: str,
+    personalize: bool = True,
+    use_cache: bool = True,
+) -> List[Dict[str, str]]:
+    """Generate phrases for a category without touching the UI; raises on failure"""
+    deadline = time.monotonic() + SUGGESTION_DEADLINE_SECONDS
+    cache_key = _suggestion_cache_key(suggestion_cache, category, context, language, personalize)
+    if use_cache and cache_key:
+        cached = suggestion_cache.get(cache_key)
+        if cached:
+            return cached
+    if not generation_breaker.available():
+        # Gemini keeps failing: don't wait for another error
+        local = degraded_phrases(suggestion_cache, cache_key, category, language, context["child_id"], personalize)
+        if not local:
+            raise CircuitOpen("Gemini generation circuit is open")
+        return local
+
+    prompt, cacheable = _suggestion_prompt(category, context, language, personalize)
+
+    # Race a fallback model if the primary is slower than usual; first valid answer wins
+    calls = [functools.partial(_request_phrases, client, model, prompt) for model in suggestion_models()]
+    future = spawn(hedge, calls, hedge_delay("generate"))
+    try:
+        phrases = future.result(timeout=max(deadline - time.monotonic(), 0))
+    except (TimeoutError, CircuitOpen) as e:
+        local = degraded_phrases(suggestion_cache, cache_key, category, language, context["child_id"], personalize)
+        if not local:
+            raise
+        print(f"Gemini unavailable ({type(e).__name__}); using local phrases")
+        return local
+
+    if len(phrases) < 3:
+        # Only complete model answers are cached
+        return top_up_phrases(phrases, suggestion_cache, cache_key, category, language, context["child_id"], personalize)
+    if cacheable and cache_key:
+        suggestion_cache.put(cache_key, phrases)
+    return phrases
+
+
+def stream_suggestions(
+    client,
+    suggestion_cache: SuggestionCache,
+    category: str,
+    context: Dict[str, str],
+    language: str,
+    personalize: bool = True,
+    use_cache: bool = True,
+) -> Iterator[Dict[str, str]]:
+    """Like generate_suggestions, but yields each phrase as soon as Gemini has streamed it"""
+    deadline = time.monotonic() + SUGGESTION_DEADLINE_SECONDS
+    cache_key = _suggestion_cache_key(suggestion_cache, category, context, language, personalize)
+    if cache_key and (use_cache or not generation_breaker.available()):
+        # A cached answer, also served while the Gemini circuit is open
+        cached = suggestion_cache.get(cache_key)
+        if cached:
+            yield from cached
+            return
+
+    prompt, cacheable = _suggestion_prompt(category, context, language, personalize)
+    phrases = []
+    try:
+        # Race a fallback model if the primary's first phrase is late; the first to emit wins
+        sources = [functools.partial(_stream_phrases, client, model, prompt) for model in suggestion_models()]
+        for phrase in iter_before_deadline(hedge_iter(sources, hedge_delay("stream")), deadline):
+            if len(phrases) == 3:
+                break
+            phrases.append(phrase)
+            yield phrase
+    except (TimeoutError, CircuitOpen):
+        # Top up whatever arrived in time with locally ranked phrases
+        shown = {p["text"] for p in phrases}
+        local = rank_local_phrases(category, language, context["child_id"], personalize)
+        yield from [p for p in local if p["text"] not in shown][:3 - len(phrases)]
+        if not phrases and not local:
+            raise
+        return
+
+    if len(phrases) < 3:
+        # Salvage a short or partly invalid answer instead of failing the whole request
+        full = top_up_phrases(phrases, suggestion_cache, cache_key, category, language, context["child_id"], personalize)
+        if not full:
+            raise ValueError("Expected exactly 3 phrases, got 0")
+        yield from full[len(phrases):]
+        return
+    if cacheable and cache_key:
+        suggestion_cache.put(cache_key, phrases)
+
+
+def generate_ai_options(
+    category: str,
+    context: Dict[str, str],
+    language: str,
+    use_cache: bool = True,
+) -> List[Dict[str, str]]:
+    try:
+        return generate_suggestions(
+            get_gemini_client(),
+            get_suggestion_cache(),
+            category,
+            context,
+            language,
+            personalize=bool(st.session_state.get("qdrant_initialized")),
+            use_cache=use_cache,
+        )
 
     except json.JSONDecodeError as e:
         st.error(TEXT["error_parse_json"].format(e=e))
@@ -895,8 +1358,89 @@ def generate_ai_options(category: str, context: Dict[str, str], language: str) -
         st.stop()
 
 
+def _prefetch_one(cancelled, job: Dict, *args, **kwargs) -> Optional[List[Dict[str, str]]]:
+    # Skip work that was queued before the prefetch was cancelled
+    if cancelled.is_set():
+        return None
+    job["started"] = time.monotonic()
+    # Speculative work yields to requests a child is waiting on
+    with request_priority(BACKGROUND):
+        return generate_suggestions(*args, **kwargs)
+
+
+def start_prefetch(language: str) -> None:
+    """Generate suggestions for every category in the background"""
+    prefetch = st.session_state.get("prefetch")
+    if prefetch and prefetch["language"] != language:
+        cancel_prefetch()
+        prefetch = None
+    if not prefetch:
+        prefetch = {"language": language, "cancelled": threading.Event(), "jobs": {}}
+
+    now = time.time()
+    jobs = prefetch["jobs"]
+    for category in CATEGORY_CONFIGS[language]:
+        job = jobs.get(category)
+        if job and now - job["queued"] < PREFETCH_MAX_AGE:
+            continue
+        job = {"queued": now, "started": None}
+        job["future"] = get_prefetch_executor().submit(
+            _prefetch_one,
+            prefetch["cancelled"],
+            job,
+            get_gemini_client(),
+            get_suggestion_cache(),
+            category,
+            build_context(category),
+            language,
+            personalize=bool(st.session_state.get("qdrant_initialized")),
+        )
+        jobs[category] = job
+    st.session_state.prefetch = prefetch
+
+
+def cancel_prefetch() -> None:
+    """Drop queued and in-flight prefetches (e.g. on language change)"""
+    prefetch = st.session_state.get("prefetch")
+    if prefetch:
+        prefetch["cancelled"].set()
+        for job in prefetch["jobs"].values():
+            job["future"].cancel()
+    st.session_state.prefetch = None
+
+
+def take_prefetched(category: str, language: str) -> Optional[List[Dict[str, str]]]:
+    """
+    Claim the prefetched phrases for a category. A job still queued is
+    dropped (the caller asks Gemini itself, at interactive priority); one
+    already running is waited on for at most the rest of its deadline.
+    """
+    prefetch = st.session_state.get("prefetch")
+    if not prefetch or prefetch["language"] != language:
+        return None
+    job = prefetch["jobs"].pop(category, None)
+    if job is None or job["future"].cancelled() or time.time() - job["queued"] >= PREFETCH_MAX_AGE:
+        return None
+    if job["future"].cancel():
+        # Still behind other sessions' background work
+        return None
+    started = job["started"] or time.monotonic()
+    try:
+        return job["future"].result(timeout=max(started + SUGGESTION_DEADLINE_SECONDS - time.monotonic(), 0))
+    except TimeoutError:
+        print(f"Prefetch for {category} overran its deadline")
+        return None
+    except Exception as e:
+        print(f"Prefetch for {category} failed: {e}")
+        return None
+
+
 def predict_intent(child_input: str, language: str) -> Dict[str, str]:
+    """The phrase the child most likely means; their own words if Gemini is unavailable or answers badly"""
     client = get_gemini_client()
+    if not generation_breaker.available():
+        # Gemini keeps failing: speak the child's own words
+        return {"text": child_input, "emoji": "💬"}
     # Load the prompt template
     prompt_template = load_predict_intent_prompt_template(language)
     
@@ -915,48 +1459,78 @@ def predict_intent(child_input: str, language: str) -> Dict[str, str]:
     prompt = prompt_template.format(context="\n".join(context_lines), child_input=child_input)
 
     try:
-        response = client.models.generate_content(
+        response = single_flight.do(
+            SuggestionCache.make_key(call="generate_content", model=MODEL_NAME, prompt=prompt),
+            generation_limiter.wrap(generation_breaker.wrap(client.models.generate_content)),
             model=MODEL_NAME,
-            contents=prompt
+            contents=prompt,
+            config=_gemini_config(MODEL_NAME, PHRASE_SCHEMA),
         )
 
         if not response.text:
             raise ValueError("Empty Gemini response")
-        
-        parsed_response = json.loads(
-            response.text.strip()
-            .replace("```json", "")
-            .replace("```", "")
-        )
-        if not isinstance(parsed_response, dict) or "text" not in parsed_response or "emoji" not in parsed_response:
-            raise ValueError("Invalid JSON format from Gemini. Expected {'text': '...', 'emoji': '...'}")
-
-        return parsed_response
-
-    except json.JSONDecodeError as e:
-        st.error(f"Failed to parse Gemini response for intent prediction as JSON: {e}")
-        st.stop()
-    except ValueError as e:
-        st.error(f"Invalid response format from Gemini for intent prediction: {e}")
-        st.stop()
+        return parse_phrase_item(json.loads(strip_code_fence(response.text)))
     except Exception as e:
-        st.error(f"Error calling Gemini API for intent prediction: {e}")
-        st.stop()
+        # Speak the child's own words rather than stopping the page
+        print(f"Intent prediction failed ({type(e).__name__}: {e}); using the child's words")
+        return {"text": child_input, "emoji": "💬"}
 
 
 def fetch_options(category: str, language: str) -> None:
     context = build_context(category)
+    # "Show more" asks for fresh phrases instead of the cached ones
+    use_cache = not st.session_state.get("refresh_options", False)
+    st.session_state.refresh_options = False
     try:
-        phrases = generate_ai_options(category, context, language)
+        phrases = take_prefetched(category, language) if use_cache else None
+        if not phrases:
+            phrases = generate_ai_options(category, context, language, use_cache=use_cache)
     except Exception:
         phrases = OFFLINE_PHRASES.get(language, {}).get(category, [])
 
     if not phrases:
         return
-    st.session_state.options = [{"id": i, **p} for i, p in enumerate(phrases)]
+    st.session_state.options = [make_option(i, p, language) for i, p in enumerate(phrases)]
+    st.session_state.previous_stage = st.session_state.stage # Store current stage
+    st.session_state.stage = "phrases"
+
+
+
+def _stream_with_fallback(stream: Iterator[Dict[str, str]], category: str, language: str) -> Iterator[Dict[str, str]]:
+    emitted = 0
+    try:
+        for phrase in stream:
+            emitted += 1
+            yield phrase
+    except Exception as e:
+        print(f"Streaming suggestions failed: {e}")
+        if not emitted:
+            yield from OFFLINE_PHRASES.get(language, {}).get(category, [])
+
+
+def stream_options(category: str, language: str) -> None:
+    """Show the phrase stage right away and add each phrase as it streams in"""
+    use_cache = not st.session_state.get("refresh_options", False)
+    st.session_state.refresh_options = False
+    phrases = take_prefetched(category, language) if use_cache else None
+
+    st.session_state.options = [make_option(i, p, language) for i, p in enumerate(phrases or [])]
     st.session_state.previous_stage = st.session_state.stage # Store current stage
     st.session_state.stage = "phrases"
+    if phrases:
+        render_phrase_options()
+        return
 
+    stream = stream_suggestions(
+        get_gemini_client(),
+        get_suggestion_cache(),
+        category,
+        build_context(category),
+        language,
+        personalize=bool(st.session_state.get("qdrant_initialized")),
+        use_cache=use_cache,
+    )
+    render_phrase_options(stream=_stream_with_fallback(stream, category, language))
 
 
 def reset_flow() -> None:
@@ -1024,59 +1598,71 @@ def render_categories() -> None:
         st.session_state.stage = "text_input_stage"
         st.rerun()
 
-def render_phrase_options() -> None:
-    st.markdown(f"## {TEXT['tap_sentence_title']}")
+def render_phrase_button(option: Dict[str, str]) -> None:
+    label = (
+        option["emoji"]
+        if st.session_state.emoji_only
+        else f"{option['emoji']}  {option['text']}"
+    )
 
-    for option in st.session_state.options:
+    if st.button(
+        label,
+        key=f"phrase_{option['id']}",
+        use_container_width=True
+    ):
+        text = option["text"]
 
-        label = (
-            option["emoji"]
-            if st.session_state.emoji_only
-            else f"{option['emoji']}  {option['text']}"
-        )
+        # Usually synthesized already, while the options were on screen
+        audio_file = option_audio(option, LANG)
+
+        # 🔊 PLAY IMMEDIATELY
+        if audio_file:
+            st.audio(audio_file, format=tts.mime_type(audio_file), autoplay=True)
 
-        if st.button(
-            label,
-            key=f"phrase_{option['id']}",
-            use_container_width=True
-        ):
-            text = option["text"]
+        # Store last phrase (still useful)
+        st.session_state.last_phrase = text
 
-            # Generate audio
-            audio_file = synthesize_audio(text, LANG)
+        # Notify parent
+        notifier.send_notification(CHILD_ID, text)
 
-            # 🔊 PLAY IMMEDIATELY
-            if audio_file:
-                st.audio(audio_file, autoplay=True)
+        # Queue for Qdrant (written behind in batches, never blocks the tap)
+        try:
+            if st.session_state.get("qdrant_initialized"):
+                qdrant_manager.enqueue_phrase(
+                    child_id=CHILD_ID,
+                    category=st.session_state.selected_category,
+                    phrase=text,
+                    context=build_context(st.session_state.selected_category),
+                )
+        except Exception:
+            pass
 
-            # Store last phrase (still useful)
-            st.session_state.last_phrase = text
+        # Storing last phrase, notifying parent, and storing in Qdrant will still occur.
 
-            # Notify parent
-            notifier.send_notification(CHILD_ID, text)
+        # We explicitly do NOT change the stage to "voice" and do NOT call st.rerun()
+        # to keep the user on the current phrase options page after audio plays.
+        # This addresses the bug where pressing a button leads to a new page.
 
-            # Store in Qdrant (unchanged)
-            try:
-                if st.session_state.get("qdrant_initialized"):
-                    qdrant_manager.store_phrase(
-                        child_id=CHILD_ID,
-                        category=st.session_state.selected_category,
-                        phrase=text,
-                        context=build_context(st.session_state.selected_category),
-                    )
-            except Exception:
-                pass
 
-            # Storing last phrase, notifying parent, and storing in Qdrant will still occur.
+def render_phrase_options(stream: Optional[Iterator[Dict[str, str]]] = None) -> None:
+    st.markdown(f"## {TEXT['tap_sentence_title']}")
 
-            # We explicitly do NOT change the stage to "voice" and do NOT call st.rerun()
-            # to keep the user on the current phrase options page after audio plays.
-            # This addresses the bug where pressing a button leads to a new page.
+    for option in st.session_state.options:
+        render_phrase_button(option)
+
+    if stream is not None:
+        # Each button is tappable as soon as it is drawn; a tap mid-stream
+        # reruns straight into the phrase stage with the options so far.
+        with st.spinner(TEXT["loading_phrases"]):
+            for phrase in stream:
+                option = make_option(len(st.session_state.options), phrase, LANG)
+                st.session_state.options.append(option)
+                render_phrase_button(option)
 
-    
     st.markdown("---")
     if st.button(TEXT["show_more_options"], key="show_more_options_btn", use_container_width=True):
         st.session_state.previous_stage = st.session_state.stage # Store current stage
+        st.session_state.refresh_options = True
         st.session_state.stage = "loading"
         st.rerun()
 
@@ -1107,7 +1693,7 @@ def render_voice_output() -> None:
     ), unsafe_allow_html=True)
 
     if st.session_state.audio_file and not st.session_state.play_triggered:
-        st.audio(st.session_state.audio_file, autoplay=True)
+        st.audio(st.session_state.audio_file, format=tts.mime_type(st.session_state.audio_file), autoplay=True)
         st.session_state.play_triggered = True
     
     col1, col2 = st.columns(2)
@@ -1168,7 +1754,7 @@ def render_text_input_stage() -> None:
                 # 🔊 Audio
                 audio_file = synthesize_audio(text, LANG)
                 if audio_file:
-                    st.audio(audio_file, autoplay=True)
+                    st.audio(audio_file, format=tts.mime_type(audio_file), autoplay=True)
 
                 # Save state
                 st.session_state.last_phrase = text
@@ -1189,25 +1775,41 @@ def render_text_input_stage() -> None:
 # --- Main Render ----------------------------------------------------------- #
 
 def main() -> None:
+    preload_templates(TRANSLATIONS)
     render_header()
 
     if "qdrant_initialized" not in st.session_state:
         try:
             qdrant_manager.init_qdrant()
             st.session_state.qdrant_initialized = True
+            if qdrant_manager.COMPACTION_INTERVAL_HOURS > 0:
+                qdrant_manager.start_compaction_scheduler(qdrant_manager.COMPACTION_INTERVAL_HOURS)
         except Exception as e:
             st.warning(TEXT["warning_qdrant_init"].format(e=e))
             st.session_state.qdrant_initialized = False
-    
+
+    if warmup.WARMUP_AT_STARTUP:
+        # Pre-render common phrases once per process so first taps play from the cache
+        warmup.start_warm_up()
+    # Rate limiter queues and circuit breaker states in the server log
+    start_status_log()
+
     stage = st.session_state.stage
+    if stage in ("intro", "categories"):
+        # Have suggestions ready before a category is tapped
+        start_prefetch(LANG)
+
     if stage == "intro":
         render_stage_intro()
     elif stage == "categories":
         render_categories()
     elif stage == "loading":
-        with st.spinner(TEXT["loading_phrases"]):
-            fetch_options(st.session_state.selected_category, LANG)
-        st.rerun()
+        if STREAM_SUGGESTIONS:
+            stream_options(st.session_state.selected_category, LANG)
+        else:
+            with st.spinner(TEXT["loading_phrases"]):
+                fetch_options(st.session_state.selected_category, LANG)
+            st.rerun()
     elif stage == "phrases":
         render_phrase_options()
     elif stage == "text_input_stage": # New stage for text input
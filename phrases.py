@@ -0,0 +1,36 @@
+"""
+Phrase tables for EchoMind
+Category names with their emoji and the offline phrases shown when Gemini is unavailable
+"""
+
+OFFLINE_PHRASES = {
+    "bn": {
+        "শরীর ও চাহিদা": [
+            {"text": "আমি পানি চাই", "emoji": "💧"},
+            {"text": "আমি ক্ষুধার্ত", "emoji": "🍎"},
+            {"text": "আমি বাথরুমে যেতে চাই", "emoji": "🚽"},
+        ],
+    },
+    "en": {
+        "Body & Needs": [
+            {"text": "I want water", "emoji": "💧"},
+            {"text": "I am hungry", "emoji": "🍎"},
+            {"text": "I need the bathroom", "emoji": "🚽"},
+        ],
+    },
+}
+
+CATEGORY_CONFIGS = {
+    "bn": {
+        "আমার শরীর ও প্রয়োজন": "🍎",
+        "আমার অনুভূতি জানাতে চাই": "💛",
+        "কিছু করতে চাই": "🎨",
+        "সাহায্য ও সুরক্ষা চাই": "🆘",
+    },
+    "en": {
+        "Body & Needs": "🍎",
+        "Feelings & Sensory": "💛",
+        "Activities & People": "🎨",
+        "Help & Safety": "🆘",
+    },
+}
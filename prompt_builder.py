@@ -0,0 +1,118 @@
+"""
+Prompt builder for EchoMind
+Templates loaded once per process, a compact bucketed context block and a per-prompt token budget
+"""
+
+import math
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+PROMPTS_DIR = Path(__file__).resolve().parent / "prompts"
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+
+FALLBACK_TEMPLATES = {
+    "suggestion": "Generate three short, simple phrases for a non-verbal child.",
+    "predict_intent": "Rephrase the child's input into a simple, single phrase.",
+}
+
+# Context fields in the order they give way when a prompt is over budget
+# (personalization is shortened sentence by sentence before it is dropped)
+TRIM_ORDER = ("day_of_week", "place", "personalization", "last_phrase", "time_of_day")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count without an API round trip: ~4 ASCII or ~2 other characters per token"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2)
+
+
+class PromptTemplate:
+    """A prompt file with its JSON example braces escaped and its token cost counted up front"""
+
+    def __init__(self, text: str):
+        self.text = text
+        # Escape the JSON example braces so only {context} is substituted
+        self.compiled = text.replace("{", "{{").replace("}", "}}").replace("{{context}}", "{context}")
+        self.tokens = estimate_tokens(text.replace("{context}", ""))
+
+    def render(self, context_block: str) -> str:
+        return self.compiled.format(context=context_block)
+
+
+_templates: Dict[Tuple[str, str], PromptTemplate] = {}
+
+
+def get_template(kind: str, language: str) -> PromptTemplate:
+    """Return the prompts/<kind>_prompt_<language>.txt template, reading it only once"""
+    key = (kind, language)
+    if key not in _templates:
+        prompt_file = PROMPTS_DIR / f"{kind}_prompt_{language}.txt"
+        if prompt_file.exists():
+            text = prompt_file.read_text(encoding="utf-8").strip()
+        else:
+            # Fallback prompt if file is missing
+            text = FALLBACK_TEMPLATES[kind]
+        _templates[key] = PromptTemplate(text)
+    return _templates[key]
+
+
+def preload_templates(languages: Iterable[str]) -> None:
+    """Load every template up front so no request waits on disk"""
+    for language in languages:
+        for kind in FALLBACK_TEMPLATES:
+            get_template(kind, language)
+
+
+def compact_context(category: str, context: Dict[str, str], personalization: str = "") -> Dict[str, str]:
+    """The context worth sending, bucketed: no ids, dates, clock time or 6-decimal GPS"""
+    place = context.get("location_name")
+    latitude, longitude = context.get("latitude"), context.get("longitude")
+    if not place and latitude and longitude:
+        place = f"{float(latitude):.2f}, {float(longitude):.2f}"
+
+    fields = {
+        "category": category,
+        "time_of_day": context.get("time_of_day"),
+        "day_of_week": context.get("day_of_week"),
+        "place": place,
+        "last_phrase": context.get("last_phrase"),
+        "personalization": personalization,
+    }
+    return {k: v for k, v in fields.items() if v}
+
+
+def format_context(fields: Dict[str, str]) -> str:
+    return "\n".join(f"{k.replace('_', ' ').title()}: {v}" for k, v in fields.items())
+
+
+def _shorten(text: str) -> str:
+    """Drop the last sentence of personalization prose"""
+    sentences = [s for s in text.split(". ") if s]
+    return ". ".join(sentences[:-1])
+
+
+def build_suggestion_prompt(
+    language: str,
+    category: str,
+    context: Dict[str, str],
+    personalization: str = "",
+    budget: int = PROMPT_TOKEN_BUDGET,
+) -> Tuple[str, int]:
+    """Render the suggestion prompt within the token budget; returns (prompt, estimated tokens)"""
+    template = get_template("suggestion", language)
+    fields = compact_context(category, context, personalization)
+
+    def tokens() -> int:
+        return template.tokens + estimate_tokens(format_context(fields))
+
+    for field in TRIM_ORDER:
+        while field == "personalization" and fields.get(field) and tokens() > budget:
+            fields[field] = _shorten(fields[field])
+        if tokens() <= budget:
+            break
+        fields.pop(field, None)
+
+    total = tokens()
+    print(f"Suggestion prompt ~{total} tokens (template {template.tokens}, context {total - template.tokens}, budget {budget})")
+    return template.render(format_context(fields)), total
@@ -3,13 +3,25 @@ Qdrant Vector Database Manager for EchoMind
 Handles storage and retrieval of phrase patterns for personalization
 """
 
+import asyncio
+import atexit
+import hashlib
 import os
-from datetime import datetime
-from typing import Dict, List, Optional
+import queue
+import sqlite3
+import threading
+import json
+import time
+import uuid
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Dict, List, Optional, Tuple, TypeVar
 from pathlib import Path
 
 import google.generativeai as genai
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.models import (
     Distance,
     VectorParams,
@@ -17,123 +29,829 @@ from qdrant_client.models import (
     FieldCondition,
     MatchValue,
     Filter,
+    KeywordIndexParams,
+    KeywordIndexType,
+    PayloadSchemaType,
+    PointIdsList,
 )
 
+from resilience import BACKGROUND, embedding_breaker, embedding_limiter, request_priority, single_flight
+from vector_store import NumpyVectorStore, VectorStore
+
 # Qdrant setup
 QDRANT_PATH = Path(__file__).resolve().parent / "qdrant_storage"
 QDRANT_COLLECTION = "echomind_phrases"
 EMBEDDING_MODEL = "models/embedding-001"
 EMBEDDING_DIM = 768  # Gemini embedding dimension
 
-# Initialize Qdrant client in local mode (no server needed)
-client = QdrantClient(path=str(QDRANT_PATH))
+# Embedding cache setup (persists next to qdrant_storage/)
+EMBEDDING_CACHE_PATH = Path(__file__).resolve().parent / "embedding_cache.sqlite3"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
 
-# Counter for unique point IDs
-_point_counter = {}
+# Write-behind ingestion setup
+INGEST_BATCH_SIZE = int(os.getenv("QDRANT_INGEST_BATCH_SIZE", "32"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("QDRANT_INGEST_FLUSH_INTERVAL", "2.0"))
 
+# Payload fields with a keyword index (used by every filtered lookup)
+INDEXED_FIELDS = ("child_id", "category")
 
-def _get_next_point_id(child_id: str) -> int:
-    """Get next unique point ID for a child"""
-    if child_id not in _point_counter:
-        _point_counter[child_id] = 0
-    _point_counter[child_id] += 1
-    return _point_counter[child_id]
+# Partitioning of phrase history across collections:
+# - "tenant": one collection, child_id indexed as the tenant key
+# - "cohort": one collection per cohort (e.g. school), mapped in QDRANT_COHORTS_FILE
+# - "sharded": QDRANT_SHARDS collections, children assigned by a stable hash
+# Run `python qdrant_manager.py migrate` after changing the strategy.
+QDRANT_PARTITIONING = os.getenv("QDRANT_PARTITIONING", "tenant")
+QDRANT_SHARDS = int(os.getenv("QDRANT_SHARDS", "8"))
+QDRANT_COHORTS_FILE = Path(os.getenv("QDRANT_COHORTS_FILE", Path(__file__).resolve().parent / "cohorts.json"))
+DEFAULT_COHORT = "default"
+MIGRATION_BATCH_SIZE = 256
 
+# Retention: raw selections older than this are rolled up into aggregate points
+COMPACTION_AGE_DAYS = int(os.getenv("COMPACTION_AGE_DAYS", "30"))
+COMPACTION_INTERVAL_HOURS = float(os.getenv("COMPACTION_INTERVAL_HOURS", "0"))  # 0 disables the scheduler
+COMPACTION_BATCH_SIZE = 512
 
-def init_qdrant() -> None:
-    """Initialize Qdrant collection if it doesn't exist"""
+# Backfill of dummy (zero) vectors stored while embeddings were unavailable
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "100"))
+BACKFILL_DELAY_SECONDS = float(os.getenv("BACKFILL_DELAY_SECONDS", "1.0"))
+BACKFILL_CHECKPOINT_PATH = Path(__file__).resolve().parent / "backfill_checkpoint.json"
+FREQUENCY_SCROLL_PAGE = 1000
+# Durable phrase counts: one point per (child, category, phrase), kept next to the history
+PHRASE_COUNTS_COLLECTION = "echomind_phrase_counts"
+COUNTER_VECTOR = [1.0]  # Counter points are only filtered, never searched
+PHRASE_COUNTS_TTL = float(os.getenv("PHRASE_COUNTS_TTL", "60"))  # Seconds before counters reload (other workers' taps)
+PHRASE_COUNTS_MAX = int(os.getenv("PHRASE_COUNTS_MAX", "1024"))  # (child, category) counters kept per process
+PERSONALIZATION_MEMO_MAX = int(os.getenv("PERSONALIZATION_MEMO_MAX", "1024"))  # Personalization strings kept per process
+
+# Personalization lookup sizes
+PERSONALIZATION_SIMILAR_LIMIT = 3
+PERSONALIZATION_TOP_LIMIT = 3
+
+# Vector store backend: "qdrant" (local Qdrant client) or "numpy" (memory-mapped NumPy store)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+QDRANT_URL = os.getenv("QDRANT_URL")  # Qdrant server; enables AsyncQdrantClient
+NUMPY_STORE_PATH = Path(os.getenv("NUMPY_STORE_PATH", Path(__file__).resolve().parent / "numpy_storage"))
+NUMPY_STORE_QUANTIZATION = os.getenv("NUMPY_STORE_QUANTIZATION", "float32")  # or "int8"
+
+
+def create_client(backend: str = VECTOR_BACKEND) -> VectorStore:
+    """Create the vector store client for the configured backend"""
+    if backend == "qdrant":
+        if QDRANT_URL:
+            return QdrantClient(url=QDRANT_URL)
+        # Qdrant in local mode (no server needed, single process)
+        return QdrantClient(path=str(QDRANT_PATH))
+    if backend == "numpy":
+        # Memory-mapped NumPy store (several processes can share it)
+        return NumpyVectorStore(str(NUMPY_STORE_PATH), quantization=NUMPY_STORE_QUANTIZATION)
+    raise ValueError(f"Unknown VECTOR_BACKEND '{backend}', expected 'qdrant' or 'numpy'")
+
+
+client = create_client()
+
+T = TypeVar("T")
+
+
+class _ThreadedAsyncClient:
+    """
+    Async facade over the synchronous client.
+    Local Qdrant holds a file lock and the NumPy store is synchronous, so
+    their calls are run on worker threads instead of a second client.
+    """
+
+    def __getattr__(self, name: str):
+        method = getattr(client, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return call
+
+
+class _DirectAsyncClient:
+    """
+    Async facade that calls the synchronous client on the calling thread.
+    Used while draining at interpreter exit, when thread pools take no more work.
+    """
+
+    def __getattr__(self, name: str):
+        method = getattr(client, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+# Set by the exit drain: writes then use direct synchronous client calls
+_exiting = False
+
+# One AsyncQdrantClient per event loop (its connections are bound to the loop)
+_async_clients: Dict[asyncio.AbstractEventLoop, AsyncQdrantClient] = {}
+
+
+def get_async_client():
+    """Get the async vector store client for the running event loop"""
+    if _exiting:
+        return _DirectAsyncClient()
+    if VECTOR_BACKEND == "qdrant" and QDRANT_URL:
+        loop = asyncio.get_running_loop()
+        async_client = _async_clients.get(loop)
+        if async_client is None:
+            async_client = AsyncQdrantClient(url=QDRANT_URL)
+            _async_clients[loop] = async_client
+        return async_client
+    return _ThreadedAsyncClient()
+
+
+# Background event loop that runs the coroutines behind the sync API
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+
+
+def _run(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the background event loop and wait for its result"""
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="qdrant-async", daemon=True)
+            _loop_thread.start()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("Sync qdrant_manager API called from its own event loop; await the async_* variant")
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+# Namespace for deterministic point IDs (uuid5 over child, timestamp and phrase)
+POINT_ID_NAMESPACE = uuid.UUID("6f6c0c1e-4b0d-5a55-9a43-3e0c2b9d7e11")
+
+# Per-(child, category) phrase frequency counters, loaded lazily from the counter
+# points as (loaded at, counts, newest selection timestamp). The copies are process-local: this process's writes keep
+# them current, other workers' writes show up once PHRASE_COUNTS_TTL expires
+# them, and the least recently used are dropped beyond PHRASE_COUNTS_MAX.
+# Writes bump the key's epoch and in-flight count so a load that overlaps
+# a write is used once but not cached (no lock is held across I/O).
+_phrase_counts: Dict[Tuple[str, str], Tuple[float, Counter, str]] = {}
+_phrase_counts_epoch: Dict[Tuple[str, str], int] = {}
+_phrase_counts_inflight: Dict[Tuple[str, str], int] = {}
+_phrase_counts_lock = threading.Lock()
+
+# Memoized (memoized at, personalization string) keyed by (child, category, bucketed
+# context), in least-recently-used order and capped at PERSONALIZATION_MEMO_MAX.
+# Entries expire with the phrase counters so other workers' selections show up.
+_personalization_memo: Dict[Tuple, Tuple[float, str]] = {}
+_personalization_generation: Dict[str, int] = {}
+_personalization_lock = threading.Lock()
+
+
+def make_point_id(child_id: str, timestamp: str, phrase: str) -> str:
+    """
+    Deterministic point ID for a selection.
+    The same selection always maps to the same ID, across restarts and workers,
+    so re-ingesting it overwrites instead of duplicating.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{child_id}\x1f{timestamp}\x1f{phrase}"))
+
+
+def _load_cohorts() -> Dict[str, str]:
+    """Load the child_id -> cohort mapping used by cohort partitioning"""
+    if not QDRANT_COHORTS_FILE.exists():
+        return {}
     try:
-        # Check if collection exists
-        collections = client.get_collections().collections
+        return json.loads(QDRANT_COHORTS_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"Error reading cohorts file: {e}")
+        return {}
+
+
+_cohorts = _load_cohorts()
+
+
+def collection_for(child_id: str) -> str:
+    """Name of the collection holding a child's phrase history"""
+    if QDRANT_PARTITIONING == "tenant":
+        return QDRANT_COLLECTION
+    if QDRANT_PARTITIONING == "cohort":
+        return f"{QDRANT_COLLECTION}_{_cohorts.get(child_id, DEFAULT_COHORT)}"
+    if QDRANT_PARTITIONING == "sharded":
+        # crc32 is stable across processes (unlike the built-in hash)
+        return f"{QDRANT_COLLECTION}_shard{zlib.crc32(child_id.encode('utf-8')) % QDRANT_SHARDS}"
+    raise ValueError(
+        f"Unknown QDRANT_PARTITIONING '{QDRANT_PARTITIONING}', expected 'tenant', 'cohort' or 'sharded'"
+    )
+
+
+def partition_collections() -> List[str]:
+    """All collections the current partitioning strategy writes to"""
+    if QDRANT_PARTITIONING == "cohort":
+        cohorts = {DEFAULT_COHORT, *_cohorts.values()}
+        return sorted(f"{QDRANT_COLLECTION}_{cohort}" for cohort in cohorts)
+    if QDRANT_PARTITIONING == "sharded":
+        return [f"{QDRANT_COLLECTION}_shard{n}" for n in range(QDRANT_SHARDS)]
+    return [collection_for("")]
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+    Keeps recently used vectors in an in-memory LRU and every vector in a
+    small SQLite file so identical texts are embedded only once, even across restarts.
+    """
+
+    def __init__(self, path: Optional[Path], max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Hash the model name and whitespace-normalized text into a cache key"""
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._db is None and self.path is not None:
+            try:
+                self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding cache disabled on disk: {e}")
+                self.path = None
+                self._db = None
+        return self._db
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Return a cached vector, or None on a miss"""
+        key = self.make_key(model, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            db = self._connect()
+            row = None
+            if db is not None:
+                try:
+                    row = db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error:
+                    row = None
+            if row is None:
+                self.misses += 1
+                return None
+
+            vector = array("f", row[0]).tolist()
+            self._remember(key, vector)
+            self.hits += 1
+            return vector
+
+    def put(self, model: str, text: str, vector: List[float]) -> None:
+        """Store a vector in memory and on disk"""
+        key = self.make_key(model, text)
+        with self._lock:
+            self._remember(key, list(vector))
+            db = self._connect()
+            if db is not None:
+                try:
+                    db.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                        (key, array("f", vector).tobytes()),
+                    )
+                    db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing embedding cache: {e}")
+
+    def clear(self) -> None:
+        """Drop all cached vectors and reset the counters"""
+        with self._lock:
+            self._memory.clear()
+            self.hits = 0
+            self.misses = 0
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM embeddings")
+                db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the in-memory size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
+
+
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH)
+
+# Lets the embedding circuit breaker find out in the background when the API is back
+embedding_breaker.probe = lambda: genai.embed_content(model=EMBEDDING_MODEL, content="ping")
+
+
+async def async_init_qdrant() -> None:
+    """Initialize the Qdrant collection(s) for the partitioning strategy if they don't exist"""
+    try:
+        async_client = get_async_client()
+
+        # Check which collections exist
+        collections = (await async_client.get_collections()).collections
         collection_names = [col.name for col in collections]
 
-        if QDRANT_COLLECTION not in collection_names:
-            # Create collection
-            client.create_collection(
-                collection_name=QDRANT_COLLECTION,
-                vectors_config=VectorParams(
-                    size=EMBEDDING_DIM,
-                    distance=Distance.COSINE,
-                ),
-            )
-            print(f"✓ Qdrant collection '{QDRANT_COLLECTION}' created")
-        else:
-            print(f"✓ Qdrant collection '{QDRANT_COLLECTION}' already exists")
+        for collection_name in partition_collections():
+            if collection_name not in collection_names:
+                # Create collection
+                await async_client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=VectorParams(
+                        size=EMBEDDING_DIM,
+                        distance=Distance.COSINE,
+                    ),
+                )
+                print(f"✓ Qdrant collection '{collection_name}' created")
+            else:
+                print(f"✓ Qdrant collection '{collection_name}' already exists")
+
+            # Index the fields every filtered lookup uses; child_id is the tenant key
+            for field_name in INDEXED_FIELDS:
+                field_schema = PayloadSchemaType.KEYWORD
+                if field_name == "child_id" and QDRANT_PARTITIONING == "tenant":
+                    field_schema = KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True)
+                await async_client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                )
+
+        if PHRASE_COUNTS_COLLECTION not in collection_names:
+            # Creates the counter points, counting the history of stores that predate them
+            await async_rebuild_phrase_counts()
     except Exception as e:
         print(f"Error initializing Qdrant: {e}")
         raise
 
 
-def generate_embedding(text: str) -> Optional[List[float]]:
-    """Generate embedding for a text using Gemini"""
+async def _async_create_counts_collection() -> None:
+    """Create the collection of per-(child, category, phrase) counter points"""
+    async_client = get_async_client()
+    await async_client.create_collection(
+        collection_name=PHRASE_COUNTS_COLLECTION,
+        vectors_config=VectorParams(size=len(COUNTER_VECTOR), distance=Distance.COSINE),
+    )
+    for field_name in INDEXED_FIELDS:
+        await async_client.create_payload_index(
+            collection_name=PHRASE_COUNTS_COLLECTION,
+            field_name=field_name,
+            field_schema=PayloadSchemaType.KEYWORD,
+        )
+    print(f"✓ Qdrant collection '{PHRASE_COUNTS_COLLECTION}' created")
+
+
+def init_qdrant() -> None:
+    """Initialize Qdrant collection if it doesn't exist"""
+    _run(async_init_qdrant())
+
+
+async def async_generate_embedding(text: str) -> Optional[List[float]]:
+    """Generate embedding for a text using Gemini (served from the embedding cache when possible)"""
+    cached = embedding_cache.get(EMBEDDING_MODEL, text)
+    if cached is not None:
+        return cached
+    if not embedding_breaker.available():
+        # Embeddings keep failing (e.g. quota): callers fall back at once
+        return None
+    # Sessions embedding the same context at once share one API call
+    return await single_flight.do_async(EmbeddingCache.make_key(EMBEDDING_MODEL, text), _async_embed, text)
+
+
+async def _async_embed(text: str) -> Optional[List[float]]:
     try:
-        response = genai.embed_content(
+        await embedding_limiter.acquire_async()
+        response = await embedding_breaker.call_async(
+            genai.embed_content_async,
             model=EMBEDDING_MODEL,
             content=text,
         )
-        return response["embedding"]
+        embedding = response["embedding"]
+        embedding_cache.put(EMBEDDING_MODEL, text, embedding)
+        return embedding
     except Exception as e:
         print(f"Error generating embedding: {e}")
         return None
 
 
-def store_phrase(
+def generate_embedding(text: str) -> Optional[List[float]]:
+    """Generate embedding for a text using Gemini (served from the embedding cache when possible)"""
+    return _run(async_generate_embedding(text))
+
+
+async def async_generate_embeddings(texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    Generate embeddings for many texts with a single batched Gemini call.
+    Cached texts are not sent; failed lookups come back as None.
+    """
+    embeddings: List[Optional[List[float]]] = [embedding_cache.get(EMBEDDING_MODEL, t) for t in texts]
+    missing = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+    if not missing or not embedding_breaker.available():
+        return embeddings
+
+    try:
+        await embedding_limiter.acquire_async()
+        response = await embedding_breaker.call_async(
+            genai.embed_content_async,
+            model=EMBEDDING_MODEL,
+            content=missing,
+        )
+        fresh = dict(zip(missing, response["embedding"]))
+    except Exception as e:
+        print(f"Error generating embeddings: {e}")
+        return embeddings
+
+    for text, embedding in fresh.items():
+        embedding_cache.put(EMBEDDING_MODEL, text, embedding)
+    return [e if e is not None else fresh.get(t) for t, e in zip(texts, embeddings)]
+
+
+def generate_embeddings(texts: List[str]) -> List[Optional[List[float]]]:
+    """Generate embeddings for many texts with a single batched Gemini call"""
+    return _run(async_generate_embeddings(texts))
+
+
+def _build_context_str(category: str, context: Dict[str, str]) -> str:
+    """Build the context string that gets embedded for a selection"""
+    return (
+        f"Category: {category}. "
+        f"Time of day: {context.get('time_of_day', 'unknown')}. "
+        f"Day: {context.get('day_of_week', 'unknown')}. "
+        f"Location: {context.get('location', 'unknown')}"
+    )
+
+
+def _build_payload(
     child_id: str,
     category: str,
     phrase: str,
     context: Dict[str, str],
-) -> bool:
-    """Store a phrase selection with context in Qdrant for personalization"""
-    try:
-        # Build context string for embedding
-        context_str = (
-            f"Category: {category}. "
-            f"Time of day: {context.get('time_of_day', 'unknown')}. "
-            f"Day: {context.get('day_of_week', 'unknown')}. "
-            f"Location: {context.get('location', 'unknown')}"
-        )
+    timestamp: Optional[str] = None,
+) -> Dict[str, str]:
+    """Build the point payload (metadata) for a phrase selection"""
+    return {
+        "child_id": child_id,
+        "category": category,
+        "phrase": phrase,
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "time_of_day": context.get("time_of_day", "unknown"),
+        "day_of_week": context.get("day_of_week", "unknown"),
+        "location": context.get("location", "unknown"),
+        "context_str": _build_context_str(category, context),
+    }
 
-        # Generate embedding of the context (skip if quota exceeded)
-        embedding = generate_embedding(context_str)
-        if not embedding:
-            # Graceful degradation - store without embedding
-            # Will still log the phrase for future use, just won't do similarity search
-            embedding = [0.0] * EMBEDDING_DIM  # Dummy vector
 
-        # Prepare payload (metadata)
-        payload = {
+def _counter_point(key: Tuple[str, str, str], count: int, last_seen: str) -> PointStruct:
+    """Counter point holding how often a child chose a phrase in a category"""
+    child_id, category, phrase = key
+    return PointStruct(
+        id=make_point_id(child_id, f"counter:{category}", phrase),
+        vector=COUNTER_VECTOR,
+        payload={
+            "kind": "counter",
             "child_id": child_id,
             "category": category,
             "phrase": phrase,
-            "timestamp": datetime.now().isoformat(),
-            "time_of_day": context.get("time_of_day", "unknown"),
-            "day_of_week": context.get("day_of_week", "unknown"),
-            "location": context.get("location", "unknown"),
-            "context_str": context_str,
-        }
+            "count": count,
+            "last_seen": last_seen,
+        },
+    )
 
-        # Create point with unique ID
-        point_id = _get_next_point_id(child_id)
-        point = PointStruct(
-            id=hash((child_id, point_id)) % (2**31),  # Convert to positive int
-            vector=embedding,
-            payload=payload,
-        )
 
-        # Upsert point into Qdrant
-        client.upsert(
-            collection_name=QDRANT_COLLECTION,
-            points=[point],
+async def _async_add_phrase_counts(stored: List[Dict[str, str]]) -> None:
+    """
+    Add newly stored selections to their counter points.
+    This is a read-modify-write: two workers storing the same phrase for the
+    same child at the same moment can lose an increment (`recount` repairs it).
+    """
+    totals: Dict[Tuple[str, str, str], List] = {}
+    for payload in stored:
+        total = totals.setdefault((payload["child_id"], payload["category"], payload["phrase"]), [0, payload["timestamp"]])
+        total[0] += 1
+        total[1] = max(total[1], payload["timestamp"])
+    if not totals:
+        return
+
+    async_client = get_async_client()
+    points = {key: _counter_point(key, count, last_seen) for key, (count, last_seen) in totals.items()}
+    existing = {
+        str(record.id): record.payload or {}
+        for record in await async_client.retrieve(
+            collection_name=PHRASE_COUNTS_COLLECTION,
+            ids=[point.id for point in points.values()],
+            with_payload=["count", "last_seen"],
+            with_vectors=False,
         )
+    }
+    for point in points.values():
+        old = existing.get(str(point.id), {})
+        point.payload["count"] += old.get("count", 0)
+        point.payload["last_seen"] = max(point.payload["last_seen"], old.get("last_seen", ""))
+    await async_client.upsert(collection_name=PHRASE_COUNTS_COLLECTION, points=list(points.values()))
+
+
+def _begin_count_writes(keys) -> None:
+    """Mark (child, category) counters as having a write in flight"""
+    with _phrase_counts_lock:
+        for key in keys:
+            _phrase_counts_epoch[key] = _phrase_counts_epoch.get(key, 0) + 1
+            _phrase_counts_inflight[key] = _phrase_counts_inflight.get(key, 0) + 1
+
+
+def _end_count_writes(keys, stored: List[Dict[str, str]]) -> None:
+    """Apply stored selections to loaded counters and clear the in-flight marks"""
+    with _phrase_counts_lock:
+        for payload in stored:
+            key = (payload["child_id"], payload["category"])
+            entry = _phrase_counts.get(key)
+            if entry is not None:
+                entry[1][payload["phrase"]] += 1
+                _phrase_counts[key] = (entry[0], entry[1], max(entry[2], payload["timestamp"]))
+        for key in keys:
+            _phrase_counts_inflight[key] -= 1
+            if not _phrase_counts_inflight[key]:
+                del _phrase_counts_inflight[key]
+
+
+async def _async_write_payloads(payloads: List[Dict[str, str]], check_existing: bool = False) -> bool:
+    """
+    Embed a batch of selection payloads and upsert them with one call.
+    With check_existing, points that are already stored are overwritten
+    without being counted again (for idempotent re-ingestion).
+    """
+    if not payloads:
+        return True
+    try:
+        async_client = get_async_client()
 
-        print(f"✓ Stored phrase: '{phrase}' (Category: {category})")
+        # Collapse repeats of the same selection within the batch
+        by_id = {
+            make_point_id(p["child_id"], p["timestamp"], p["phrase"]): p
+            for p in payloads
+        }
+        ids = list(by_id)
+        payloads = list(by_id.values())
+
+        # Generate embeddings of the contexts (skip if quota exceeded, or at exit: `backfill` repairs them)
+        if _exiting:
+            embeddings = [None] * len(payloads)
+        else:
+            embeddings = await async_generate_embeddings([p["context_str"] for p in payloads])
+
+        points = []
+        for point_id, payload, embedding in zip(ids, payloads, embeddings):
+            if not embedding:
+                # Graceful degradation - store without embedding
+                # Will still log the phrase for future use, just won't do similarity search
+                embedding = [0.0] * EMBEDDING_DIM  # Dummy vector
+
+            points.append(PointStruct(
+                id=point_id,
+                vector=embedding,
+                payload=payload,
+            ))
+
+        # Upsert the points of each collection with one call and keep the frequency counters in step
+        by_collection: Dict[str, List[int]] = {}
+        for index, payload in enumerate(payloads):
+            by_collection.setdefault(collection_for(payload["child_id"]), []).append(index)
+
+        keys = {(p["child_id"], p["category"]) for p in payloads}
+        _begin_count_writes(keys)
+        stored: List[Dict[str, str]] = []
+        try:
+            for collection_name, members in by_collection.items():
+                existing = set()
+                if check_existing:
+                    existing = {
+                        str(record.id)
+                        for record in await async_client.retrieve(
+                            collection_name=collection_name,
+                            ids=[ids[i] for i in members],
+                            with_payload=False,
+                            with_vectors=False,
+                        )
+                    }
+                await async_client.upsert(
+                    collection_name=collection_name,
+                    points=[points[i] for i in members],
+                )
+                stored.extend(payloads[i] for i in members if ids[i] not in existing)
+            try:
+                await _async_add_phrase_counts(stored)
+            except Exception as e:
+                # The selections are stored; `recount` brings the counter points back in line
+                print(f"Error updating phrase counts: {e}")
+        finally:
+            _end_count_writes(keys, stored)
+        _invalidate_personalization({p["child_id"] for p in payloads})
+
+        for payload in payloads:
+            print(f"✓ Stored phrase: '{payload['phrase']}' (Category: {payload['category']})")
         return True
     except Exception as e:
         print(f"Error storing phrase: {e}")
         return False
 
 
-def get_similar_contexts(
+def _write_payloads(payloads: List[Dict[str, str]], check_existing: bool = False) -> bool:
+    """Embed a batch of selection payloads and upsert them with one call"""
+    if _exiting:
+        # On the calling thread: the background loop's executor is shut down by now
+        return asyncio.run(_async_write_payloads(payloads, check_existing=check_existing))
+    return _run(_async_write_payloads(payloads, check_existing=check_existing))
+
+
+async def async_store_phrase(
+    child_id: str,
+    category: str,
+    phrase: str,
+    context: Dict[str, str],
+) -> bool:
+    """Store a phrase selection with context in Qdrant for personalization"""
+    return await _async_write_payloads([_build_payload(child_id, category, phrase, context)])
+
+
+def store_phrase(
+    child_id: str,
+    category: str,
+    phrase: str,
+    context: Dict[str, str],
+) -> bool:
+    """Store a phrase selection with context in Qdrant for personalization"""
+    return _run(async_store_phrase(child_id, category, phrase, context))
+
+
+def store_phrases(selections: List[Dict]) -> bool:
+    """
+    Store many phrase selections with one embedding call and one upsert.
+    Each selection is a dict with child_id, category, phrase, context and
+    optionally the original ISO timestamp. Storing the same selections
+    again is a no-op, so re-ingestion and concurrent writers are safe.
+    """
+    payloads = [
+        _build_payload(
+            s["child_id"],
+            s["category"],
+            s["phrase"],
+            s.get("context", {}),
+            timestamp=s.get("timestamp"),
+        )
+        for s in selections
+    ]
+    return _write_payloads(payloads, check_existing=True)
+
+
+class PhraseIngestQueue:
+    """
+    Write-behind buffer for phrase selections.
+    Selections are queued immediately and a background worker embeds and
+    upserts them in batches, flushing when the batch is full or the flush
+    interval has passed since the first queued selection.
+    """
+
+    _FLUSH = object()
+    _STOP = object()
+
+    def __init__(
+        self,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="phrase-ingest", daemon=True)
+                self._thread.start()
+
+    def put(self, payload: Dict[str, str]) -> None:
+        """Queue a selection payload without waiting for any I/O"""
+        self._ensure_worker()
+        self._queue.put(payload)
+
+    def flush(self) -> None:
+        """Write everything queued so far and wait until it is stored"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(self._FLUSH)
+        self._queue.join()
+
+    def close(self) -> None:
+        """Drain the queue and stop the worker (registered at interpreter exit)"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is self._STOP:
+                    stop = True
+                    break
+                if item is self._FLUSH:
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                else:
+                    self._queue.task_done()
+
+            if batch:
+                # Store embeddings yield to interactive lookups under the rate limit
+                with request_priority(BACKGROUND):
+                    _write_payloads(batch)
+            self._queue.task_done()
+            if stop:
+                return
+
+
+ingest_queue = PhraseIngestQueue()
+
+
+def _drain_at_exit() -> None:
+    """Store queued selections at interpreter exit with direct synchronous client calls"""
+    global _exiting
+    _exiting = True
+    ingest_queue.close()
+
+
+atexit.register(_drain_at_exit)
+
+
+def enqueue_phrase(
+    child_id: str,
+    category: str,
+    phrase: str,
+    context: Dict[str, str],
+) -> None:
+    """Queue a phrase selection for batched, write-behind storage in Qdrant"""
+    ingest_queue.put(_build_payload(child_id, category, phrase, context))
+
+
+def _child_filter(child_id: str) -> Filter:
+    """Filter on the indexed child_id payload field"""
+    return Filter(
+        must=[
+            FieldCondition(
+                key="child_id",
+                match=MatchValue(value=child_id),
+            )
+        ]
+    )
+
+
+def _format_similar(points) -> List[Dict]:
+    """Format scored points into similar-context dicts"""
+    similar = []
+    for hit in points:
+        similar.append({
+            "phrase": hit.payload.get("phrase"),
+            "category": hit.payload.get("category"),
+            "time_of_day": hit.payload.get("time_of_day"),
+            "similarity_score": hit.score,
+        })
+    return similar
+
+
+async def async_get_similar_contexts(
     child_id: str,
     category: str,
     context: Dict[str, str],
@@ -146,100 +864,277 @@ def get_similar_contexts(
     """
     try:
         # Build context string (same as in store_phrase)
-        context_str = (
-            f"Category: {category}. "
-            f"Time of day: {context.get('time_of_day', 'unknown')}. "
-            f"Day: {context.get('day_of_week', 'unknown')}. "
-            f"Location: {context.get('location', 'unknown')}"
-        )
+        context_str = _build_context_str(category, context)
 
         # Generate embedding of current context
-        embedding = generate_embedding(context_str)
+        embedding = await async_generate_embedding(context_str)
         if not embedding:
             # Embedding quota exceeded - just return empty, don't fail
             return []
 
-        # Try to search - handle both client APIs
-        try:
-            search_filter = Filter(
-                must=[
-                    FieldCondition(
-                        key="child_id",
-                        match=MatchValue(value=child_id),
-                    )
-                ]
-            )
+        search_result = await get_async_client().query_points(
+            collection_name=collection_for(child_id),
+            query=embedding,
+            query_filter=_child_filter(child_id),
+            limit=limit,
+            with_payload=True,
+        )
+        return _format_similar(search_result.points)
+    except Exception as e:
+        # Silently fail on any error - don't break the app
+        return []
 
-            search_result = client.search(
-                collection_name=QDRANT_COLLECTION,
-                query_vector=embedding,
-                query_filter=search_filter,
-                limit=limit,
-                with_payload=True,
-            )
 
-            # Format results
-            similar = []
-            for hit in search_result:
-                similar.append({
-                    "phrase": hit.payload.get("phrase"),
-                    "category": hit.payload.get("category"),
-                    "time_of_day": hit.payload.get("time_of_day"),
-                    "similarity_score": hit.score,
-                })
-            return similar
-        except AttributeError:
-            # search() method not available in this Qdrant version, return empty
-            return []
+def get_similar_contexts(
+    child_id: str,
+    category: str,
+    context: Dict[str, str],
+    limit: int = 3,
+) -> List[Dict]:
+    """Retrieve similar past contexts from Qdrant"""
+    return _run(async_get_similar_contexts(child_id, category, context, limit=limit))
+
+
+def _child_category_filter(child_id: str, category: str) -> Filter:
+    """Filter on the indexed child_id and category payload fields"""
+    return Filter(
+        must=[
+            FieldCondition(
+                key="child_id",
+                match=MatchValue(value=child_id),
+            ),
+            FieldCondition(
+                key="category",
+                match=MatchValue(value=category),
+            ),
+        ]
+    )
+
+
+def _count_phrases(records, counts: Counter) -> str:
+    """Add a page of counter points to a counter; returns their newest last_seen"""
+    newest = ""
+    for record in records:
+        payload = record.payload or {}
+        phrase = payload.get("phrase", "")
+        if phrase:
+            counts[phrase] += payload.get("count", 1)
+            newest = max(newest, payload.get("last_seen", ""))
+    return newest
+
+
+def _count_snapshot(key: Tuple[str, str]) -> Tuple[int, int]:
+    """Epoch and in-flight writes for a counter key, taken before loading it"""
+    with _phrase_counts_lock:
+        return _phrase_counts_epoch.get(key, 0), _phrase_counts_inflight.get(key, 0)
+
+
+def _fresh_counts(key: Tuple[str, str]) -> Optional[Tuple[Counter, str]]:
+    """Cached counts and newest selection loaded within the TTL, marked most recently used (hold _phrase_counts_lock)"""
+    entry = _phrase_counts.pop(key, None)
+    if entry is None or time.monotonic() - entry[0] > PHRASE_COUNTS_TTL:
+        return None
+    _phrase_counts[key] = entry
+    return entry[1], entry[2]
+
+
+def _cache_counts(key: Tuple[str, str], loaded: Tuple[Counter, str], snapshot: Tuple[int, int]) -> Tuple[Counter, str]:
+    """Cache freshly loaded counts unless a write overlapped the load"""
+    with _phrase_counts_lock:
+        cached = _fresh_counts(key)
+        if cached is not None:
+            return cached
+        current = (_phrase_counts_epoch.get(key, 0), _phrase_counts_inflight.get(key, 0))
+        if snapshot[1] == 0 and current == snapshot:
+            _phrase_counts[key] = (time.monotonic(), *loaded)
+            while len(_phrase_counts) > PHRASE_COUNTS_MAX:
+                del _phrase_counts[next(iter(_phrase_counts))]
+        return loaded
+
+
+async def _async_load_phrase_counts(child_id: str, category: str) -> Tuple[Counter, str]:
+    """Read a child's counter points for a category (one per distinct phrase, not per selection)"""
+    async_client = get_async_client()
+    counts: Counter = Counter()
+    newest = ""
+    offset = None
+    while True:
+        records, offset = await async_client.scroll(
+            collection_name=PHRASE_COUNTS_COLLECTION,
+            scroll_filter=_child_category_filter(child_id, category),
+            limit=FREQUENCY_SCROLL_PAGE,
+            offset=offset,
+            with_payload=["phrase", "count", "last_seen"],
+            with_vectors=False,
+        )
+        newest = max(newest, _count_phrases(records, counts))
+        if offset is None:
+            return counts, newest
+
+
+async def _async_phrase_counts(child_id: str, category: str) -> Tuple[Counter, str]:
+    """
+    Phrase frequencies and newest selection timestamp for a child in a category.
+    Loaded from the counter points, kept up to date by this process's writes
+    and reloaded after PHRASE_COUNTS_TTL to pick up other processes' writes.
+    """
+    key = (child_id, category)
+    with _phrase_counts_lock:
+        cached = _fresh_counts(key)
+    if cached is None:
+        snapshot = _count_snapshot(key)
+        cached = _cache_counts(key, await _async_load_phrase_counts(child_id, category), snapshot)
+    counts, newest = cached
+    return Counter(counts), newest
+
+
+async def async_get_phrase_counts(child_id: str, category: str) -> Counter:
+    """Get phrase frequencies for a child in a category"""
+    counts, _ = await _async_phrase_counts(child_id, category)
+    return counts
+
+
+def get_phrase_counts(child_id: str, category: str) -> Counter:
+    """Get phrase frequencies for a child in a category"""
+    return _run(async_get_phrase_counts(child_id, category))
+
+
+async def async_get_history_stamp(child_id: str, category: str) -> Optional[str]:
+    """
+    Timestamp of the child's newest selection in a category ("" if none, None if unreadable).
+    Read from the durable counter points, so it is the same in every worker
+    and across restarts; usually served from the in-memory counters.
+    """
+    try:
+        _, newest = await _async_phrase_counts(child_id, category)
+        return newest
     except Exception as e:
-        # Silently fail on any error - don't break the app
+        print(f"Error reading phrase history stamp: {e}")
+        return None
+
+
+def get_history_stamp(child_id: str, category: str) -> Optional[str]:
+    """Timestamp of the child's newest selection in a category ("" if none, None if unreadable)"""
+    return _run(async_get_history_stamp(child_id, category))
+
+
+async def async_get_top_phrases_in_category(child_id: str, category: str, limit: int = 5) -> List[str]:
+    """Get the most frequently used phrases in a specific category for a child"""
+    try:
+        counts = await async_get_phrase_counts(child_id, category)
+        return [phrase for phrase, count in counts.most_common(limit)]
+    except Exception as e:
+        # Silently fail - don't break the app
         return []
 
 
 def get_top_phrases_in_category(child_id: str, category: str, limit: int = 5) -> List[str]:
     """Get the most frequently used phrases in a specific category for a child"""
-    try:
-        # Query all points for this child and category
-        search_filter = Filter(
-            must=[
-                FieldCondition(
-                    key="child_id",
-                    match=MatchValue(value=child_id),
-                ),
-                FieldCondition(
-                    key="category",
-                    match=MatchValue(value=category),
-                ),
-            ]
-        )
+    return _run(async_get_top_phrases_in_category(child_id, category, limit=limit))
 
-        # Try to get all points (not a real search, just filter)
-        try:
-            zero_vector = [0.0] * EMBEDDING_DIM
-            search_result = client.search(
-                collection_name=QDRANT_COLLECTION,
-                query_vector=zero_vector,
-                query_filter=search_filter,
-                limit=limit * 5,  # Get more to deduplicate
-                with_payload=True,
-            )
 
-            # Count occurrences and get top phrases
-            phrase_counts = {}
-            for hit in search_result:
-                phrase = hit.payload.get("phrase", "")
-                if phrase:
-                    phrase_counts[phrase] = phrase_counts.get(phrase, 0) + 1
-
-            # Sort by frequency and return top phrases
-            top_phrases = sorted(phrase_counts.items(), key=lambda x: x[1], reverse=True)
-            return [phrase for phrase, count in top_phrases[:limit]]
-        except AttributeError:
-            # search() method not available, graceful degradation
+def _format_personalization(similar: List[Dict], top_phrases: List[str]) -> str:
+    """Turn similar contexts and frequent phrases into prompt prose"""
+    personalization = ""
+
+    if similar:
+        phrases_from_similar = [s["phrase"] for s in similar if s.get("phrase")]
+        if phrases_from_similar:
+            personalization += f"In similar situations, this child has said: {', '.join(phrases_from_similar)}. "
+
+    if top_phrases:
+        personalization += f"This child frequently uses these phrases in this category: {', '.join(top_phrases)}. "
+
+    if not personalization:
+        personalization = "This is the child's first time in this category or context. Suggest clear, simple phrases based on the category."
+
+    return personalization
+
+
+def _invalidate_personalization(child_ids) -> None:
+    """Drop memoized personalization for children that just stored phrases"""
+    with _personalization_lock:
+        for child_id in set(child_ids):
+            _personalization_generation[child_id] = _personalization_generation.get(child_id, 0) + 1
+        for key in [k for k in _personalization_memo if k[0] in child_ids]:
+            del _personalization_memo[key]
+
+
+async def _async_query_personalization(
+    child_id: str,
+    category: str,
+    embedding: Optional[List[float]],
+) -> Tuple[List[Dict], List[str]]:
+    """Run the similarity lookup and the frequent-phrase lookup concurrently"""
+    async def similar() -> List[Dict]:
+        if not embedding:
             return []
+        search_result = await get_async_client().query_points(
+            collection_name=collection_for(child_id),
+            query=embedding,
+            query_filter=_child_filter(child_id),
+            limit=PERSONALIZATION_SIMILAR_LIMIT,
+            with_payload=True,
+        )
+        return _format_similar(search_result.points)
+
+    similar_contexts, top_phrases = await asyncio.gather(
+        similar(),
+        async_get_top_phrases_in_category(child_id, category, limit=PERSONALIZATION_TOP_LIMIT),
+    )
+    return similar_contexts, top_phrases
+
+
+def personalization_key(child_id: str, category: str, context: Dict[str, str]) -> Tuple:
+    """
+    Key on the coarse context (GPS rounded to ~1 km, as app.bucket_context does).
+    Lookups with equal keys share one personalization string.
+    """
+    latitude, longitude = context.get("latitude"), context.get("longitude")
+    if latitude and longitude:
+        area = f"{float(latitude):.2f},{float(longitude):.2f}"
+    else:
+        area = context.get("location_name") or context.get("location")
+    return (child_id, category, context.get("time_of_day"), context.get("day_of_week"), area)
+
+
+async def async_get_personalization_context(
+    child_id: str,
+    category: str,
+    context: Dict[str, str],
+) -> str:
+    """
+    Build a personalization context string based on child's history.
+    This will be added to the Gemini prompt to personalize suggestions.
+    Results are memoized per (child, category, coarse context) until the child stores a new phrase
+    or, to pick up other processes' selections, PHRASE_COUNTS_TTL passes.
+    """
+    try:
+        context_str = _build_context_str(category, context)
+        memo_key = personalization_key(child_id, category, context)
+        with _personalization_lock:
+            entry = _personalization_memo.pop(memo_key, None)
+            if entry is not None and time.monotonic() - entry[0] <= PHRASE_COUNTS_TTL:
+                _personalization_memo[memo_key] = entry
+                return entry[1]
+            generation = _personalization_generation.get(child_id, 0)
+
+        # Embed once, then fetch similar contexts and frequent phrases together
+        embedding = await async_generate_embedding(context_str)
+        similar, top_phrases = await _async_query_personalization(child_id, category, embedding)
+        personalization = _format_personalization(similar, top_phrases)
+
+        # Only memoize complete results that no newer selection has invalidated
+        if embedding:
+            with _personalization_lock:
+                if _personalization_generation.get(child_id, 0) == generation:
+                    _personalization_memo[memo_key] = (time.monotonic(), personalization)
+                    while len(_personalization_memo) > PERSONALIZATION_MEMO_MAX:
+                        del _personalization_memo[next(iter(_personalization_memo))]
+        return personalization
     except Exception as e:
-        # Silently fail - don't break the app
-        return []
+        print(f"Error building personalization context: {e}")
+        return ""
 
 
 def get_personalization_context(
@@ -251,28 +1146,380 @@ def get_personalization_context(
     Build a personalization context string based on child's history.
     This will be added to the Gemini prompt to personalize suggestions.
     """
+    return _run(async_get_personalization_context(child_id, category, context))
+
+
+def migrate_partitions(batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Move existing points into the collections of the current partitioning strategy.
+    Scrolls every phrase collection (including the original single collection),
+    upserts misplaced points into their target collection and then deletes
+    them from the source, batch by batch. Safe to re-run; returns the number
+    of points moved.
+    """
+    init_qdrant()
+    targets = set(partition_collections())
+    sources = [
+        col.name
+        for col in client.get_collections().collections
+        if col.name == QDRANT_COLLECTION or col.name.startswith(f"{QDRANT_COLLECTION}_")
+    ]
+
+    moved = 0
+    for source in sources:
+        offset = None
+        while True:
+            records, offset = client.scroll(
+                collection_name=source,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            by_target: Dict[str, List] = {}
+            for record in records:
+                target = collection_for((record.payload or {}).get("child_id", ""))
+                if target != source:
+                    by_target.setdefault(target, []).append(record)
+
+            for target, batch in by_target.items():
+                if target not in targets:
+                    continue
+                client.upsert(
+                    collection_name=target,
+                    points=[PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in batch],
+                )
+                client.delete(
+                    collection_name=source,
+                    points_selector=PointIdsList(points=[r.id for r in batch]),
+                )
+                moved += len(batch)
+
+            if offset is None:
+                break
+        print(f"✓ Migrated points out of '{source}'")
+
+    # Counters and memoized personalization may now point at the wrong collection
+    with _phrase_counts_lock:
+        _phrase_counts.clear()
+    with _personalization_lock:
+        _personalization_memo.clear()
+    print(f"✓ Moved {moved} points for '{QDRANT_PARTITIONING}' partitioning")
+    return moved
+
+
+def _aggregate_key(payload: Dict) -> Tuple[str, str, str, str]:
+    return (
+        payload.get("child_id", ""),
+        payload.get("category", ""),
+        payload.get("time_of_day", "unknown"),
+        payload.get("phrase", ""),
+    )
+
+
+def _aggregate_id(key: Tuple[str, str, str, str]) -> str:
+    child_id, category, time_of_day, phrase = key
+    return make_point_id(child_id, f"aggregate:{category}:{time_of_day}", phrase)
+
+
+def _merge_aggregate(existing, key: Tuple[str, str, str, str], records: List) -> PointStruct:
+    """Fold raw selections into an (existing or new) aggregate point"""
+    child_id, category, time_of_day, phrase = key
+    timestamps = [r.payload["timestamp"] for r in records]
+    count = len(records)
+    vector_sum = [0.0] * EMBEDDING_DIM
+    weight = 0
+
+    def add(vector, times):
+        nonlocal weight
+        if vector and any(vector):
+            for i, value in enumerate(vector):
+                vector_sum[i] += value * times
+            weight += times
+
+    if existing is not None:
+        count += existing.payload.get("count", 1)
+        timestamps += [existing.payload["first_seen"], existing.payload["last_seen"]]
+        add(existing.vector, existing.payload.get("count", 1))
+    for record in records:
+        add(record.vector, 1)
+
+    return PointStruct(
+        id=_aggregate_id(key),
+        vector=[v / weight for v in vector_sum] if weight else vector_sum,
+        payload={
+            "kind": "aggregate",
+            "child_id": child_id,
+            "category": category,
+            "phrase": phrase,
+            "time_of_day": time_of_day,
+            "count": count,
+            "first_seen": min(timestamps),
+            "last_seen": max(timestamps),
+            "timestamp": max(timestamps),
+            "context_str": f"Category: {category}. Time of day: {time_of_day}",
+        },
+    )
+
+
+def compact_history(older_than_days: int = COMPACTION_AGE_DAYS, batch_size: int = COMPACTION_BATCH_SIZE) -> int:
+    """
+    Roll raw selections older than N days into aggregate points.
+    Each (child, category, time_of_day, phrase) becomes one point with a
+    count, first/last-seen timestamps and the mean of the raw vectors, and
+    the raw points are deleted. Phrase frequencies are unchanged, so the
+    counter points stay valid. Returns the number of raw points removed.
+    """
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+    raw_filter = Filter(must_not=[FieldCondition(key="kind", match=MatchValue(value="aggregate"))])
+    removed = 0
+
+    for collection_name in partition_collections():
+        if not client.collection_exists(collection_name):
+            continue
+        removed_here = removed
+        offset = None
+        while True:
+            records, offset = client.scroll(
+                collection_name=collection_name,
+                scroll_filter=raw_filter,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            groups: Dict[Tuple[str, str, str, str], List] = {}
+            for record in records:
+                payload = record.payload or {}
+                if payload.get("phrase") and payload.get("timestamp", cutoff) < cutoff:
+                    groups.setdefault(_aggregate_key(payload), []).append(record)
+
+            if groups:
+                aggregate_ids = {key: _aggregate_id(key) for key in groups}
+                existing = {
+                    str(record.id): record
+                    for record in client.retrieve(
+                        collection_name=collection_name,
+                        ids=list(aggregate_ids.values()),
+                        with_payload=True,
+                        with_vectors=True,
+                    )
+                }
+                aggregates = [
+                    _merge_aggregate(existing.get(aggregate_ids[key]), key, members)
+                    for key, members in groups.items()
+                ]
+                raw_ids = [r.id for members in groups.values() for r in members]
+
+                # Write the aggregates before deleting, and keep concurrent count loads uncached
+                count_keys = {(key[0], key[1]) for key in groups}
+                _begin_count_writes(count_keys)
+                try:
+                    client.upsert(collection_name=collection_name, points=aggregates)
+                    client.delete(
+                        collection_name=collection_name,
+                        points_selector=PointIdsList(points=raw_ids),
+                    )
+                finally:
+                    _end_count_writes(count_keys, [])
+                _invalidate_personalization({key[0] for key in groups})
+                removed += len(raw_ids)
+
+            if offset is None:
+                break
+
+        if isinstance(client, NumpyVectorStore) and removed > removed_here:
+            # Qdrant reclaims deleted points itself; the NumPy store needs a vacuum
+            client.vacuum(collection_name)
+
+    print(f"✓ Compacted {removed} selections older than {older_than_days} days")
+    return removed
+
+
+async def async_rebuild_phrase_counts(batch_size: int = FREQUENCY_SCROLL_PAGE) -> int:
+    """
+    Recount every (child, category, phrase) from the phrase history and
+    replace the counter points with the result. Aggregate points carry
+    their own count. Returns the number of counter points written.
+    """
+    async_client = get_async_client()
+    totals: Dict[Tuple[str, str, str], List] = {}
+    for collection_name in partition_collections():
+        if not await async_client.collection_exists(collection_name):
+            continue
+        offset = None
+        while True:
+            records, offset = await async_client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=["child_id", "category", "phrase", "count", "timestamp"],
+                with_vectors=False,
+            )
+            for record in records:
+                payload = record.payload or {}
+                if not payload.get("phrase"):
+                    continue
+                key = (payload.get("child_id", ""), payload.get("category", ""), payload["phrase"])
+                total = totals.setdefault(key, [0, ""])
+                total[0] += payload.get("count", 1)
+                total[1] = max(total[1], payload.get("timestamp", ""))
+            if offset is None:
+                break
+
+    keys = {(key[0], key[1]) for key in totals}
+    _begin_count_writes(keys)
     try:
-        # Get similar contexts
-        similar = get_similar_contexts(child_id, category, context, limit=3)
+        if await async_client.collection_exists(PHRASE_COUNTS_COLLECTION):
+            await async_client.delete_collection(PHRASE_COUNTS_COLLECTION)
+        await _async_create_counts_collection()
+        points = [_counter_point(key, count, last_seen) for key, (count, last_seen) in totals.items()]
+        for start in range(0, len(points), batch_size):
+            await async_client.upsert(collection_name=PHRASE_COUNTS_COLLECTION, points=points[start:start + batch_size])
+    finally:
+        _end_count_writes(keys, [])
+    with _phrase_counts_lock:
+        _phrase_counts.clear()
+    print(f"✓ Counted {len(totals)} phrases from the phrase history")
+    return len(totals)
 
-        # Get top phrases in category
-        top_phrases = get_top_phrases_in_category(child_id, category, limit=3)
 
-        # Build personalization string
-        personalization = ""
+def rebuild_phrase_counts() -> int:
+    """Recount every phrase from the history into the counter points"""
+    return _run(async_rebuild_phrase_counts())
 
-        if similar:
-            phrases_from_similar = [s["phrase"] for s in similar if s.get("phrase")]
-            if phrases_from_similar:
-                personalization += f"In similar situations, this child has said: {', '.join(phrases_from_similar)}. "
 
-        if top_phrases:
-            personalization += f"This child frequently uses these phrases in this category: {', '.join(top_phrases)}. "
+_compaction_stop = threading.Event()
+_compaction_thread: Optional[threading.Thread] = None
 
-        if not personalization:
-            personalization = "This is the child's first time in this category or context. Suggest clear, simple phrases based on the category."
 
-        return personalization
-    except Exception as e:
-        print(f"Error building personalization context: {e}")
-        return ""
+def start_compaction_scheduler(interval_hours: float, older_than_days: int = COMPACTION_AGE_DAYS) -> None:
+    """Run compact_history every interval_hours on a daemon thread (once per process)"""
+    global _compaction_thread
+    if _compaction_thread is not None and _compaction_thread.is_alive():
+        return
+
+    def loop():
+        while not _compaction_stop.wait(interval_hours * 3600):
+            try:
+                compact_history(older_than_days)
+            except Exception as e:
+                print(f"Error compacting phrase history: {e}")
+
+    _compaction_stop.clear()
+    _compaction_thread = threading.Thread(target=loop, name="phrase-compaction", daemon=True)
+    _compaction_thread.start()
+
+
+def stop_compaction_scheduler() -> None:
+    """Stop the background compaction thread"""
+    _compaction_stop.set()
+
+
+def _load_checkpoint(path: Path) -> Dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_checkpoint(path: Path, checkpoint: Dict) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(checkpoint), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def backfill_embeddings(
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    delay: float = BACKFILL_DELAY_SECONDS,
+    checkpoint_path: Path = BACKFILL_CHECKPOINT_PATH,
+) -> int:
+    """
+    Re-embed points stored with a dummy zero vector.
+    Scrolls each collection page by page, embeds the stored context_str of
+    zero-norm points with one batched call per page (waiting `delay` seconds
+    between calls) and upserts the vectors in place. Progress is saved to a
+    checkpoint after every page, so an interrupted or quota-limited run
+    resumes where it stopped. Returns the number of points repaired.
+    """
+    checkpoint = _load_checkpoint(checkpoint_path)
+    repaired = 0
+
+    for collection_name in partition_collections():
+        if not client.collection_exists(collection_name):
+            continue
+        state = checkpoint.setdefault(collection_name, {"offset": None, "done": False})
+        if state["done"]:
+            continue
+
+        while True:
+            records, next_offset = client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=state["offset"],
+                with_payload=True,
+                with_vectors=True,
+            )
+            broken = [
+                r for r in records
+                if not any(r.vector or []) and (r.payload or {}).get("context_str")
+            ]
+
+            if broken:
+                with request_priority(BACKGROUND):
+                    embeddings = generate_embeddings([r.payload["context_str"] for r in broken])
+                fixed = [
+                    PointStruct(id=r.id, vector=embedding, payload=r.payload)
+                    for r, embedding in zip(broken, embeddings)
+                    if embedding
+                ]
+                if fixed:
+                    client.upsert(collection_name=collection_name, points=fixed)
+                    _invalidate_personalization({p.payload.get("child_id") for p in fixed})
+                    repaired += len(fixed)
+                if len(fixed) < len(broken):
+                    # Embedding still failing (quota) - stop here and retry this page next run
+                    _save_checkpoint(checkpoint_path, checkpoint)
+                    print(f"Backfill paused after {repaired} points; embedding unavailable")
+                    return repaired
+
+            state["offset"] = next_offset
+            state["done"] = next_offset is None
+            _save_checkpoint(checkpoint_path, checkpoint)
+            if state["done"]:
+                break
+            if broken and delay > 0:
+                time.sleep(delay)
+
+    checkpoint_path.unlink(missing_ok=True)
+    print(f"✓ Backfilled {repaired} embeddings")
+    return repaired
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="EchoMind phrase history maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="move points into the configured partitioning layout")
+    commands.add_parser("recount", help="rebuild the phrase counts from the phrase history")
+    compact = commands.add_parser("compact", help="roll old selections up into aggregate points")
+    compact.add_argument("--days", type=int, default=COMPACTION_AGE_DAYS, help="age in days of selections to roll up")
+    backfill = commands.add_parser("backfill", help="re-embed points stored with dummy zero vectors")
+    backfill.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="points scanned (and embedded) per call")
+    backfill.add_argument("--delay", type=float, default=BACKFILL_DELAY_SECONDS, help="seconds to wait between embedding calls")
+    backfill.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate_partitions()
+    elif args.command == "recount":
+        init_qdrant()
+        rebuild_phrase_counts()
+    elif args.command == "compact":
+        compact_history(args.days)
+    elif args.command == "backfill":
+        if args.restart:
+            BACKFILL_CHECKPOINT_PATH.unlink(missing_ok=True)
+        backfill_embeddings(batch_size=args.batch_size, delay=args.delay)
+    ingest_queue.close()
@@ -0,0 +1,685 @@
+"""
+Resilience helpers for EchoMind
+Process-wide coalescing of identical Gemini and embedding calls,
+per-model latency tracking, hedged requests, client-side rate limiting
+and circuit breakers
+"""
+
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+# Client-side quotas in requests per minute; 0 leaves a limiter unlimited
+GENERATION_RPM = float(os.getenv("GEMINI_GENERATION_RPM", "0"))
+EMBEDDING_RPM = float(os.getenv("GEMINI_EMBEDDING_RPM", "0"))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))  # Seconds before a queued call gives up
+RATE_LIMIT_POLL_SECONDS = 0.05  # How often a queued coroutine rechecks its place in line
+
+# Circuit breakers: open after this many consecutive failures, retry after the reset time
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Seconds between status log lines with limiter and breaker metrics; 0 disables them
+RESILIENCE_STATUS_SECONDS = float(os.getenv("RESILIENCE_STATUS_SECONDS", "300"))
+
+# Request priorities (lower is served first)
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+class _SharedStream:
+    """Replayable view of one iterator; whichever reader is furthest ahead pulls the next item"""
+
+    def __init__(self, source: Iterator, on_done: Callable[[], None]):
+        self._source = source
+        self._on_done = on_done
+        self._items: List[Any] = []
+        self._error: Exception = None
+        self._done = False
+        self._lock = threading.Lock()
+
+    def reader(self) -> Iterator:
+        index = 0
+        while True:
+            if index < len(self._items):
+                yield self._items[index]
+                index += 1
+                continue
+            with self._lock:
+                if index == len(self._items) and not self._done:
+                    try:
+                        self._items.append(next(self._source))
+                    except StopIteration:
+                        self._finish()
+                    except Exception as e:
+                        self._error = e
+                        self._finish()
+                if index < len(self._items):
+                    continue
+                if self._error is not None:
+                    raise self._error
+                return
+
+    def _finish(self) -> None:
+        self._done = True
+        self._on_done()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one in-flight call.
+    Every caller receives the leader's result (or exception); the key is
+    released as soon as the call finishes, so later callers start afresh.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._tasks: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: str, func: Callable, *args, **kwargs):
+        """Call func, or wait for the identical call already in flight"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key: str, func: Callable, *args, **kwargs):
+        """Await func, or the identical call already in flight on this event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._tasks.get((loop, key))
+            leader = future is None
+            if leader:
+                future = self._tasks[(loop, key)] = loop.create_future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            result = await func(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved here so callers without followers do not warn
+            raise
+        finally:
+            with self._lock:
+                self._tasks.pop((loop, key), None)
+
+    def submit(self, key: str, executor, func: Callable, *args, **kwargs) -> Future:
+        """
+        Future of func run on executor, or of the identical call already in
+        flight; followers get the same Future and take no worker to wait
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future
+            future = self._calls[key] = Future()
+            self.calls += 1
+
+        def run():
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+
+        try:
+            executor.submit(run)
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            future.set_exception(e)
+        return future
+
+    def do_stream(self, key: str, func: Callable[..., Iterator], *args, **kwargs) -> Iterator:
+        """Iterate func's stream, or replay and follow the identical stream already in flight"""
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                def release():
+                    with self._lock:
+                        if self._streams.get(key) is stream:
+                            del self._streams[key]
+
+                stream = self._streams[key] = _SharedStream(iter(func(*args, **kwargs)), release)
+                self.calls += 1
+            else:
+                self.shared += 1
+        return stream.reader()
+
+    def stats(self) -> Dict[str, int]:
+        """Return how many calls were made and how many callers shared one"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "shared": self.shared,
+                "in_flight": len(self._calls) + len(self._tasks) + len(self._streams),
+            }
+
+
+single_flight = SingleFlight()
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies per name (e.g. per model)"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def reset(self, name: str) -> None:
+        """Forget the samples of name (e.g. once they no longer describe it)"""
+        with self._lock:
+            self._samples.pop(name, None)
+
+    def percentile(self, name: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Return the q-quantile (0..1) of recent samples, or None with too few samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return sample count and p50/p90/p99 per name"""
+        with self._lock:
+            names = list(self._samples)
+        return {
+            name: {
+                "count": len(self._samples[name]),
+                "p50": self.percentile(name, 0.5),
+                "p90": self.percentile(name, 0.9),
+                "p99": self.percentile(name, 0.99),
+            }
+            for name in names
+        }
+
+
+latency = LatencyTracker()
+
+
+def _start(target: Callable, *args, name: str = "hedge") -> None:
+    # Plain daemon threads: hedges may run inside pool workers, so they must not wait on a pool
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(target, *args), daemon=True, name=name).start()
+
+
+def spawn(func: Callable, *args, **kwargs) -> Future:
+    """
+    Run func on its own daemon thread (in a copy of the caller's context).
+    For calls that must start now: a shared pool can be full of abandoned work.
+    """
+    future: Future = Future()
+
+    def run():
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    _start(run, name=getattr(func, "__name__", "spawn"))
+    return future
+
+
+def hedge(calls: List[Callable[[], Any]], delay: float) -> Any:
+    """
+    Start calls[0]; each time `delay` seconds pass without a result (or a
+    call fails), start the next one. The first call to return wins; calls
+    should raise on invalid output. Raises the last error if all fail.
+    """
+    results: "queue.Queue" = queue.Queue()
+
+    def run(call):
+        try:
+            results.put((True, call()))
+        except Exception as e:
+            results.put((False, e))
+
+    started = failed = 0
+    _start(run, calls[0])
+    started += 1
+    while True:
+        try:
+            ok, value = results.get(timeout=delay if started < len(calls) else None)
+        except queue.Empty:
+            _start(run, calls[started])
+            started += 1
+            continue
+        if ok:
+            return value
+        failed += 1
+        if started < len(calls):
+            _start(run, calls[started])
+            started += 1
+        elif failed == started:
+            raise value
+
+
+def hedge_iter(sources: List[Callable[[], Iterator]], delay: float) -> Iterator:
+    """
+    Streaming hedge: like hedge, but the race is to the first item. The
+    first source to yield commits the stream; items from the others are dropped.
+    """
+    items: "queue.Queue" = queue.Queue()
+
+    def pump(index, source):
+        try:
+            for item in source():
+                items.put((index, True, item))
+            items.put((index, False, None))
+        except Exception as e:
+            items.put((index, False, e))
+
+    started = failed = 0
+    winner = None
+    _start(pump, started, sources[started])
+    started += 1
+    while True:
+        hedging = winner is None and started < len(sources)
+        try:
+            index, more, item = items.get(timeout=delay if hedging else None)
+        except queue.Empty:
+            _start(pump, started, sources[started])
+            started += 1
+            continue
+        if winner is None and more:
+            winner = index
+        if winner is not None:
+            if index != winner:
+                continue
+            if more:
+                yield item
+                continue
+            if item is not None:
+                raise item
+            return
+
+        # A source ended before yielding anything: hedge right away
+        failed += 1
+        if started < len(sources):
+            _start(pump, started, sources[started])
+            started += 1
+        elif failed == started:
+            if item is not None:
+                raise item
+            return
+
+
+@contextmanager
+def request_priority(level: int):
+    """Run the enclosed calls (and anything started with in_context) at a priority"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def in_context(func: Callable) -> Callable:
+    """Bind func to a copy of the current context, so pool workers keep the request priority"""
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+class RateLimited(Exception):
+    """A call waited longer than RATE_LIMIT_MAX_WAIT for a rate limit token"""
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every session in the process.
+    Callers that find the bucket empty queue up and are served by priority
+    (then arrival), so interactive requests overtake background work.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: Optional[float] = None):
+        self.name = name
+        self.rate = per_minute / 60
+        self.capacity = burst if burst is not None else max(1.0, self.rate * 10)
+        self._tokens = self.capacity
+        self._refilled = time.monotonic()
+        self._waiters: List[Tuple[int, int]] = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self.admitted = 0
+        self.rejected = 0
+        self.waited_total = 0.0
+        self.waited_max = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _take(self, entry: Tuple[int, int], started: float, timeout: float) -> float:
+        """Take a token if entry is first in line (returns 0), else the seconds to wait (hold _cond)"""
+        self._refill()
+        if self._waiters[0] == entry and self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        remaining = started + timeout - time.monotonic()
+        if remaining <= 0:
+            self.rejected += 1
+            raise RateLimited(f"{self.name} rate limit: waited {timeout:.0f}s")
+        shortfall = max(1 - self._tokens, 0) / self.rate
+        return min(remaining, shortfall or remaining)
+
+    def _leave(self, entry: Tuple[int, int]) -> None:
+        """Leave the line and wake the waiters behind (hold _cond)"""
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        self._cond.notify_all()
+
+    def _admit(self, started: float) -> None:
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.waited_total += waited
+        self.waited_max = max(self.waited_max, waited)
+
+    def acquire(self, priority: Optional[int] = None, timeout: float = RATE_LIMIT_MAX_WAIT) -> None:
+        """Take a token, waiting in priority order; raises RateLimited after timeout seconds"""
+        if self.rate <= 0:
+            return
+        priority = _priority.get() if priority is None else priority
+        started = time.monotonic()
+        entry = (priority, next(self._order))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    delay = self._take(entry, started, timeout)
+                    if not delay:
+                        break
+                    self._cond.wait(delay)
+            finally:
+                self._leave(entry)
+        self._admit(started)
+
+    def wrap(self, func: Callable) -> Callable:
+        """func, taking a token before each call"""
+        def limited(*args, **kwargs):
+            self.acquire()
+            return func(*args, **kwargs)
+        return limited
+
+    def wrap_stream(self, func: Callable[..., Iterator]) -> Callable[..., Iterator]:
+        """Streaming func, taking a token when iteration starts"""
+        def limited(*args, **kwargs):
+            self.acquire()
+            yield from func(*args, **kwargs)
+        return limited
+
+    async def acquire_async(self, priority: Optional[int] = None, timeout: float = RATE_LIMIT_MAX_WAIT) -> None:
+        """
+        acquire() for coroutines: waits with asyncio.sleep, so queued calls
+        hold no thread (the loop's executor stays free for store I/O).
+        """
+        if self.rate <= 0:
+            return
+        priority = _priority.get() if priority is None else priority
+        started = time.monotonic()
+        entry = (priority, next(self._order))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._take(entry, started, timeout)
+                if not delay:
+                    break
+                # Not woken by notify_all like threads, so recheck the line regularly
+                await asyncio.sleep(min(delay, RATE_LIMIT_POLL_SECONDS))
+        finally:
+            with self._cond:
+                self._leave(entry)
+        self._admit(started)
+
+    def stats(self) -> Dict[str, float]:
+        """Return queue depth (per priority), admissions, rejections and wait times"""
+        with self._cond:
+            queued = [priority for priority, _ in self._waiters]
+            return {
+                "queue_depth": len(queued),
+                "queued_interactive": queued.count(INTERACTIVE),
+                "queued_background": queued.count(BACKGROUND),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "wait_mean": self.waited_total / self.admitted if self.admitted else 0.0,
+                "wait_max": self.waited_max,
+            }
+
+
+generation_limiter = RateLimiter("generation", GENERATION_RPM)
+embedding_limiter = RateLimiter("embedding", EMBEDDING_RPM)
+
+
+def limiter_stats() -> Dict[str, Dict[str, float]]:
+    """Queue depth and wait-time metrics for every shared limiter"""
+    return {limiter.name: limiter.stats() for limiter in (generation_limiter, embedding_limiter)}
+
+
+class CircuitOpen(Exception):
+    """The circuit breaker is open; use the degraded path instead of calling"""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures.
+    While open, calls fail fast with CircuitOpen. After `reset_timeout`
+    seconds the breaker is half-open and lets one trial call through;
+    its outcome closes or re-opens the breaker. If a `probe` is set, a
+    background thread also tries it every `reset_timeout` seconds while
+    open and closes the breaker as soon as it succeeds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_SECONDS,
+        probe: Optional[Callable[[], Any]] = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe = probe
+        self.failures = 0
+        self.trips = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def available(self) -> bool:
+        """True unless calls would currently fail fast (does not use up the half-open trial)"""
+        with self._lock:
+            state = self.state
+            return state == "closed" or (state == "half_open" and not self._trial)
+
+    def _admit(self) -> None:
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._trial):
+                raise CircuitOpen(f"{self.name} circuit is open")
+            if state == "half_open":
+                self._trial = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"✓ {self.name} circuit closed")
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            reopen = self._opened_at is not None
+            if not reopen and self.failures < self.failure_threshold:
+                return
+            if not reopen:
+                self.trips += 1
+                print(f"{self.name} circuit opened after {self.failures} failures")
+            self._opened_at = time.monotonic()
+            start_probe = self.probe is not None and not self._probing
+            self._probing = self._probing or start_probe
+        if start_probe:
+            threading.Thread(target=self._probe_loop, daemon=True, name=f"{self.name}-probe").start()
+
+    def _probe_loop(self) -> None:
+        while True:
+            time.sleep(self.reset_timeout)
+            with self._lock:
+                if self._opened_at is None:
+                    self._probing = False
+                    return
+            try:
+                self.probe()
+            except Exception:
+                with self._lock:
+                    self._opened_at = time.monotonic()
+                continue
+            self.record_success()
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Call func through the breaker; raises CircuitOpen while open"""
+        self._admit()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, func: Callable, *args, **kwargs):
+        """Await func through the breaker; raises CircuitOpen while open"""
+        self._admit()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def wrap(self, func: Callable) -> Callable:
+        """func, called through the breaker"""
+        return functools.partial(self.call, func)
+
+    def wrap_stream(self, func: Callable[..., Iterator]) -> Callable[..., Iterator]:
+        """Streaming func through the breaker; errors while iterating count as failures"""
+        def guarded(*args, **kwargs):
+            self._admit()
+            try:
+                yield from func(*args, **kwargs)
+            except Exception:
+                self.record_failure()
+                raise
+            finally:
+                with self._lock:
+                    self._trial = False
+            self.record_success()
+        return guarded
+
+    def stats(self) -> Dict[str, Any]:
+        """Return state, consecutive failures and trip count"""
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "trips": self.trips}
+
+
+generation_breaker = CircuitBreaker("generation")
+embedding_breaker = CircuitBreaker("embedding")
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """State of every shared circuit breaker, for monitoring"""
+    return {breaker.name: breaker.stats() for breaker in (generation_breaker, embedding_breaker)}
+
+
+def status_line() -> str:
+    """Limiter queue depth and wait times plus breaker states, on one line"""
+    parts = [
+        f"{name} limiter: {s['queue_depth']} queued ({s['queued_interactive']} interactive), "
+        f"{s['admitted']} admitted, {s['rejected']} rejected, "
+        f"wait mean {s['wait_mean'] * 1000:.0f} ms max {s['wait_max'] * 1000:.0f} ms"
+        for name, s in limiter_stats().items()
+    ]
+    parts += [
+        f"{name} breaker: {s['state']} ({s['failures']} failures, {s['trips']} trips)"
+        for name, s in breaker_stats().items()
+    ]
+    return "; ".join(parts)
+
+
+_status_thread: Optional[threading.Thread] = None
+
+
+def start_status_log(interval: float = RESILIENCE_STATUS_SECONDS) -> None:
+    """Print status_line() every interval seconds on a daemon thread (once per process)"""
+    global _status_thread
+    if interval <= 0 or _status_thread is not None:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            print(f"Resilience status: {status_line()}")
+
+    _status_thread = threading.Thread(target=loop, name="resilience-status", daemon=True)
+    _status_thread.start()
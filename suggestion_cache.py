@@ -0,0 +1,119 @@
+"""
+Suggestion cache for EchoMind
+TTL + LRU cache of generated phrase suggestions, keyed by a canonical hash of the prompt inputs
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+Phrases = List[Dict[str, str]]
+
+
+class SuggestionCache:
+    """
+    Process-wide cache of phrase suggestions.
+    Entries expire after `ttl` seconds and the least recently used entries
+    are evicted beyond `max_entries`. With a path, entries are also kept in
+    a SQLite file so they survive restarts.
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 512, path: Optional[Path] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Phrases]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._load()
+
+    @staticmethod
+    def make_key(**inputs) -> str:
+        """Canonical hash of the prompt inputs (order-independent)"""
+        canonical = json.dumps(inputs, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._db is None and self.path is not None:
+            try:
+                self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS suggestions (key TEXT PRIMARY KEY, expires REAL NOT NULL, phrases TEXT NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Suggestion cache disabled on disk: {e}")
+                self.path = None
+                self._db = None
+        return self._db
+
+    def _load(self) -> None:
+        db = self._connect()
+        if db is None:
+            return
+        now = time.time()
+        try:
+            db.execute("DELETE FROM suggestions WHERE expires <= ?", (now,))
+            db.commit()
+            rows = db.execute(
+                "SELECT key, expires, phrases FROM suggestions ORDER BY expires DESC LIMIT ?",
+                (self.max_entries,),
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error loading suggestion cache: {e}")
+            return
+        for key, expires, phrases in reversed(rows):
+            self._entries[key] = (expires, json.loads(phrases))
+
+    def get(self, key: str) -> Optional[Phrases]:
+        """Return cached phrases, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(p) for p in entry[1]]
+
+    def put(self, key: str, phrases: Phrases) -> None:
+        """Cache phrases for a key"""
+        expires = time.time() + self.ttl
+        phrases = [dict(p) for p in phrases]
+        with self._lock:
+            self._entries[key] = (expires, phrases)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            db = self._connect()
+            if db is not None:
+                try:
+                    db.execute(
+                        "INSERT OR REPLACE INTO suggestions (key, expires, phrases) VALUES (?, ?, ?)",
+                        (key, expires, json.dumps(phrases, ensure_ascii=False)),
+                    )
+                    db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing suggestion cache: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters, hit rate and size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
@@ -25,6 +25,13 @@ def mock_session_state():
         mock_state.get.side_effect = get_side_effect
         yield mock_state
 
+@pytest.fixture(autouse=True)
+def empty_history_stamp():
+    """Keep suggestion cache keys off the real phrase store."""
+    with patch("app.qdrant_manager.get_history_stamp", return_value=""):
+        yield
+
+
 def test_get_current_datetime():
     """Test that get_current_datetime returns the correct keys."""
     dt = get_current_datetime()
@@ -107,6 +114,18 @@ def test_load_prompt_template():
     prompt_fallback = load_prompt_template("xx") # non-existent language
     assert "Generate three short, simple phrases" in prompt_fallback
 
+@pytest.fixture
+def fresh_gemini_client():
+    """Build the Gemini client from the patched genai.Client, behind a closed breaker."""
+    from app import get_gemini_client
+    from resilience import CircuitBreaker
+
+    get_gemini_client.clear()
+    with patch("app.generation_breaker", CircuitBreaker("generation")):
+        yield
+    get_gemini_client.clear()
+
+@pytest.mark.usefixtures("fresh_gemini_client")
 @patch("app.genai.Client")
 @patch("app.load_predict_intent_prompt_template")
 @patch("app.st.error")
@@ -123,47 +142,369 @@ def test_predict_intent_success(mock_st_stop, mock_st_error, mock_load_template,
     mock_st_error.assert_not_called()
     mock_st_stop.assert_not_called()
 
+@pytest.mark.usefixtures("fresh_gemini_client")
 @patch("app.genai.Client")
 @patch("app.load_predict_intent_prompt_template")
 @patch("app.st.error")
 @patch("app.st.stop")
 def test_predict_intent_empty_response(mock_st_stop, mock_st_error, mock_load_template, mock_genai_client):
-    """Test empty Gemini response for intent prediction."""
+    """Test that an empty Gemini response falls back to the child's own words."""
     from app import predict_intent # Import here to get patched version
 
     mock_load_template.return_value = "Predict intent for: {child_input}"
     mock_genai_client.return_value.models.generate_content.return_value.text = ''
 
-    predict_intent("nothing", "en")
-    mock_st_error.assert_called_once()
-    mock_st_stop.assert_called_once()
+    assert predict_intent("nothing", "en") == {"text": "nothing", "emoji": "💬"}
+    mock_st_error.assert_not_called()
+    mock_st_stop.assert_not_called()
 
+@pytest.mark.usefixtures("fresh_gemini_client")
 @patch("app.genai.Client")
 @patch("app.load_predict_intent_prompt_template")
 @patch("app.st.error")
 @patch("app.st.stop")
 def test_predict_intent_invalid_json(mock_st_stop, mock_st_error, mock_load_template, mock_genai_client):
-    """Test invalid JSON response for intent prediction."""
+    """Test that an invalid JSON response falls back to the child's own words."""
     from app import predict_intent # Import here to get patched version
 
     mock_load_template.return_value = "Predict intent for: {child_input}"
     mock_genai_client.return_value.models.generate_content.return_value.text = '{"text": "I want food", "emoji": "🍔"' # Malformed JSON
 
-    predict_intent("malformed", "en")
-    mock_st_error.assert_called_once()
-    mock_st_stop.assert_called_once()
+    assert predict_intent("malformed", "en") == {"text": "malformed", "emoji": "💬"}
+    mock_st_error.assert_not_called()
+    mock_st_stop.assert_not_called()
 
+@pytest.mark.usefixtures("fresh_gemini_client")
 @patch("app.genai.Client")
 @patch("app.load_predict_intent_prompt_template")
 @patch("app.st.error")
 @patch("app.st.stop")
 def test_predict_intent_api_error(mock_st_stop, mock_st_error, mock_load_template, mock_genai_client):
-    """Test Gemini API error for intent prediction."""
+    """Test that a Gemini API error falls back to the child's own words."""
     from app import predict_intent # Import here to get patched version
 
     mock_load_template.return_value = "Predict intent for: {child_input}"
     mock_genai_client.return_value.models.generate_content.side_effect = Exception("API down")
 
-    predict_intent("error", "en")
-    mock_st_error.assert_called_once()
-    mock_st_stop.assert_called_once()
+    assert predict_intent("error", "en") == {"text": "error", "emoji": "💬"}
+    mock_st_error.assert_not_called()
+    mock_st_stop.assert_not_called()
+
+
+@pytest.mark.usefixtures("fresh_gemini_client")
+@patch("app.genai.Client")
+@patch("app.load_predict_intent_prompt_template")
+@patch("app.st.error")
+@patch("app.st.stop")
+def test_predict_intent_rejects_non_string_fields(mock_st_stop, mock_st_error, mock_load_template, mock_genai_client):
+    """Test that a phrase with a missing or non-string field falls back to the child's own words."""
+    from app import predict_intent # Import here to get patched version
+
+    mock_load_template.return_value = "Predict intent for: {child_input}"
+    mock_genai_client.return_value.models.generate_content.return_value.text = '```json\n{"text": 42, "emoji": "🍔"}\n```'
+
+    assert predict_intent("food", "en") == {"text": "food", "emoji": "💬"}
+    mock_st_stop.assert_not_called()
+
+
+class FakeSessionState(dict):
+    """Dict with attribute access, like st.session_state."""
+    __getattr__ = dict.get
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+PREFETCHED = [{"text": "I want water", "emoji": "💧"}]
+
+
+@patch("app.get_suggestion_cache")
+@patch("app.get_gemini_client")
+@patch("app.generate_suggestions", return_value=PREFETCHED)
+def test_prefetch_covers_every_category(mock_generate, mock_client, mock_cache):
+    """Test that prefetch generates each category once and hands it over."""
+    from app import CATEGORY_CONFIGS, start_prefetch, take_prefetched
+
+    session = FakeSessionState(latitude=None, longitude=None)
+    with patch("app.st.session_state", session):
+        start_prefetch("en")
+        start_prefetch("en")  # Already in flight, nothing new is submitted
+        for job in session.prefetch["jobs"].values():
+            job["future"].result(5)
+        for category in CATEGORY_CONFIGS["en"]:
+            assert take_prefetched(category, "en") == PREFETCHED
+        assert mock_generate.call_count == len(CATEGORY_CONFIGS["en"])
+
+        assert take_prefetched("Body & Needs", "en") is None  # Claimed once
+        assert take_prefetched("Help & Safety", "bn") is None  # Other language
+
+
+@patch("app.get_suggestion_cache")
+@patch("app.get_gemini_client")
+@patch("app.generate_suggestions", return_value=PREFETCHED)
+def test_tap_does_not_wait_behind_queued_prefetch(mock_generate, mock_client, mock_cache):
+    """Test that a prefetch still queued is cancelled so the tap can ask Gemini directly."""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app import start_prefetch, take_prefetched
+
+    busy, release = ThreadPoolExecutor(max_workers=1), threading.Event()
+    busy.submit(release.wait, 5)  # Another session's background work holds the only worker
+    session = FakeSessionState(latitude=None, longitude=None)
+    with patch("app.st.session_state", session), patch("app.get_prefetch_executor", return_value=busy):
+        start_prefetch("en")
+        assert take_prefetched("Body & Needs", "en") is None
+    release.set()
+    busy.shutdown(wait=True)
+
+    assert mock_generate.call_count == len(session.prefetch["jobs"])  # The claimed job never ran
+
+
+@patch("app.get_suggestion_cache")
+@patch("app.get_gemini_client")
+@patch("app.generate_suggestions", return_value=PREFETCHED)
+def test_language_change_cancels_prefetch(mock_generate, mock_client, mock_cache):
+    """Test that switching language discards the old prefetch."""
+    from app import cancel_prefetch, start_prefetch, take_prefetched
+
+    session = FakeSessionState(latitude=None, longitude=None)
+    with patch("app.st.session_state", session):
+        start_prefetch("en")
+        cancelled = session.prefetch["cancelled"]
+        cancel_prefetch()
+        assert cancelled.is_set()
+        assert take_prefetched("Body & Needs", "en") is None
+
+
+def test_stream_parser_emits_phrases_as_they_complete():
+    """Test that each phrase is emitted as soon as its JSON item closes."""
+    from app import PhraseStreamParser
+
+    parser = PhraseStreamParser()
+    assert parser.feed('```json\n{"phrases": [{"text": "Say \\"hi\\" }", "emo') == []
+    assert parser.feed('ji": "👋"}, ["I am hungry", "🍎"') == [{"text": 'Say "hi" }', "emoji": "👋"}]
+    assert parser.feed('], {"text": "Bathroom", "emoji": "🚽"}]}\n```') == [
+        {"text": "I am hungry", "emoji": "🍎"},
+        {"text": "Bathroom", "emoji": "🚽"},
+    ]
+
+
+def test_stream_suggestions_caches_complete_answer():
+    """Test that a full stream is cached and replayed without another call."""
+    from app import stream_suggestions
+    from suggestion_cache import SuggestionCache
+
+    client = Mock()
+    client.models.generate_content_stream.return_value = [
+        Mock(text='[{"text": "a", "emoji": "1"}, {"text": "b", '),
+        Mock(text='"emoji": "2"}, {"text": "c", "emoji": "3"}]'),
+    ]
+    cache = SuggestionCache()
+    context = {"child_id": "c1", "time_of_day": "morning"}
+
+    first = list(stream_suggestions(client, cache, "Food", context, "en", personalize=False))
+    second = list(stream_suggestions(client, cache, "Food", context, "en", personalize=False))
+    assert [p["text"] for p in first] == ["a", "b", "c"]
+    assert second == first
+    client.models.generate_content_stream.assert_called_once()
+
+
+def test_slow_personalization_is_skipped():
+    """Test that the prompt goes out without personalization once the budget runs out."""
+    import threading
+    from app import generate_suggestions
+    from suggestion_cache import SuggestionCache
+
+    release = threading.Event()
+    client = Mock()
+    client.models.generate_content.return_value.text = '[["a", "1"], ["b", "2"], ["c", "3"]]'
+    with patch("app.PERSONALIZATION_BUDGET_MS", 10), \
+         patch("app.qdrant_manager.get_personalization_context", side_effect=lambda **_: release.wait(5) or "Likes trains"):
+        generate_suggestions(client, SuggestionCache(), "Food", {"child_id": "c1"}, "en")
+    release.set()
+
+    prompt = client.models.generate_content.call_args.kwargs["contents"]
+    assert "Likes trains" not in prompt
+
+
+def test_cache_hit_skips_personalization_lookup():
+    """Test that a cached answer is served without a lookup until the child's history changes."""
+    from app import generate_suggestions
+    from suggestion_cache import SuggestionCache
+
+    client = Mock()
+    client.models.generate_content.return_value.text = '[["a", "1"], ["b", "2"], ["c", "3"]]'
+    cache = SuggestionCache()
+    stamps = {("c1", "Food"): "2024-01-01T08:00:00"}
+    with patch("app.qdrant_manager.get_personalization_context", return_value="Likes trains") as lookup, \
+         patch("app.qdrant_manager.get_history_stamp", side_effect=lambda *key: stamps[key]):
+        generate_suggestions(client, cache, "Food", {"child_id": "c1"}, "en")
+        generate_suggestions(client, cache, "Food", {"child_id": "c1"}, "en")
+        assert lookup.call_count == 1
+        assert client.models.generate_content.call_count == 1
+
+        # A selection stored by any worker, before or after a restart
+        stamps[("c1", "Food")] = "2024-01-01T08:05:00"
+        generate_suggestions(client, cache, "Food", {"child_id": "c1"}, "en")
+        assert lookup.call_count == 2
+
+
+def test_unreadable_history_stamp_bypasses_the_cache():
+    """Test that answers are neither served from nor stored in the cache without a history stamp."""
+    from app import generate_suggestions
+    from suggestion_cache import SuggestionCache
+
+    client = Mock()
+    client.models.generate_content.return_value.text = '[["a", "1"], ["b", "2"], ["c", "3"]]'
+    cache = SuggestionCache()
+    with patch("app.qdrant_manager.get_personalization_context", return_value=""), \
+         patch("app.qdrant_manager.get_history_stamp", return_value=None):
+        generate_suggestions(client, cache, "Food", {"child_id": "c1"}, "en")
+        generate_suggestions(client, cache, "Food", {"child_id": "c1"}, "en")
+
+    assert client.models.generate_content.call_count == 2
+
+
+def test_abandoned_lookups_never_hold_up_gemini():
+    """Test that lookups left running past their budget neither stack up per child nor delay Gemini."""
+    import threading
+    from app import LOOKUP_WORKERS, generate_suggestions
+    from suggestion_cache import SuggestionCache
+
+    release = threading.Event()
+    lookups = []
+    client = Mock()
+    client.models.generate_content.return_value.text = '[["a", "1"], ["b", "2"], ["c", "3"]]'
+
+    def slow_lookup(child_id, **_):
+        lookups.append(child_id)
+        return release.wait(5) and ""
+
+    children = [f"c{i}" for i in range(LOOKUP_WORKERS + 2)]
+    with patch("app.PERSONALIZATION_BUDGET_MS", 10), \
+         patch("app.SUGGESTION_DEADLINE_SECONDS", 1), \
+         patch("app.qdrant_manager.get_personalization_context", side_effect=slow_lookup):
+        results = [
+            generate_suggestions(client, SuggestionCache(), "Food", {"child_id": child_id}, "en")
+            for child_id in children * 2
+        ]
+    release.set()
+
+    assert all([p["text"] for p in result] == ["a", "b", "c"] for result in results)
+    assert len(lookups) == len(set(lookups))  # Repeat requests joined the lookup in flight
+
+
+def test_concurrent_lookups_for_other_contexts_are_not_joined():
+    """Test that in-flight personalization is only shared by requests with the same coarse context."""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app import _suggestion_prompt
+
+    both_in_flight = threading.Barrier(2, timeout=2)
+
+    def lookup(child_id, category, context):
+        both_in_flight.wait()
+        return f"Likes {context['time_of_day']} snacks"
+
+    contexts = [{"child_id": "c1", "time_of_day": "morning"}, {"child_id": "c1", "time_of_day": "evening"}]
+    with patch("app.PERSONALIZATION_BUDGET_MS", 3000), \
+         patch("app.qdrant_manager.get_personalization_context", side_effect=lookup), \
+         ThreadPoolExecutor(max_workers=2) as pool:
+        prompts = list(pool.map(lambda context: _suggestion_prompt("Food", context, "en", True), contexts))
+
+    assert "Likes morning snacks" in prompts[0][0]
+    assert "Likes evening snacks" in prompts[1][0]
+
+
+def test_missed_deadline_falls_back_to_local_phrases():
+    """Test that a slow Gemini call yields the child's frequent and offline phrases."""
+    import threading
+    from app import generate_suggestions
+    from suggestion_cache import SuggestionCache
+
+    release = threading.Event()
+    client = Mock()
+    client.models.generate_content.side_effect = lambda **_: release.wait(5)
+    with patch("app.SUGGESTION_DEADLINE_SECONDS", 0.05), \
+         patch("app.qdrant_manager.get_personalization_context", return_value=""), \
+         patch("app.qdrant_manager.get_top_phrases_in_category", return_value=["I want juice"]):
+        result = generate_suggestions(client, SuggestionCache(), "Body & Needs", {"child_id": "c1"}, "en", personalize=True)
+    release.set()
+
+    assert [p["text"] for p in result] == ["I want juice", "I want water", "I am hungry"]
+
+
+def test_open_circuit_skips_gemini():
+    """Test that an open generation breaker goes straight to local phrases."""
+    from app import generate_suggestions
+    from resilience import CircuitBreaker
+    from suggestion_cache import SuggestionCache
+
+    breaker = CircuitBreaker("generation", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    client = Mock()
+    with patch("app.generation_breaker", breaker):
+        result = generate_suggestions(client, SuggestionCache(), "Body & Needs", {"child_id": "c1"}, "en", personalize=False)
+
+    assert [p["text"] for p in result] == ["I want water", "I am hungry", "I need the bathroom"]
+    client.models.generate_content.assert_not_called()
+
+
+def test_json_mode_only_for_models_that_support_it():
+    """Test that the default model gets a plain prompt while newer models get the response schema."""
+    from app import SUGGESTION_SCHEMA, _gemini_config
+
+    assert _gemini_config("gemini-pro", SUGGESTION_SCHEMA).response_schema is None
+    assert _gemini_config("models/gemini-1.5-flash", SUGGESTION_SCHEMA).response_schema is not None
+    with patch("app.GEMINI_JSON_MODE", "0"):
+        assert _gemini_config("gemini-2.0-flash", SUGGESTION_SCHEMA).response_schema is None
+    with patch("app.GEMINI_JSON_MODE", "1"):
+        assert _gemini_config("gemini-pro", SUGGESTION_SCHEMA).response_mime_type == "application/json"
+
+
+def test_salvage_phrases_keeps_valid_items():
+    """Test that salvage drops invalid items and caps the answer at three."""
+    from app import salvage_phrases
+
+    raw = '{"phrases": [{"text": "", "emoji": "💧"}, ["I am hungry", "🍎"], ["Play", "⚽"], ["Sleep", "😴"], ["Hug", "🤗"]]}'
+    assert [p["text"] for p in salvage_phrases(raw)] == ["I am hungry", "Play", "Sleep"]
+    assert salvage_phrases("not json") == []
+
+
+def test_partial_answer_is_topped_up_not_cached():
+    """Test that a two-phrase answer is filled locally and left out of the cache."""
+    from app import generate_suggestions
+    from suggestion_cache import SuggestionCache
+
+    client = Mock()
+    client.models.generate_content.return_value.text = '{"phrases": [["I am hungry", "🍎"], ["Play", "⚽"]]}'
+    cache = SuggestionCache()
+
+    with patch("app.GEMINI_JSON_MODE", "1"):
+        result = generate_suggestions(client, cache, "Body & Needs", {"child_id": "c1"}, "en", personalize=False)
+    assert [p["text"] for p in result] == ["I am hungry", "Play", "I want water"]
+    assert cache.stats()["entries"] == 0
+
+    config = client.models.generate_content.call_args.kwargs["config"]
+    assert config.response_mime_type == "application/json"
+    assert config.response_schema.properties["phrases"].max_items == 3
+
+
+@patch("app.tts.synthesize", return_value=b"water-mp3")
+def test_options_are_synthesized_before_the_tap(mock_synthesize):
+    """Test that each option starts synthesis when created and a tap reuses it."""
+    from app import make_option, option_audio
+
+    option = make_option(0, {"text": "I want water", "emoji": "💧"}, "en")
+    assert option_audio(option, "en") == b"water-mp3"
+    mock_synthesize.assert_called_once_with("I want water", "en")
+
+
+@patch("app.synthesize_audio", return_value=b"retry-mp3")
+@patch("app.tts.synthesize", side_effect=Exception("network down"))
+def test_failed_presynthesis_retries_on_tap(mock_synthesize, mock_synthesize_audio):
+    """Test that a failed background synthesis falls back to synthesizing on tap."""
+    from app import make_option, option_audio
+
+    option = make_option(0, {"text": "I want water", "emoji": "💧"}, "en")
+    assert option_audio(option, "en") == b"retry-mp3"
@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+from prompt_builder import (
+    build_suggestion_prompt,
+    compact_context,
+    estimate_tokens,
+    get_template,
+)
+
+CONTEXT = {
+    "child_id": "demo_child",
+    "date": "2024-05-01",
+    "time": "08:15:42",
+    "day_of_week": "Wednesday",
+    "time_of_day": "morning",
+    "location": "GPS coordinates: 23.810332, 90.412518",
+    "latitude": "23.810332",
+    "longitude": "90.412518",
+    "last_phrase": "I want water",
+}
+
+
+def test_compact_context_drops_raw_fields():
+    """Test that ids, dates, clock time and precise GPS never reach the prompt."""
+    fields = compact_context("Body & Needs", CONTEXT)
+    assert fields == {
+        "category": "Body & Needs",
+        "time_of_day": "morning",
+        "day_of_week": "Wednesday",
+        "place": "23.81, 90.41",
+        "last_phrase": "I want water",
+    }
+
+
+def test_templates_are_read_once():
+    """Test that a template is loaded from disk once and reused."""
+    template = get_template("suggestion", "en")
+    with patch("prompt_builder.Path.read_text") as mock_read:
+        assert get_template("suggestion", "en") is template
+    mock_read.assert_not_called()
+    assert "{context}" in template.compiled
+    assert "{{" in template.compiled  # JSON example braces are escaped
+
+
+def test_budget_trims_low_value_fields_first():
+    """Test that the budget drops weekday and place before shortening personalization."""
+    personalization = "In similar situations, this child has said: I want juice. They often say: Play outside. "
+    template_tokens = get_template("suggestion", "en").tokens
+    full_prompt, full_tokens = build_suggestion_prompt("en", "Body & Needs", CONTEXT, personalization, budget=10_000)
+    assert "Day Of Week: Wednesday" in full_prompt
+
+    prompt, tokens = build_suggestion_prompt("en", "Body & Needs", CONTEXT, personalization, budget=template_tokens + 45)
+    assert tokens <= template_tokens + 45 < full_tokens
+    assert "Wednesday" not in prompt and "23.81" not in prompt
+    assert "I want juice" in prompt
+    assert "Category: Body & Needs" in prompt
+
+
+def test_estimate_tokens_counts_non_ascii_denser():
+    """Test that Bengali text is estimated at more tokens per character than English."""
+    assert estimate_tokens("I want water") == 3
+    assert estimate_tokens("আমি পানি চাই") > estimate_tokens("I want water")
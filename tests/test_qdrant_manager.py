@@ -0,0 +1,395 @@
+import asyncio
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+import pytest
+from qdrant_client import QdrantClient
+
+import qdrant_manager
+from qdrant_manager import EmbeddingCache
+from vector_store import NumpyVectorStore
+
+CONTEXT = {"time_of_day": "morning", "day_of_week": "Monday", "location": "Home"}
+
+
+@pytest.fixture(params=["qdrant", "numpy"])
+def memory_client(request, tmp_path):
+    """Run qdrant_manager against a fresh collection on each storage backend."""
+    if request.param == "qdrant":
+        client = QdrantClient(":memory:")
+    else:
+        client = NumpyVectorStore(str(tmp_path / "numpy_storage"))
+    with patch.object(qdrant_manager, "client", client), \
+            patch.object(qdrant_manager, "_phrase_counts", {}), \
+            patch.object(qdrant_manager, "_personalization_memo", {}), \
+            patch.object(qdrant_manager, "async_generate_embeddings", AsyncMock(side_effect=lambda texts: [[1.0] * qdrant_manager.EMBEDDING_DIM for _ in texts])):
+        qdrant_manager.init_qdrant()
+        yield client
+
+
+@pytest.fixture
+def embedding_cache(tmp_path):
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite3", max_entries=2)
+    with patch.object(qdrant_manager, "embedding_cache", cache):
+        yield cache
+
+
+def test_embedding_cache_normalizes_whitespace(embedding_cache):
+    """Test that texts differing only in whitespace share a cache entry."""
+    embedding_cache.put("model", "Category: Food.  Time of day: morning", [0.5, 0.25])
+    assert embedding_cache.get("model", " Category: Food. Time of day: morning ") == [0.5, 0.25]
+    assert embedding_cache.get("other-model", "Category: Food. Time of day: morning") is None
+    assert embedding_cache.stats()["hits"] == 1
+    assert embedding_cache.stats()["misses"] == 1
+
+
+def test_embedding_cache_survives_restart(tmp_path):
+    """Test that vectors evicted from memory or written by another instance are read back from disk."""
+    path = tmp_path / "embeddings.sqlite3"
+    EmbeddingCache(path).put("model", "hello", [1.0, 2.0])
+
+    restarted = EmbeddingCache(path, max_entries=1)
+    assert restarted.get("model", "hello") == [1.0, 2.0]
+    assert restarted.stats()["memory_entries"] == 1
+
+
+@patch("qdrant_manager.genai.embed_content_async", new_callable=AsyncMock)
+def test_generate_embedding_uses_cache(mock_embed, embedding_cache):
+    """Test that identical contexts only call the embedding API once."""
+    mock_embed.return_value = {"embedding": [0.1, 0.2]}
+
+    first = qdrant_manager.generate_embedding("Category: Food")
+    second = qdrant_manager.generate_embedding("Category: Food")
+
+    assert first == second
+    mock_embed.assert_called_once()
+
+
+@patch("qdrant_manager.genai.embed_content_async", new_callable=AsyncMock)
+def test_generate_embedding_does_not_cache_failures(mock_embed, embedding_cache):
+    """Test that failed embedding calls are retried instead of cached."""
+    mock_embed.side_effect = Exception("quota exceeded")
+
+    assert qdrant_manager.generate_embedding("Category: Food") is None
+    assert qdrant_manager.generate_embedding("Category: Food") is None
+    assert mock_embed.call_count == 2
+
+
+@patch("qdrant_manager.genai.embed_content_async", new_callable=AsyncMock)
+def test_generate_embeddings_batches_misses(mock_embed, embedding_cache):
+    """Test that only uncached, distinct texts are sent in one batched call."""
+    embedding_cache.put(qdrant_manager.EMBEDDING_MODEL, "cached", [9.0])
+    mock_embed.return_value = {"embedding": [[1.0], [2.0]]}
+
+    result = qdrant_manager.generate_embeddings(["a", "cached", "b", "a"])
+
+    assert result == [[1.0], [9.0], [2.0], [1.0]]
+    mock_embed.assert_called_once_with(model=qdrant_manager.EMBEDDING_MODEL, content=["a", "b"])
+
+
+@patch("qdrant_manager._write_payloads")
+def test_ingest_queue_flushes_on_size(mock_write):
+    """Test that a full batch is written with a single call."""
+    ingest = qdrant_manager.PhraseIngestQueue(batch_size=3, flush_interval=60)
+    for i in range(3):
+        ingest.put({"phrase": f"p{i}"})
+    ingest.flush()
+    ingest.close()
+
+    mock_write.assert_called_once_with([{"phrase": "p0"}, {"phrase": "p1"}, {"phrase": "p2"}])
+
+
+@patch("qdrant_manager._write_payloads")
+def test_ingest_queue_flushes_on_time_and_drains_on_close(mock_write):
+    """Test that partial batches are written after the interval and on shutdown."""
+    ingest = qdrant_manager.PhraseIngestQueue(batch_size=100, flush_interval=0.05)
+    ingest.put({"phrase": "early"})
+    ingest._queue.join()
+    ingest.put({"phrase": "late"})
+    ingest.close()
+
+    written = [call.args[0] for call in mock_write.call_args_list]
+    assert written == [[{"phrase": "early"}], [{"phrase": "late"}]]
+
+
+def test_queued_selections_are_stored_at_interpreter_exit(tmp_path):
+    """Test that a process exiting right after a tap still stores it through the real write path."""
+    script = textwrap.dedent("""
+        import qdrant_manager
+
+        async def no_embeddings(texts):
+            return [None] * len(texts)
+
+        qdrant_manager.async_generate_embeddings = no_embeddings
+        qdrant_manager.init_qdrant()
+        qdrant_manager.enqueue_phrase("child-1", "Food", "I want water", {"time_of_day": "morning"})
+    """)
+    store_path = tmp_path / "numpy_storage"
+    env = {
+        **os.environ,
+        "VECTOR_BACKEND": "numpy",
+        "NUMPY_STORE_PATH": str(store_path),
+        "PYTHONPATH": str(Path(qdrant_manager.__file__).parent),
+    }
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, timeout=60)
+
+    assert "Stored phrase: 'I want water'" in result.stdout, result.stdout + result.stderr
+    store = NumpyVectorStore(str(store_path))
+    assert store.count(qdrant_manager.QDRANT_COLLECTION).count == 1
+
+
+def test_top_phrases_counts_full_history(memory_client):
+    """Test that frequencies cover every stored selection, not just a search page."""
+    for phrase in ["water"] * 4 + ["juice"] * 2 + ["milk"]:
+        assert qdrant_manager.store_phrase("child", "Food", phrase, CONTEXT)
+    qdrant_manager.store_phrase("other_child", "Food", "milk", CONTEXT)
+    qdrant_manager.store_phrase("child", "Play", "milk", CONTEXT)
+
+    assert qdrant_manager.get_top_phrases_in_category("child", "Food", limit=2) == ["water", "juice"]
+    assert qdrant_manager.get_phrase_counts("child", "Food")["milk"] == 1
+
+
+def test_phrase_counts_expire_to_show_other_workers_taps(memory_client):
+    """Test that counters reload after the TTL and stay within the size cap."""
+    qdrant_manager.store_phrase("child", "Food", "water", CONTEXT)
+    assert qdrant_manager.get_phrase_counts("child", "Food") == {"water": 1}
+
+    # Another worker stores a tap; this process's counters do not see the write
+    memory_client.upsert(qdrant_manager.PHRASE_COUNTS_COLLECTION, points=[
+        qdrant_manager._counter_point(("child", "Food", "juice"), 1, "2024-01-01T08:00:00"),
+    ])
+    assert qdrant_manager.get_phrase_counts("child", "Food") == {"water": 1}
+    with patch.object(qdrant_manager, "PHRASE_COUNTS_TTL", 0):
+        assert qdrant_manager.get_phrase_counts("child", "Food") == {"water": 1, "juice": 1}
+
+    with patch.object(qdrant_manager, "PHRASE_COUNTS_MAX", 2):
+        for category in ["Play", "Help", "Feelings"]:
+            qdrant_manager.get_phrase_counts("child", category)
+    assert list(qdrant_manager._phrase_counts) == [("child", "Help"), ("child", "Feelings")]
+
+
+def test_history_stamp_is_durable_and_shared(memory_client):
+    """Test that the newest-selection stamp survives a restart and shows other workers' selections."""
+    assert qdrant_manager.get_history_stamp("child", "Food") == ""
+    qdrant_manager.store_phrases([{"child_id": "child", "category": "Food", "phrase": "water", "context": CONTEXT, "timestamp": "2024-01-01T08:00:00"}])
+    assert qdrant_manager.get_history_stamp("child", "Food") == "2024-01-01T08:00:00"
+
+    # A restarted process reads the same stamp from the counter points
+    qdrant_manager._phrase_counts.clear()
+    assert qdrant_manager.get_history_stamp("child", "Food") == "2024-01-01T08:00:00"
+
+    memory_client.upsert(qdrant_manager.PHRASE_COUNTS_COLLECTION, points=[
+        qdrant_manager._counter_point(("child", "Food", "juice"), 1, "2024-01-01T09:00:00"),
+    ])
+    with patch.object(qdrant_manager, "PHRASE_COUNTS_TTL", -1):
+        assert qdrant_manager.get_history_stamp("child", "Food") == "2024-01-01T09:00:00"
+
+
+def test_phrase_counts_follow_new_selections(memory_client):
+    """Test that loaded counters are updated in place as phrases are stored."""
+    qdrant_manager.store_phrase("child", "Food", "water", CONTEXT)
+    assert qdrant_manager.get_phrase_counts("child", "Food") == {"water": 1}
+
+    with patch.object(memory_client, "scroll", side_effect=AssertionError("should not rescan")):
+        qdrant_manager.store_phrase("child", "Food", "juice", CONTEXT)
+        qdrant_manager.store_phrase("child", "Food", "juice", CONTEXT)
+        assert qdrant_manager.get_top_phrases_in_category("child", "Food") == ["juice", "water"]
+
+
+def test_personalization_reads_counters_not_history(memory_client):
+    """Test that cold frequency counts come from the counter points, not a scan of every selection."""
+    for _ in range(3):
+        qdrant_manager.store_phrase("child", "Food", "water", CONTEXT)
+    qdrant_manager._phrase_counts.clear()
+
+    with patch.object(qdrant_manager, "async_generate_embedding", new_callable=AsyncMock, return_value=[1.0] * qdrant_manager.EMBEDDING_DIM), \
+            patch.object(memory_client, "scroll", wraps=memory_client.scroll) as scroll:
+        personalization = qdrant_manager.get_personalization_context("child", "Food", CONTEXT)
+
+    assert {call.kwargs["collection_name"] for call in scroll.call_args_list} == {qdrant_manager.PHRASE_COUNTS_COLLECTION}
+    assert "In similar situations, this child has said: water" in personalization
+    assert "frequently uses these phrases in this category: water" in personalization
+    assert memory_client.count(qdrant_manager.PHRASE_COUNTS_COLLECTION).count == 1
+
+
+def test_phrase_counts_are_rebuilt_from_history(memory_client):
+    """Test that a store without counter points is counted once, aggregates included."""
+    old = [
+        {"child_id": "child", "category": "Food", "phrase": "water", "context": CONTEXT, "timestamp": f"2020-01-0{day}T08:00:00"}
+        for day in range(1, 4)
+    ]
+    assert qdrant_manager.store_phrases(old)
+    qdrant_manager.store_phrase("child", "Food", "juice", CONTEXT)
+    assert qdrant_manager.compact_history(older_than_days=30) == 3
+
+    # A store from before the counter points existed
+    memory_client.delete_collection(qdrant_manager.PHRASE_COUNTS_COLLECTION)
+    qdrant_manager._phrase_counts.clear()
+    qdrant_manager.init_qdrant()
+
+    assert qdrant_manager.get_phrase_counts("child", "Food") == {"water": 3, "juice": 1}
+    assert qdrant_manager.rebuild_phrase_counts() == 2
+    assert qdrant_manager.get_phrase_counts("child", "Food") == {"water": 3, "juice": 1}
+
+def test_personalization_is_memoized_until_next_store(memory_client):
+    """Test that repeat lookups are served from memory until the child stores a phrase."""
+    qdrant_manager.store_phrase("child", "Food", "water", CONTEXT)
+
+    with patch.object(qdrant_manager, "async_generate_embedding", new_callable=AsyncMock, return_value=[1.0] * qdrant_manager.EMBEDDING_DIM) as embed:
+        first = qdrant_manager.get_personalization_context("child", "Food", CONTEXT)
+        assert qdrant_manager.get_personalization_context("child", "Food", CONTEXT) == first
+        assert embed.call_count == 1
+
+        qdrant_manager.store_phrase("child", "Food", "juice", CONTEXT)
+        refreshed = qdrant_manager.get_personalization_context("child", "Food", CONTEXT)
+        assert embed.call_count == 2
+        assert "juice" in refreshed
+
+
+def test_personalization_memo_expires_to_show_other_workers_selections(memory_client):
+    """Test that a memoized personalization is rebuilt once the counters' TTL passes."""
+    qdrant_manager.store_phrase("child", "Food", "water", CONTEXT)
+
+    with patch.object(qdrant_manager, "async_generate_embedding", new_callable=AsyncMock, return_value=[1.0] * qdrant_manager.EMBEDDING_DIM) as embed:
+        qdrant_manager.get_personalization_context("child", "Food", CONTEXT)
+        with patch.object(qdrant_manager, "PHRASE_COUNTS_TTL", -1):
+            qdrant_manager.get_personalization_context("child", "Food", CONTEXT)
+    assert embed.call_count == 2
+
+
+def test_personalization_memo_buckets_gps_and_is_capped(memory_client):
+    """Test that nearby GPS fixes share a memo entry and old entries are evicted."""
+    here = {**CONTEXT, "latitude": "48.856613", "longitude": "2.352222", "location": "GPS coordinates: 48.856613, 2.352222"}
+    nearby = {**CONTEXT, "latitude": "48.857101", "longitude": "2.351907", "location": "GPS coordinates: 48.857101, 2.351907"}
+
+    with patch.object(qdrant_manager, "async_generate_embedding", new_callable=AsyncMock, return_value=[1.0] * qdrant_manager.EMBEDDING_DIM) as embed, \
+            patch.object(qdrant_manager, "PERSONALIZATION_MEMO_MAX", 2):
+        qdrant_manager.get_personalization_context("child", "Food", here)
+        qdrant_manager.get_personalization_context("child", "Food", nearby)
+        assert embed.call_count == 1
+
+        qdrant_manager.get_personalization_context("child", "Drinks", here)
+        qdrant_manager.get_personalization_context("child", "Play", here)
+        assert embed.call_count == 3
+        assert len(qdrant_manager._personalization_memo) == 2
+        qdrant_manager.get_personalization_context("child", "Food", here)
+        assert embed.call_count == 4
+
+
+def test_point_ids_are_deterministic():
+    """Test that point IDs depend only on the selection, not on process state."""
+    first = qdrant_manager.make_point_id("child", "2024-01-01T08:00:00", "water")
+    assert first == qdrant_manager.make_point_id("child", "2024-01-01T08:00:00", "water")
+    assert first != qdrant_manager.make_point_id("child", "2024-01-01T08:00:01", "water")
+    assert first != qdrant_manager.make_point_id("other_child", "2024-01-01T08:00:00", "water")
+
+
+def test_store_phrases_is_idempotent(memory_client):
+    """Test that re-ingesting the same selections neither duplicates points nor counts."""
+    selections = [
+        {"child_id": "child", "category": "Food", "phrase": "water", "context": CONTEXT, "timestamp": "2024-01-01T08:00:00"},
+        {"child_id": "child", "category": "Food", "phrase": "juice", "context": CONTEXT, "timestamp": "2024-01-01T08:05:00"},
+    ]
+    assert qdrant_manager.store_phrases(selections)
+    assert qdrant_manager.get_phrase_counts("child", "Food") == {"water": 1, "juice": 1}
+
+    assert qdrant_manager.store_phrases(selections + selections[:1])
+    assert memory_client.count(qdrant_manager.QDRANT_COLLECTION).count == 2
+    assert qdrant_manager.get_phrase_counts("child", "Food") == {"water": 1, "juice": 1}
+
+
+def test_async_api_matches_sync_wrappers(memory_client):
+    """Test that the async functions work on a caller's own event loop."""
+    async def scenario():
+        await qdrant_manager.async_init_qdrant()
+        assert await qdrant_manager.async_store_phrase("child", "Food", "water", CONTEXT)
+        with patch.object(qdrant_manager, "async_generate_embedding", new_callable=AsyncMock, return_value=[1.0] * qdrant_manager.EMBEDDING_DIM):
+            similar, personalization = await asyncio.gather(
+                qdrant_manager.async_get_similar_contexts("child", "Food", CONTEXT),
+                qdrant_manager.async_get_personalization_context("child", "Food", CONTEXT),
+            )
+        return similar, personalization
+
+    similar, personalization = asyncio.run(scenario())
+    assert [s["phrase"] for s in similar] == ["water"]
+    assert "water" in personalization
+    assert qdrant_manager.get_top_phrases_in_category("child", "Food") == ["water"]
+
+
+def test_partition_routing_is_stable():
+    """Test that sharded and cohort partitioning route children deterministically."""
+    with patch.object(qdrant_manager, "QDRANT_PARTITIONING", "sharded"), patch.object(qdrant_manager, "QDRANT_SHARDS", 4):
+        shard = qdrant_manager.collection_for("child")
+        assert shard == qdrant_manager.collection_for("child")
+        assert shard in qdrant_manager.partition_collections()
+        assert len(qdrant_manager.partition_collections()) == 4
+
+    with patch.object(qdrant_manager, "QDRANT_PARTITIONING", "cohort"), \
+            patch.object(qdrant_manager, "_cohorts", {"child": "school_a"}):
+        assert qdrant_manager.collection_for("child") == "echomind_phrases_school_a"
+        assert qdrant_manager.collection_for("new_child") == "echomind_phrases_default"
+
+
+def test_migrate_partitions_moves_history(memory_client):
+    """Test that switching to sharded collections keeps every child's history reachable."""
+    for child_id in ["a", "b", "c"]:
+        qdrant_manager.store_phrase(child_id, "Food", f"water for {child_id}", CONTEXT)
+
+    with patch.object(qdrant_manager, "QDRANT_PARTITIONING", "sharded"), patch.object(qdrant_manager, "QDRANT_SHARDS", 2):
+        assert qdrant_manager.migrate_partitions() == 3
+        assert qdrant_manager.migrate_partitions() == 0
+        assert memory_client.count(qdrant_manager.QDRANT_COLLECTION).count == 0
+        for child_id in ["a", "b", "c"]:
+            assert qdrant_manager.get_top_phrases_in_category(child_id, "Food") == [f"water for {child_id}"]
+
+
+def test_compact_history_rolls_up_old_selections(memory_client):
+    """Test that old selections become counted aggregates while frequencies stay the same."""
+    old = [
+        {"child_id": "child", "category": "Food", "phrase": "water", "context": CONTEXT, "timestamp": f"2020-01-0{day}T08:00:00"}
+        for day in range(1, 4)
+    ]
+    assert qdrant_manager.store_phrases(old)
+    qdrant_manager.store_phrase("child", "Food", "water", CONTEXT)
+    qdrant_manager._phrase_counts.clear()
+
+    assert qdrant_manager.compact_history(older_than_days=30) == 3
+    assert memory_client.count(qdrant_manager.QDRANT_COLLECTION).count == 2
+    assert qdrant_manager.get_phrase_counts("child", "Food") == {"water": 4}
+
+    # Compacting again later merges into the same aggregate point
+    assert qdrant_manager.store_phrases([dict(old[0], timestamp="2020-02-01T08:00:00")])
+    assert qdrant_manager.compact_history(older_than_days=30) == 1
+    aggregates, _ = memory_client.scroll(
+        qdrant_manager.QDRANT_COLLECTION,
+        scroll_filter=qdrant_manager.Filter(must=[qdrant_manager.FieldCondition(key="kind", match=qdrant_manager.MatchValue(value="aggregate"))]),
+    )
+    assert len(aggregates) == 1
+    assert aggregates[0].payload["count"] == 4
+    assert aggregates[0].payload["first_seen"] == "2020-01-01T08:00:00"
+    assert aggregates[0].payload["last_seen"] == "2020-02-01T08:00:00"
+
+
+def test_backfill_repairs_zero_vectors_and_resumes(memory_client, tmp_path):
+    """Test that dummy vectors are re-embedded in batches, resuming after a quota failure."""
+    with patch.object(qdrant_manager, "async_generate_embeddings", AsyncMock(side_effect=lambda texts: [None for _ in texts])):
+        for day in range(1, 6):
+            qdrant_manager.store_phrases([{"child_id": "child", "category": "Food", "phrase": "water", "context": CONTEXT, "timestamp": f"2024-01-0{day}"}])
+
+    checkpoint = tmp_path / "checkpoint.json"
+    vector = [1.0] * qdrant_manager.EMBEDDING_DIM
+    with patch.object(qdrant_manager, "async_generate_embeddings", AsyncMock(side_effect=[[vector, vector], [None, None]])) as embed:
+        assert qdrant_manager.backfill_embeddings(batch_size=2, delay=0, checkpoint_path=checkpoint) == 2
+        assert checkpoint.exists()
+        assert embed.call_count == 2
+
+    with patch.object(qdrant_manager, "async_generate_embeddings", AsyncMock(side_effect=lambda texts: [vector for _ in texts])) as embed:
+        assert qdrant_manager.backfill_embeddings(batch_size=2, delay=0, checkpoint_path=checkpoint) == 3
+        assert embed.call_count == 2
+        assert not checkpoint.exists()
+
+    records, _ = memory_client.scroll(qdrant_manager.QDRANT_COLLECTION, limit=10, with_vectors=True)
+    assert all(any(r.vector) for r in records)
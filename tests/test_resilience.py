@@ -0,0 +1,289 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from resilience import (
+    BACKGROUND,
+    INTERACTIVE,
+    CircuitBreaker,
+    CircuitOpen,
+    LatencyTracker,
+    RateLimited,
+    RateLimiter,
+    SingleFlight,
+    hedge,
+    hedge_iter,
+    request_priority,
+    status_line,
+)
+
+
+def test_single_flight_shares_one_call():
+    """Test that concurrent identical calls share the leader's result."""
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_call():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "phrases"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flight.do, "k", slow_call)
+        started.wait(5)
+        followers = [pool.submit(flight.do, "k", slow_call) for _ in range(3)]
+        while flight.stats()["shared"] < 3:
+            time.sleep(0.001)
+        release.set()
+        assert [f.result() for f in [leader, *followers]] == ["phrases"] * 4
+
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "shared": 3, "in_flight": 0}
+
+
+def test_single_flight_releases_key_after_failure():
+    """Test that errors propagate and the next call starts afresh."""
+    flight = SingleFlight()
+    with pytest.raises(RuntimeError):
+        flight.do("k", lambda: (_ for _ in ()).throw(RuntimeError("quota")))
+    assert flight.do("k", lambda: 42) == 42
+
+
+def test_single_flight_submit_joins_without_a_worker():
+    """Test that submitted calls sharing a key get one Future and run once."""
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow_call():
+        calls.append(1)
+        release.wait(5)
+        return "phrases"
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        futures = [flight.submit("k", pool, slow_call) for _ in range(3)]
+        release.set()
+        assert all(f is futures[0] for f in futures)
+        assert futures[0].result(5) == "phrases"
+
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "shared": 2, "in_flight": 0}
+
+
+def test_single_flight_async_shares_one_call():
+    """Test that concurrent awaits on one loop share a single coroutine."""
+    flight = SingleFlight()
+    calls = []
+
+    async def embed(text):
+        calls.append(text)
+        await asyncio.sleep(0.01)
+        return [1.0]
+
+    async def burst():
+        return await asyncio.gather(*(flight.do_async("k", embed, "hello") for _ in range(5)))
+
+    assert asyncio.run(burst()) == [[1.0]] * 5
+    assert calls == ["hello"]
+
+
+def test_single_flight_stream_is_replayed_to_followers():
+    """Test that a follower joining mid-stream sees every chunk."""
+    flight = SingleFlight()
+    leader = flight.do_stream("k", lambda: iter(["a", "b", "c"]))
+    assert next(leader) == "a"
+
+    follower = flight.do_stream("k", lambda: iter(["unused"]))
+    assert list(follower) == ["a", "b", "c"]
+    assert list(leader) == ["b", "c"]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_latency_tracker_percentiles():
+    """Test percentiles over the rolling window and the sample minimum."""
+    tracker = LatencyTracker(window=10)
+    for ms in range(1, 21):
+        tracker.record("gemini-pro", ms / 1000)
+
+    assert tracker.percentile("gemini-pro", 0.9) == 0.02  # Only the last 10 samples count
+    assert tracker.percentile("gemini-pro", 0.5, min_samples=20) is None
+    assert tracker.stats()["gemini-pro"]["count"] == 10
+
+
+def test_hedge_prefers_fast_primary():
+    """Test that a primary answering within the delay never starts the hedge."""
+    hedged = []
+    assert hedge([lambda: "primary", lambda: hedged.append(1)], delay=1) == "primary"
+    assert hedged == []
+
+
+def test_hedge_fallback_wins_when_primary_is_slow():
+    """Test that the fallback's answer is used when the primary stalls past the delay."""
+    release = threading.Event()
+    try:
+        assert hedge([lambda: release.wait(5) and "primary", lambda: "fallback"], delay=0.01) == "fallback"
+    finally:
+        release.set()
+
+
+def test_hedge_skips_invalid_results():
+    """Test that a failing call hedges immediately and all-failures raise."""
+    def invalid():
+        raise ValueError("Expected exactly 3 phrases")
+
+    assert hedge([invalid, lambda: "fallback"], delay=5) == "fallback"
+    with pytest.raises(ValueError):
+        hedge([invalid, invalid], delay=5)
+
+
+def test_hedge_iter_commits_to_first_stream():
+    """Test that the first source to yield owns the whole stream."""
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        yield "primary"
+
+    try:
+        assert list(hedge_iter([slow, lambda: iter(["a", "b"])], delay=0.01)) == ["a", "b"]
+    finally:
+        release.set()
+
+
+def test_rate_limiter_spends_burst_then_waits():
+    """Test that calls beyond the burst wait for a refill or give up."""
+    limiter = RateLimiter("generation", per_minute=60, burst=2)
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(RateLimited):
+        limiter.acquire(timeout=0.05)
+
+    stats = limiter.stats()
+    assert stats["admitted"] == 2
+    assert stats["rejected"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_rate_limiter_serves_interactive_before_background():
+    """Test that a queued interactive call overtakes queued background work."""
+    limiter = RateLimiter("embedding", per_minute=600, burst=1)
+    limiter.acquire()
+    served = []
+
+    def call(name, level):
+        with request_priority(level):
+            limiter.acquire()
+        served.append(name)
+
+    background = [threading.Thread(target=call, args=(f"bg{i}", BACKGROUND)) for i in range(2)]
+    for thread in background:
+        thread.start()
+    while limiter.stats()["queued_background"] < 2:
+        time.sleep(0.001)
+    interactive = threading.Thread(target=call, args=("tap", INTERACTIVE))
+    interactive.start()
+    for thread in [*background, interactive]:
+        thread.join(5)
+
+    assert served[0] == "tap"
+    assert limiter.stats()["wait_max"] > 0
+
+
+def test_rate_limiter_async_waits_hold_no_threads():
+    """Test that queued coroutines wait on the event loop instead of in executor threads."""
+    limiter = RateLimiter("embedding", per_minute=1200, burst=1)
+    limiter.acquire()
+
+    async def scenario():
+        threads = threading.active_count()
+        waiters = [asyncio.ensure_future(limiter.acquire_async()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["queue_depth"] == 3
+        assert threading.active_count() == threads
+        await asyncio.gather(*waiters)
+
+    asyncio.run(scenario())
+    assert limiter.stats()["admitted"] == 4
+    assert limiter.stats()["queue_depth"] == 0
+
+
+def failing():
+    raise ConnectionError("quota exceeded")
+
+
+def test_circuit_breaker_opens_and_fails_fast():
+    """Test closed -> open after repeated failures, then half-open -> closed."""
+    breaker = CircuitBreaker("embedding", failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(failing)
+    assert breaker.stats() == {"state": "open", "failures": 2, "trips": 1}
+
+    calls = []
+    with pytest.raises(CircuitOpen):
+        breaker.call(calls.append, 1)
+    assert calls == []
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_half_open_failure_reopens():
+    """Test that a failed trial call re-opens the breaker."""
+    breaker = CircuitBreaker("generation", failure_threshold=1, reset_timeout=0.05)
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    assert breaker.state == "open"
+    assert not breaker.available()
+
+
+def test_circuit_breaker_probe_recovers_in_background():
+    """Test that a successful background probe closes the breaker."""
+    breaker = CircuitBreaker("embedding", failure_threshold=1, reset_timeout=0.01, probe=lambda: "pong")
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+
+    for _ in range(500):
+        if breaker.state == "closed":
+            break
+        time.sleep(0.01)
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_counts_stream_errors():
+    """Test that errors raised mid-stream trip the breaker."""
+    breaker = CircuitBreaker("generation", failure_threshold=1)
+
+    def stream():
+        yield "chunk"
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        list(breaker.wrap_stream(stream)())
+    assert breaker.state == "open"
+
+
+def test_status_line_reports_limiters_and_breakers():
+    """Test that the status log line carries queue, wait and breaker metrics for every shared guard."""
+    limiter = RateLimiter("generation", per_minute=60, burst=1)
+    limiter.acquire()
+    breaker = CircuitBreaker("embedding", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    with patch("resilience.generation_limiter", limiter), patch("resilience.embedding_breaker", breaker):
+        line = status_line()
+
+    assert "generation limiter: 0 queued (0 interactive), 1 admitted, 0 rejected" in line
+    assert "embedding limiter:" in line
+    assert "embedding breaker: open (1 failures, 1 trips)" in line
+    assert "generation breaker:" in line
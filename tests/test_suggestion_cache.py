@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+from suggestion_cache import SuggestionCache
+
+PHRASES = [{"text": "I want water", "emoji": "💧"}]
+
+
+def test_make_key_is_canonical():
+    """Test that keys ignore argument order but not values."""
+    key = SuggestionCache.make_key(language="en", category="Food", context={"a": 1, "b": 2})
+    assert key == SuggestionCache.make_key(context={"b": 2, "a": 1}, category="Food", language="en")
+    assert key != SuggestionCache.make_key(language="bn", category="Food", context={"a": 1, "b": 2})
+
+
+def test_get_put_and_hit_rate():
+    """Test hits, misses and that callers cannot mutate cached entries."""
+    cache = SuggestionCache()
+    assert cache.get("k") is None
+    cache.put("k", PHRASES)
+
+    result = cache.get("k")
+    assert result == PHRASES
+    result[0]["text"] = "changed"
+    assert cache.get("k") == PHRASES
+    assert cache.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3, "entries": 1}
+
+
+def test_entries_expire_and_evict():
+    """Test TTL expiry and LRU eviction."""
+    cache = SuggestionCache(ttl=10, max_entries=2)
+    with patch("suggestion_cache.time.time", return_value=1000.0):
+        cache.put("a", PHRASES)
+        cache.put("b", PHRASES)
+        cache.get("a")
+        cache.put("c", PHRASES)
+        assert cache.get("b") is None
+        assert cache.get("a") == PHRASES
+    with patch("suggestion_cache.time.time", return_value=1011.0):
+        assert cache.get("a") is None
+
+
+def test_persisted_entries_survive_restart(tmp_path):
+    """Test that a persisted cache is reloaded by a new instance."""
+    SuggestionCache(path=tmp_path / "suggestions.sqlite3").put("k", PHRASES)
+    assert SuggestionCache(path=tmp_path / "suggestions.sqlite3").get("k") == PHRASES
@@ -0,0 +1,147 @@
+from unittest.mock import patch
+
+import pytest
+
+import tts
+from tts import AudioCache, ClipMemory, GTTSBackend, StubBackend, Synthesizer
+
+
+@pytest.fixture
+def audio_cache(tmp_path):
+    """Fresh audio cache in a temp directory (and empty clip memory), used by tts.synthesize."""
+    cache = AudioCache(tmp_path / "audio", max_bytes=10)
+    with patch("tts.audio_cache", cache), \
+         patch("tts.clip_memory", ClipMemory()), \
+         patch("tts.synthesizer", Synthesizer([GTTSBackend()])):
+        yield cache
+
+
+def test_make_key_normalizes_text():
+    """Test that whitespace differences share a clip but languages and voices do not."""
+    key = AudioCache.make_key("I want  water ", "en", slow=False)
+    assert key == AudioCache.make_key("I want water", "en", slow=False)
+    assert key != AudioCache.make_key("I want water", "bn", slow=False)
+    assert key != AudioCache.make_key("I want water", "en", slow=True)
+
+
+def test_put_get_and_lru_eviction(audio_cache):
+    """Test atomic puts, hits and eviction of the least recently used clip."""
+    assert audio_cache.get("a") is None
+    audio_cache.put("a", b"1234")
+    audio_cache.put("b", b"1234")
+    assert audio_cache.get("a").read_bytes() == b"1234"
+    audio_cache.put("c", b"1234")  # 12 bytes > 10: "b" is least recently used
+
+    assert audio_cache.get("b") is None
+    assert not (audio_cache.directory / "b.audio").exists()
+    assert audio_cache.stats() == {"hits": 1, "misses": 2, "hit_rate": 1 / 3, "clips": 2, "bytes": 8}
+    assert list(audio_cache.directory.glob("*.tmp")) == []
+
+
+def test_startup_indexes_existing_clips(audio_cache):
+    """Test that a new cache finds earlier clips and removes crash leftovers."""
+    audio_cache.put("a", b"1234")
+    (audio_cache.directory / "partial.tmp").write_bytes(b"12")
+
+    restarted = AudioCache(audio_cache.directory, max_bytes=10)
+    assert restarted.get("a") is not None
+    assert not (audio_cache.directory / "partial.tmp").exists()
+
+
+@patch("tts.gTTS")
+def test_synthesize_calls_gtts_once_per_phrase(mock_gtts, audio_cache):
+    """Test that repeat phrases are served from disk without another synthesis."""
+    mock_gtts.return_value.write_to_fp.side_effect = lambda fp: fp.write(b"mp3")
+
+    first = tts.synthesize("I want water", "en")
+    second = tts.synthesize("I want water", "en")
+
+    assert first == b"mp3"
+    assert second is first  # Served from memory, one shared copy
+    assert audio_cache.stats()["clips"] == 1
+    mock_gtts.assert_called_once()
+
+
+@patch("tts.gTTS")
+def test_synthesize_reads_disk_once_after_restart(mock_gtts, audio_cache):
+    """Test that a clip on disk is loaded into memory without synthesizing."""
+    key = AudioCache.make_key("I want water", "en", backend="gtts", **tts.TTS_VOICE)
+    audio_cache.put(key, b"mp3")
+
+    assert tts.synthesize("I want water", "en") == b"mp3"
+    assert tts.synthesize("I want water", "en") == b"mp3"
+    mock_gtts.assert_not_called()
+    assert audio_cache.stats()["hits"] == 1
+
+
+def test_clip_memory_stores_identical_audio_once():
+    """Test that clips with identical bytes share one blob and evict by unique size."""
+    memory = ClipMemory(max_bytes=8)
+    first = memory.put("a", b"1234")
+    assert memory.put("b", bytes(b"1234")) is first
+    assert memory.stats()["bytes"] == 4
+
+    memory.put("c", b"5678")
+    memory.put("d", b"9999")  # 12 unique bytes > 8: "a" and "b" give way
+    assert memory.get("a") is None and memory.get("b") is None
+    assert memory.stats() == {"hits": 0, "misses": 2, "clips": 2, "blobs": 2, "bytes": 8}
+
+
+class FailingBackend:
+    """Backend that always errors, counting its calls."""
+    name = "failing"
+    voice = {}
+
+    def __init__(self):
+        self.calls = 0
+
+    def available(self):
+        return True
+
+    def synthesize(self, text, language):
+        self.calls += 1
+        raise ConnectionError("offline")
+
+
+def test_synthesizer_fails_over_and_skips_broken_backend(audio_cache):
+    """Test failover to the next backend and that a tripped backend is skipped."""
+    failing = FailingBackend()
+    synthesizer = Synthesizer([failing, StubBackend()])
+
+    for text in ["one", "two", "three", "four"]:
+        assert tts.mime_type(synthesizer.synthesize(text, "en")) == "audio/wav"
+    assert failing.calls == 3  # Breaker opened after three errors
+    assert synthesizer.stats()["failing"]["state"] == "open"
+
+
+def test_synthesizer_demotes_slow_backend(audio_cache):
+    """Test that a backend slower than the latency limit is tried after faster ones."""
+    slow, fast = StubBackend(), StubBackend()
+    slow.name, fast.name = "slow", "fast"
+    synthesizer = Synthesizer([slow, fast], max_latency=1)
+    for _ in range(tts.TTS_MIN_SAMPLES):
+        synthesizer.latency.record("slow", 3.0)
+
+    assert [b.name for b in synthesizer._ordered()] == ["fast", "slow"]
+
+
+def test_demoted_backend_is_retried_and_promoted(audio_cache):
+    """Test that a demoted backend is re-timed in the background and promoted once fast again."""
+    slow, fast = StubBackend(), StubBackend()
+    slow.name, fast.name = "slow", "fast"
+    synthesizer = Synthesizer([slow, fast], max_latency=1, retry_interval=0)
+    for _ in range(tts.TTS_MIN_SAMPLES):
+        synthesizer.latency.record("slow", 5.0)  # e.g. timeouts during an outage
+
+    synthesizer.synthesize("I want water", "en")  # Served by "fast"; "slow" is re-timed off the tap's path
+    synthesizer.trials["slow"].result(5)
+
+    assert [b.name for b in synthesizer._ordered()] == ["slow", "fast"]
+
+
+def test_stub_backend_is_deterministic():
+    """Test that the stub returns the same valid WAV for the same text."""
+    stub = StubBackend()
+    assert stub.synthesize("hi", "en") == stub.synthesize("hi", "en")
+    assert stub.synthesize("hi", "en") != stub.synthesize("hello", "en")
+    assert tts.mime_type(stub.synthesize("hi", "en")) == "audio/wav"
@@ -0,0 +1,134 @@
+import pytest
+from qdrant_client.models import (
+    Distance,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    MatchValue,
+    PointStruct,
+    QueryRequest,
+    VectorParams,
+)
+
+from vector_store import NumpyVectorStore
+
+
+def child_filter(child_id):
+    return Filter(must=[FieldCondition(key="child_id", match=MatchValue(value=child_id))])
+
+
+@pytest.fixture(params=["float32", "int8"])
+def store(request, tmp_path):
+    store = NumpyVectorStore(str(tmp_path), quantization=request.param)
+    store.create_collection("phrases", vectors_config=VectorParams(size=3, distance=Distance.COSINE))
+    store.create_payload_index("phrases", "child_id")
+    store.upsert("phrases", [
+        PointStruct(id=1, vector=[1.0, 0.0, 0.0], payload={"child_id": "a", "phrase": "water"}),
+        PointStruct(id=2, vector=[0.0, 1.0, 0.0], payload={"child_id": "a", "phrase": "juice"}),
+        PointStruct(id=3, vector=[1.0, 0.1, 0.0], payload={"child_id": "b", "phrase": "milk"}),
+        PointStruct(id=4, vector=[0.7, 0.7, 0.0], payload={"child_id": "a", "phrase": "tea"}),
+    ])
+    return store
+
+
+def test_query_points_ranks_by_cosine_within_child(store):
+    """Test that top-k search is cosine-ranked and restricted to the filtered child."""
+    result = store.query_points("phrases", query=[2.0, 0.0, 0.0], query_filter=child_filter("a"), limit=2)
+    assert [p.id for p in result.points] == [1, 4]
+    assert result.points[0].score == pytest.approx(1.0, abs=0.01)
+    assert result.points[0].payload == {"child_id": "a", "phrase": "water"}
+
+
+def test_upsert_overwrites_and_delete_by_filter(store):
+    """Test that upserting an existing ID replaces it and deletes hide points."""
+    store.upsert("phrases", [PointStruct(id=2, vector=[0.0, 0.0, 1.0], payload={"child_id": "b", "phrase": "juice"})])
+    assert store.count("phrases", count_filter=child_filter("a")).count == 2
+    assert store.count("phrases", count_filter=child_filter("b")).count == 2
+
+    store.delete("phrases", points_selector=FilterSelector(filter=child_filter("b")))
+    assert store.count("phrases").count == 2
+    assert store.retrieve("phrases", ids=[2, 3]) == []
+
+
+def test_scroll_pages_through_all_points(store):
+    """Test that scroll offsets walk every matching point exactly once."""
+    seen, offset = [], None
+    while True:
+        records, offset = store.scroll("phrases", scroll_filter=child_filter("a"), limit=2, offset=offset, with_payload=["phrase"])
+        seen.extend(r.payload["phrase"] for r in records)
+        if offset is None:
+            break
+    assert seen == ["water", "juice", "tea"]
+
+
+def test_batch_query_and_shared_storage(store, tmp_path):
+    """Test batched queries and that a second instance sees writes made by the first."""
+    other = NumpyVectorStore(str(tmp_path), quantization=store.quantization)
+    store.upsert("phrases", [PointStruct(id="new", vector=[0.0, 1.0, 0.0], payload={"child_id": "a", "phrase": "bread"})])
+
+    similar, frequent = other.query_batch_points("phrases", requests=[
+        QueryRequest(query=[0.0, 1.0, 0.0], filter=child_filter("a"), limit=2, with_payload=True),
+        QueryRequest(filter=child_filter("a"), limit=10, with_payload=["phrase"]),
+    ])
+    assert {p.payload["phrase"] for p in similar.points} == {"juice", "bread"}
+    assert len(frequent.points) == 4
+
+
+def test_storage_grows_past_initial_capacity(tmp_path):
+    """Test that the memory-mapped vector file grows as points are added."""
+    store = NumpyVectorStore(str(tmp_path))
+    store.create_collection("phrases", vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    store.upsert("phrases", [PointStruct(id=i, vector=[1.0, float(i)], payload={"n": i}) for i in range(3000)])
+
+    reopened = NumpyVectorStore(str(tmp_path))
+    assert reopened.count("phrases").count == 3000
+    record = reopened.retrieve("phrases", ids=[2999], with_vectors=True)[0]
+    assert record.payload == {"n": 2999}
+    assert record.vector[1] == pytest.approx(1.0, abs=1e-3)
+
+
+def test_writes_append_instead_of_rewriting(store, tmp_path):
+    """Test that a one-point upsert appends one log line and another instance replays just that."""
+    other = NumpyVectorStore(str(tmp_path), quantization=store.quantization)
+    assert other.count("phrases").count == 4
+    log_file = next((tmp_path / "phrases").glob("g*/log.jsonl"))
+    before = log_file.stat().st_size
+
+    store.upsert("phrases", [PointStruct(id=5, vector=[0.0, 0.0, 1.0], payload={"child_id": "b", "phrase": "water"})])
+    store.upsert("phrases", [PointStruct(id=1, vector=[1.0, 0.0, 0.0], payload={"child_id": "a", "phrase": "juice"})])
+
+    assert len(log_file.read_bytes()[before:].splitlines()) == 1  # Only the new point's ID; the overwrite adds no line
+    assert other.count("phrases", count_filter=child_filter("b")).count == 2
+    assert other.retrieve("phrases", ids=[1])[0].payload == {"child_id": "a", "phrase": "juice"}
+
+
+def test_high_cardinality_fields_are_not_dictionary_encoded(store):
+    """Test that timestamps are stored per row, still returned and filterable."""
+    store.upsert("phrases", [
+        PointStruct(id=i, vector=[1.0, 0.0, 0.0], payload={"child_id": "c", "timestamp": f"2024-01-01T08:00:{i:02d}"})
+        for i in range(10, 20)
+    ])
+    collection = store._collection("phrases")
+    assert "timestamp" not in collection.vocab
+    assert store.retrieve("phrases", ids=[12])[0].payload == {"child_id": "c", "timestamp": "2024-01-01T08:00:12"}
+    stamp = Filter(must=[FieldCondition(key="timestamp", match=MatchValue(value="2024-01-01T08:00:15"))])
+    assert [r.id for r in store.scroll("phrases", scroll_filter=stamp)[0]] == [15]
+
+
+def test_vacuum_reclaims_deleted_rows(store, tmp_path):
+    """Test that vacuum drops deleted rows and unused values, for this and other instances."""
+    other = NumpyVectorStore(str(tmp_path), quantization=store.quantization)
+    other.count("phrases")
+    store.delete("phrases", points_selector=FilterSelector(filter=child_filter("b")))
+
+    assert store.vacuum("phrases") == 1
+    assert store.vacuum("phrases") == 0
+    collection = store._collection("phrases")
+    assert len(collection.ids) == 3
+    assert "milk" not in collection.vocab["phrase"]
+    assert len(list((tmp_path / "phrases").glob("g*"))) == 1
+
+    for instance in (store, other):
+        result = instance.query_points("phrases", query=[1.0, 0.0, 0.0], query_filter=child_filter("a"), limit=1)
+        assert result.points[0].payload == {"child_id": "a", "phrase": "water"}
+        assert instance.count("phrases").count == 3
@@ -0,0 +1,52 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import tts
+import warmup
+from phrases import OFFLINE_PHRASES
+from tts import AudioCache, ClipMemory, StubBackend, Synthesizer
+
+
+def test_collect_phrases_merges_sources_without_duplicates(tmp_path):
+    """Test that offline, top and configured phrases are collected once each."""
+    phrase_file = tmp_path / "warmup_phrases.json"
+    phrase_file.write_text(json.dumps({"en": ["Good morning", "I want water"]}), encoding="utf-8")
+    qdrant = MagicMock()
+    qdrant.get_top_phrases_in_category.return_value = ["I want water", "Play ball"]
+
+    with patch.dict("sys.modules", {"qdrant_manager": qdrant}):
+        phrases = warmup.collect_phrases(languages=["en"], child_ids=["child-1"], phrase_file=phrase_file)
+
+    offline = [p["text"] for ps in OFFLINE_PHRASES["en"].values() for p in ps]
+    assert [text for text, _ in phrases] == offline + ["Play ball", "Good morning"]
+    assert {language for _, language in phrases} == {"en"}
+
+
+def test_collect_phrases_without_qdrant_keeps_offline_phrases(tmp_path):
+    """Test that an unreachable phrase history only drops the personalized phrases."""
+    qdrant = MagicMock()
+    qdrant.get_top_phrases_in_category.side_effect = RuntimeError("storage locked")
+
+    with patch.dict("sys.modules", {"qdrant_manager": qdrant}):
+        phrases = warmup.collect_phrases(languages=["en"], child_ids=["child-1"], phrase_file=tmp_path / "missing.json")
+
+    assert len(phrases) == sum(len(ps) for ps in OFFLINE_PHRASES["en"].values())
+
+
+def test_warm_up_fills_cache_and_skips_cached_phrases(tmp_path):
+    """Test that a second warm-up finds every clip cached and calls no backend."""
+    backend = StubBackend()
+    backend.synthesize = MagicMock(wraps=backend.synthesize)
+    phrases = [("I want water", "en"), ("I am hungry", "en"), ("Help", "en")]
+
+    with patch("tts.audio_cache", AudioCache(tmp_path / "audio")), \
+         patch("tts.clip_memory", ClipMemory()), \
+         patch("tts.synthesizer", Synthesizer([backend])):
+        first = warmup.warm_up(phrases, workers=2, per_minute=0)
+        second = warmup.warm_up(phrases, workers=2, per_minute=0)
+        cached = tts.synthesizer.cached("Help", "en")
+
+    assert (first["synthesized"], first["cached"], first["failed"]) == (3, 0, 0)
+    assert (second["synthesized"], second["cached"]) == (0, 3)
+    assert backend.synthesize.call_count == 3
+    assert cached is not None
@@ -0,0 +1,451 @@
+"""
+Text-to-speech for EchoMind
+Synthesizes phrases through pluggable backends (gTTS, a local espeak-ng
+voice, a stub for tests) with automatic failover. Clips are bytes, kept in
+a shared in-memory clip store backed by an on-disk, content-addressed cache.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unicodedata
+import wave
+from collections import OrderedDict
+from concurrent.futures import Future
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Protocol
+
+from gtts import gTTS
+
+from resilience import CircuitBreaker, CircuitOpen, LatencyTracker, spawn
+
+AUDIO_CACHE_DIR = Path(os.getenv("AUDIO_CACHE_DIR", Path(__file__).resolve().parent / "audio_cache"))
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_MB", "200")) * 1024 * 1024
+AUDIO_MEMORY_MAX_BYTES = int(os.getenv("AUDIO_MEMORY_MAX_MB", "32")) * 1024 * 1024
+
+# Backends in order of preference ("gtts", "espeak", "stub"); unavailable ones are skipped
+TTS_BACKENDS = [b.strip() for b in os.getenv("TTS_BACKENDS", "gtts,espeak").split(",") if b.strip()]
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "5"))  # Seconds per synthesis attempt
+TTS_MAX_LATENCY = float(os.getenv("TTS_MAX_LATENCY", "2"))  # A backend slower than this (p90) is tried later
+TTS_MIN_SAMPLES = 10
+TTS_RETRY_SECONDS = float(os.getenv("TTS_RETRY_SECONDS", "60"))  # A demoted backend is re-timed this often
+
+# gTTS voice settings (part of the cache key, so changing them re-synthesizes)
+TTS_VOICE = {"slow": False, "tld": "com"}
+
+
+class AudioCache:
+    """
+    Directory of synthesized clips named by a hash of (normalized text, language, backend and voice).
+    Writes are atomic (temp file + rename), total size is capped with LRU
+    eviction, and the directory is indexed at startup so clips survive restarts.
+    A hit refreshes the file's mtime, which is the LRU order across restarts.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = AUDIO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._index()
+
+    @staticmethod
+    def make_key(text: str, language: str, **voice) -> str:
+        """Content address of a clip: same words, language and voice give the same key"""
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        canonical = json.dumps([normalized, language, voice], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.audio"
+
+    def _index(self) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".tmp"):
+                    # Left behind by a crash mid-write
+                    os.unlink(entry.path)
+                elif entry.name.endswith(".audio"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[:-len(".audio")], stat.st_size))
+        except OSError as e:
+            print(f"Error indexing audio cache: {e}")
+            return
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._total += size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and len(self._sizes) > 1:
+            key, size = self._sizes.popitem(last=False)
+            self._total -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the cached clip's path, or None"""
+        path = self._path(key)
+        with self._lock:
+            if key in self._sizes:
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    # Evicted by another process sharing the directory
+                    self._total -= self._sizes.pop(key)
+                else:
+                    self._sizes.move_to_end(key)
+                    self.hits += 1
+                    return path
+            self.misses += 1
+            return None
+
+    def put(self, key: str, data: bytes) -> Path:
+        """Store a clip atomically and return its path"""
+        path = self._path(key)
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, path)
+        with self._lock:
+            self._total += len(data) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+            self._evict()
+        return path
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters, hit rate, clip count and bytes on disk"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "clips": len(self._sizes),
+                "bytes": self._total,
+            }
+
+
+class ClipMemory:
+    """
+    In-process LRU of clip bytes, shared by every session.
+    Clips are stored by content digest, so identical audio reached through
+    different keys is held once; the size cap counts unique bytes only.
+    """
+
+    def __init__(self, max_bytes: int = AUDIO_MEMORY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._clips: "OrderedDict[str, str]" = OrderedDict()  # key -> digest
+        self._blobs: Dict[str, bytes] = {}
+        self._refs: Dict[str, int] = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            digest = self._clips.get(key)
+            if digest is None:
+                self.misses += 1
+                return None
+            self._clips.move_to_end(key)
+            self.hits += 1
+            return self._blobs[digest]
+
+    def put(self, key: str, data: bytes) -> bytes:
+        """Store a clip and return the shared copy of its bytes"""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if key in self._clips:
+                self._release(self._clips.pop(key))
+            if digest not in self._blobs:
+                self._blobs[digest] = data
+                self._total += len(data)
+            self._refs[digest] = self._refs.get(digest, 0) + 1
+            self._clips[key] = digest
+            while self._total > self.max_bytes and len(self._clips) > 1:
+                _, oldest = self._clips.popitem(last=False)
+                self._release(oldest)
+            return self._blobs[digest]
+
+    def _release(self, digest: str) -> None:
+        self._refs[digest] -= 1
+        if not self._refs[digest]:
+            del self._refs[digest]
+            self._total -= len(self._blobs.pop(digest))
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters, clip and unique blob counts and bytes held"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "clips": len(self._clips),
+                "blobs": len(self._blobs),
+                "bytes": self._total,
+            }
+
+
+class TTSBackend(Protocol):
+    """A speech engine: MP3 or WAV bytes for a phrase; raises on failure"""
+
+    name: str
+    voice: Dict[str, object]  # Settings that change the audio (part of the cache key)
+
+    def available(self) -> bool: ...
+
+    def synthesize(self, text: str, language: str) -> bytes: ...
+
+
+class GTTSBackend:
+    """Google Translate TTS (network, MP3)"""
+
+    name = "gtts"
+
+    def __init__(self, voice: Optional[Dict[str, object]] = None, timeout: float = TTS_TIMEOUT):
+        self.voice = dict(voice or TTS_VOICE)
+        self.timeout = timeout
+
+    def available(self) -> bool:
+        return True
+
+    def synthesize(self, text: str, language: str) -> bytes:
+        buffer = BytesIO()
+        gTTS(text=text, lang=language, timeout=self.timeout, **self.voice).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class EspeakBackend:
+    """espeak-ng on this machine (offline, WAV)"""
+
+    name = "espeak"
+    VOICES = {"en": "en", "bn": "bn"}
+
+    def __init__(self, speed: int = 140, timeout: float = TTS_TIMEOUT):
+        self.voice = {"speed": speed}
+        self.timeout = timeout
+        self.binary = shutil.which("espeak-ng")
+
+    def available(self) -> bool:
+        return self.binary is not None
+
+    def synthesize(self, text: str, language: str) -> bytes:
+        result = subprocess.run(
+            [self.binary, "-v", self.VOICES.get(language, language), "-s", str(self.voice["speed"]), "--stdout", text],
+            capture_output=True,
+            timeout=self.timeout,
+            check=True,
+        )
+        return result.stdout
+
+
+class StubBackend:
+    """Deterministic silent WAV (length follows the text) for tests and benchmarks"""
+
+    name = "stub"
+    voice: Dict[str, object] = {}
+
+    def available(self) -> bool:
+        return True
+
+    def synthesize(self, text: str, language: str) -> bytes:
+        buffer = BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(8000)
+            wav.writeframes(b"\0\0" * 80 * len(text))
+        return buffer.getvalue()
+
+
+BACKEND_TYPES = {"gtts": GTTSBackend, "espeak": EspeakBackend, "stub": StubBackend}
+
+
+def mime_type(data: bytes) -> str:
+    """Format of a clip, for st.audio"""
+    return "audio/wav" if data[:4] == b"RIFF" else "audio/mpeg"
+
+
+class Synthesizer:
+    """
+    Tries backends in order of preference with automatic failover.
+    Each backend has a circuit breaker (errors) and a latency window; a
+    backend whose recent p90 exceeds max_latency is tried after the fast ones.
+    Every retry_interval a demoted backend is re-timed off the tap's path,
+    and promoted again if it answers within max_latency.
+    Cached clips from any backend are used before synthesizing.
+    """
+
+    def __init__(
+        self,
+        backends: List[TTSBackend],
+        max_latency: float = TTS_MAX_LATENCY,
+        retry_interval: float = TTS_RETRY_SECONDS,
+    ):
+        self.backends = [b for b in backends if b.available()]
+        self.max_latency = max_latency
+        self.retry_interval = retry_interval
+        self.latency = LatencyTracker(window=100)
+        self.breakers = {b.name: CircuitBreaker(f"tts-{b.name}", failure_threshold=3) for b in self.backends}
+        self.trials: Dict[str, Future] = {}
+        self._next_trial: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, backend: TTSBackend, text: str, language: str) -> str:
+        return audio_cache.make_key(text, language, backend=backend.name, **backend.voice)
+
+    def _slow(self, backend: TTSBackend) -> bool:
+        p90 = self.latency.percentile(backend.name, 0.9, min_samples=TTS_MIN_SAMPLES)
+        return p90 is not None and p90 > self.max_latency
+
+    def _ordered(self) -> List[TTSBackend]:
+        return sorted(self.backends, key=self._slow)  # Stable: keeps preference among equals
+
+    def _due_trials(self) -> List[TTSBackend]:
+        """Demoted backends whose next re-timing is due"""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for backend in self.backends:
+                if not self._slow(backend):
+                    self._next_trial.pop(backend.name, None)
+                    continue
+                if now >= self._next_trial.setdefault(backend.name, now + self.retry_interval):
+                    self._next_trial[backend.name] = now + self.retry_interval
+                    due.append(backend)
+        return due
+
+    def _trial(self, backend: TTSBackend, text: str, language: str) -> None:
+        """Re-time a demoted backend; a fast answer replaces its old slow samples"""
+        started = time.monotonic()
+        try:
+            data = self.breakers[backend.name].call(backend.synthesize, text, language)
+        except CircuitOpen:
+            return
+        except Exception as e:
+            self.latency.record(backend.name, time.monotonic() - started)
+            print(f"TTS backend {backend.name} retry failed: {e}")
+            return
+        elapsed = time.monotonic() - started
+        if elapsed <= self.max_latency:
+            self.latency.reset(backend.name)
+            print(f"TTS backend {backend.name} is fast again ({elapsed:.2f}s)")
+        self.latency.record(backend.name, elapsed)
+        key = self._key(backend, text, language)
+        audio_cache.put(key, data)
+        clip_memory.put(key, data)
+
+    def cached(self, text: str, language: str) -> Optional[bytes]:
+        """A clip of text from any backend, from memory or disk"""
+        for backend in self._ordered():
+            key = self._key(backend, text, language)
+            data = clip_memory.get(key)
+            if data is not None:
+                return data
+            path = audio_cache.get(key)
+            try:
+                if path is not None:
+                    return clip_memory.put(key, path.read_bytes())
+            except FileNotFoundError:
+                pass
+        return None
+
+    def synthesize(self, text: str, language: str) -> bytes:
+        """Return clip bytes of text; raises the last backend error if every backend fails"""
+        data = self.cached(text, language)
+        if data is not None:
+            return data
+
+        error: Exception = RuntimeError("No TTS backend available")
+        for backend in self._ordered():
+            started = time.monotonic()
+            try:
+                data = self.breakers[backend.name].call(backend.synthesize, text, language)
+            except CircuitOpen as e:
+                # Failing recently: skip without waiting for another error
+                error = e
+                continue
+            except Exception as e:
+                self.latency.record(backend.name, time.monotonic() - started)
+                print(f"TTS backend {backend.name} failed: {e}")
+                error = e
+                continue
+            self.latency.record(backend.name, time.monotonic() - started)
+            key = self._key(backend, text, language)
+            audio_cache.put(key, data)
+            for trial in self._due_trials():
+                if trial is not backend:
+                    # Off the tap's path: the child already has this clip
+                    self.trials[trial.name] = spawn(self._trial, trial, text, language)
+            return clip_memory.put(key, data)
+        raise error
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """Latency percentiles and breaker state per backend, for monitoring and benchmarks"""
+        latencies = self.latency.stats()
+        return {
+            b.name: {**latencies.get(b.name, {}), **self.breakers[b.name].stats()}
+            for b in self.backends
+        }
+
+
+audio_cache = AudioCache(AUDIO_CACHE_DIR)
+clip_memory = ClipMemory()
+synthesizer = Synthesizer([BACKEND_TYPES[name]() for name in TTS_BACKENDS if name in BACKEND_TYPES])
+
+
+def synthesize(text: str, language: str) -> bytes:
+    """
+    Return clip bytes (MP3 or WAV, see mime_type) of text; raises on failure.
+    Memory hits touch neither disk nor network; disk hits are read once
+    into memory; only misses run a backend (into a buffer, never a temp file).
+    """
+    return synthesizer.synthesize(text, language)
+
+
+def benchmark(backends: List[TTSBackend], phrases: List[str], language: str, rounds: int = 3) -> Dict[str, Dict[str, float]]:
+    """Time each backend on the same phrases, bypassing every cache"""
+    latency = LatencyTracker()
+    errors: Dict[str, int] = {}
+    for backend in backends:
+        for _ in range(rounds):
+            for phrase in phrases:
+                started = time.monotonic()
+                try:
+                    backend.synthesize(phrase, language)
+                except Exception:
+                    errors[backend.name] = errors.get(backend.name, 0) + 1
+                    continue
+                latency.record(backend.name, time.monotonic() - started)
+    results = latency.stats()
+    return {b.name: {**results.get(b.name, {}), "errors": errors.get(b.name, 0)} for b in backends}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="EchoMind text-to-speech tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("benchmark", help="compare the latency of every available backend")
+    bench.add_argument("phrases", nargs="*", default=["I want water", "I am hungry", "I need help"])
+    bench.add_argument("--language", default="en", help="language code of the phrases")
+    bench.add_argument("--rounds", type=int, default=3, help="times each phrase is synthesized per backend")
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        backends = [backend() for backend in BACKEND_TYPES.values()]
+        for name, result in benchmark([b for b in backends if b.available()], args.phrases, args.language, args.rounds).items():
+            print(f"{name}: p50={result.get('p50')} p90={result.get('p90')} errors={result['errors']}")
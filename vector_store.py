@@ -0,0 +1,722 @@
+"""
+NumPy vector store for EchoMind
+A drop-in replacement for the local QdrantClient that keeps vectors and
+dictionary-encoded payload columns in memory-mapped files, with an
+append-only log so writes and cross-process refreshes cost only the change.
+"""
+
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+from qdrant_client.http.models import (
+    CollectionDescription,
+    CollectionsResponse,
+    CountResult,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    MatchAny,
+    MatchValue,
+    PointIdsList,
+    QueryResponse,
+    Record,
+    ScoredPoint,
+    UpdateResult,
+    UpdateStatus,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock
+    fcntl = None
+
+QUANTIZATIONS = ("float32", "int8")
+INT8_SCALE = 127.0
+INITIAL_CAPACITY = 1024
+# Fields that are different on nearly every row: stored as-is instead of dictionary-encoded
+RAW_FIELDS = ("timestamp", "context_str", "first_seen", "last_seen")
+_MISSING = object()
+
+
+class VectorStore(Protocol):
+    """
+    The storage interface qdrant_manager relies on.
+    QdrantClient satisfies it as-is; NumpyVectorStore implements it locally.
+    """
+
+    def get_collections(self) -> CollectionsResponse: ...
+    def collection_exists(self, collection_name: str) -> bool: ...
+    def create_collection(self, collection_name: str, vectors_config, **kwargs) -> bool: ...
+    def delete_collection(self, collection_name: str, **kwargs) -> bool: ...
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, **kwargs): ...
+    def upsert(self, collection_name: str, points, **kwargs): ...
+    def delete(self, collection_name: str, points_selector, **kwargs): ...
+    def retrieve(self, collection_name: str, ids, with_payload=True, with_vectors=False, **kwargs) -> List[Record]: ...
+    def count(self, collection_name: str, count_filter: Optional[Filter] = None, exact: bool = True, **kwargs) -> CountResult: ...
+    def scroll(self, collection_name: str, scroll_filter: Optional[Filter] = None, limit: int = 10, offset=None, with_payload=True, with_vectors=False, **kwargs): ...
+    def query_points(self, collection_name: str, query=None, query_filter: Optional[Filter] = None, limit: int = 10, with_payload=True, with_vectors=False, **kwargs) -> QueryResponse: ...
+    def query_batch_points(self, collection_name: str, requests, **kwargs) -> List[QueryResponse]: ...
+
+
+class _Collection:
+    """
+    One collection on disk: meta.json plus a generation directory g<N> with
+    - vectors.bin: L2-normalized vectors (float32 or int8), memory-mapped
+    - alive.bin and codes_<i>.bin: memory-mapped alive flags and int32 code
+      columns (code + 1, so 0 means missing) for dictionary-encoded fields
+    - raw_<i>.dat / raw_<i>.idx: appended JSON values and their (offset,
+      length) per row, for high-cardinality fields such as timestamps
+    - log.jsonl: append-only record of new point IDs, new vocabulary values
+      and deletes, which other processes replay from where they left off
+    Writes touch only the rows they change; vacuum() rewrites the live rows
+    into the next generation and reclaims deleted ones.
+    """
+
+    def __init__(self, path: Path, raw_fields: Sequence[str] = RAW_FIELDS, meta: Optional[Dict] = None):
+        self.path = path
+        self.raw_fields = set(raw_fields)
+        self._meta_stamp: Optional[Tuple[int, int, int]] = None
+        self._raw_files: Dict[str, Any] = {}
+        self._pending: List[Dict] = []
+        if meta is None:
+            self._load()
+        else:
+            # An unpublished generation with no rows yet (see vacuum)
+            self._reset(meta)
+
+    # --- Persistence ------------------------------------------------------- #
+
+    @property
+    def _meta_file(self) -> Path:
+        return self.path / "meta.json"
+
+    @property
+    def _dir(self) -> Path:
+        return self.path / f"g{self.meta['generation']}"
+
+    @staticmethod
+    def _files(meta: Dict) -> List[Tuple[str, int]]:
+        """Fixed-width files of a generation and their bytes per row"""
+        itemsize = np.dtype(np.int8 if meta["quantization"] == "int8" else np.float32).itemsize
+        files = [("vectors.bin", meta["size"] * itemsize), ("alive.bin", 1)]
+        files += [(f"codes_{i}.bin", 4) for i in range(len(meta["keys"]))]
+        files += [(f"raw_{i}.idx", 16) for i in range(len(meta["raw_keys"]))]
+        return files
+
+    @classmethod
+    def _size_files(cls, directory: Path, meta: Dict) -> None:
+        """Create missing files and extend every fixed-width file to the capacity (zero-filled)"""
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, row_bytes in cls._files(meta):
+            with open(directory / name, "ab") as f:
+                if os.path.getsize(directory / name) < meta["capacity"] * row_bytes:
+                    f.truncate(meta["capacity"] * row_bytes)
+        for i in range(len(meta["raw_keys"])):
+            (directory / f"raw_{i}.dat").touch()
+        (directory / "log.jsonl").touch()
+
+    @staticmethod
+    def _write_meta(path: Path, meta: Dict) -> None:
+        tmp = path / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, path / "meta.json")
+
+    @classmethod
+    def create(cls, path: Path, size: int, quantization: str, raw_fields: Sequence[str] = RAW_FIELDS) -> "_Collection":
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATIONS}")
+        meta = {
+            "size": size,
+            "quantization": quantization,
+            "capacity": INITIAL_CAPACITY,
+            "indexes": [],
+            "keys": [],
+            "raw_keys": [],
+            "generation": 1,
+        }
+        cls._size_files(path / "g1", meta)
+        cls._write_meta(path, meta)
+        return cls(path, raw_fields)
+
+    def _open(self) -> None:
+        """(Re)map the files of the current generation at the current capacity"""
+        directory, capacity = self._dir, self.meta["capacity"]
+        dtype = np.int8 if self.meta["quantization"] == "int8" else np.float32
+        self._vectors = np.memmap(directory / "vectors.bin", dtype=dtype, mode="r+", shape=(capacity, self.meta["size"]))
+        self._alive = np.memmap(directory / "alive.bin", dtype=np.uint8, mode="r+", shape=(capacity,))
+        self.codes: Dict[str, np.memmap] = {
+            key: np.memmap(directory / f"codes_{i}.bin", dtype=np.int32, mode="r+", shape=(capacity,))
+            for i, key in enumerate(self.meta["keys"])
+        }
+        self._raw_index: Dict[str, np.memmap] = {
+            key: np.memmap(directory / f"raw_{i}.idx", dtype=np.int64, mode="r+", shape=(capacity, 2))
+            for i, key in enumerate(self.meta["raw_keys"])
+        }
+        for i, key in enumerate(self.meta["raw_keys"]):
+            if key not in self._raw_files:
+                self._raw_files[key] = open(directory / f"raw_{i}.dat", "a+b")
+        for key in self.meta["keys"]:
+            self.vocab.setdefault(key, [])
+            self.lookup.setdefault(key, {})
+
+    def _read_meta(self) -> Dict:
+        stat = self._meta_file.stat()
+        self._meta_stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        return json.loads(self._meta_file.read_text(encoding="utf-8"))
+
+    def _load(self) -> None:
+        self._reset(self._read_meta())
+        self._read_log()
+
+    def _reset(self, meta: Dict) -> None:
+        self.close()
+        self.meta = meta
+        self.ids: List = []
+        self.rows: Dict[str, int] = {}
+        self.vocab: Dict[str, List] = {}
+        self.lookup: Dict[str, Dict[Any, int]] = {}
+        self._row_index: Dict[str, Dict[int, np.ndarray]] = {}
+        self._log_offset = 0
+        self._pending.clear()
+        self._meta_dirty = False
+        self._open()
+
+    def _read_log(self) -> None:
+        """Apply log entries written since the last read"""
+        log_file = self._dir / "log.jsonl"
+        if log_file.stat().st_size <= self._log_offset:
+            return
+        with open(log_file, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # A line still being appended is read next time
+        if not end:
+            return
+        # One parse for the whole tail instead of one per line
+        for entry in json.loads("[" + ",".join(data[:end].decode("utf-8").splitlines()) + "]"):
+            self._apply(entry)
+        self._log_offset += end
+        self._row_index.clear()
+
+    def _apply(self, entry: Dict) -> None:
+        for key, values in entry.get("vocab", {}).items():
+            vocab, lookup = self.vocab.setdefault(key, []), self.lookup.setdefault(key, {})
+            for value in values:
+                lookup[self._hashable(value)] = len(vocab)
+                vocab.append(value)
+        for point_id in entry.get("ids", []):
+            self.rows[str(point_id)] = len(self.ids)
+            self.ids.append(point_id)
+        for row in entry.get("deleted", []):
+            if self.rows.get(str(self.ids[row])) == row:
+                del self.rows[str(self.ids[row])]
+
+    def reload(self) -> None:
+        self._load()
+
+    def refresh(self) -> None:
+        """Catch up with writes made by other processes since the last read"""
+        stat = self._meta_file.stat()
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self._meta_stamp:
+            meta = self._read_meta()
+            if meta["generation"] != self.meta["generation"]:
+                # Vacuumed elsewhere: rows were renumbered
+                self._load()
+                return
+            self.meta = meta
+            self._open()
+        self._read_log()
+
+    def save(self) -> None:
+        """Flush changed rows, then publish them: meta first, then the log entries that refer to it"""
+        for mapped in [self._vectors, self._alive, *self.codes.values(), *self._raw_index.values()]:
+            mapped.flush()
+        for raw_file in self._raw_files.values():
+            raw_file.flush()
+        if self._meta_dirty:
+            self._write_meta(self.path, self.meta)
+            self._read_meta()
+            self._meta_dirty = False
+        if self._pending:
+            data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in self._pending).encode("utf-8")
+            with open(self._dir / "log.jsonl", "ab") as f:
+                f.write(data)
+            self._log_offset += len(data)
+            self._pending.clear()
+
+    def close(self) -> None:
+        for raw_file in self._raw_files.values():
+            raw_file.close()
+        self._raw_files = {}
+
+    # --- Encoding ---------------------------------------------------------- #
+
+    @staticmethod
+    def _hashable(value: Any) -> Any:
+        return json.dumps(value, sort_keys=True) if isinstance(value, (list, dict)) else value
+
+    def _add_key(self, key: str, raw: bool) -> None:
+        self.meta["raw_keys" if raw else "keys"].append(key)
+        self._size_files(self._dir, self.meta)
+        self._meta_dirty = True
+        self._open()
+
+    def _encode(self, key: str, value: Any, entry: Dict) -> int:
+        hashed = self._hashable(value)
+        code = self.lookup[key].get(hashed)
+        if code is None:
+            code = len(self.vocab[key])
+            self.vocab[key].append(value)
+            self.lookup[key][hashed] = code
+            entry["vocab"].setdefault(key, []).append(value)
+        return code
+
+    def _code_of(self, key: str, value: Any) -> Optional[int]:
+        code = self.lookup.get(key, {}).get(self._hashable(value))
+        return None if code is None else code + 1
+
+    def _write_raw(self, key: str, row: int, value: Any) -> None:
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        raw_file = self._raw_files[key]
+        raw_file.seek(0, os.SEEK_END)
+        offset = raw_file.tell()
+        raw_file.write(data)
+        self._raw_index[key][row] = (offset, len(data))
+
+    def _raw_value(self, key: str, row: int) -> Any:
+        offset, length = (int(v) for v in self._raw_index[key][row])
+        if not length:
+            return _MISSING
+        return json.loads(os.pread(self._raw_files[key].fileno(), length, offset))
+
+    def _quantize(self, vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        if v.shape != (self.meta["size"],):
+            raise ValueError(f"Expected vector of size {self.meta['size']}, got {v.shape}")
+        norm = float(np.linalg.norm(v))
+        if norm > 0:
+            v = v / norm
+        if self.meta["quantization"] == "int8":
+            return np.round(v * INT8_SCALE).astype(np.int8)
+        return v
+
+    def vector(self, row: int) -> List[float]:
+        v = np.asarray(self._vectors[row], dtype=np.float32)
+        if self.meta["quantization"] == "int8":
+            v = v / INT8_SCALE
+        return v.tolist()
+
+    def payload(self, row: int, with_payload) -> Optional[Dict[str, Any]]:
+        if with_payload is False:
+            return None
+        wanted = None if with_payload is True else set(with_payload)
+        result = {}
+        for key, column in self.codes.items():
+            if wanted is None or key in wanted:
+                code = int(column[row]) - 1
+                if 0 <= code < len(self.vocab[key]):  # A code whose vocabulary is not logged yet is skipped
+                    result[key] = self.vocab[key][code]
+        for key in self._raw_index:
+            if wanted is None or key in wanted:
+                value = self._raw_value(key, row)
+                if value is not _MISSING:
+                    result[key] = value
+        return result
+
+    # --- Writes ------------------------------------------------------------ #
+
+    def _grow(self, needed: int) -> None:
+        capacity = self.meta["capacity"]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self.meta["capacity"] = capacity
+        self._size_files(self._dir, self.meta)
+        self._meta_dirty = True
+        self._open()
+
+    def upsert(self, points) -> None:
+        points = list(points)
+        vectors = [self._quantize(p.vector) for p in points]  # Validate before any row is touched
+        entry: Dict = {"ids": [], "vocab": {}}
+
+        originals = {str(p.id): p.id for p in points}
+        new_ids = [point_id for point_id in originals if point_id not in self.rows]
+        self._grow(len(self.ids) + len(new_ids))
+        for point_id in new_ids:
+            self.rows[point_id] = len(self.ids)
+            self.ids.append(originals[point_id])
+            entry["ids"].append(originals[point_id])
+
+        for point, vector in zip(points, vectors):
+            payload = point.payload or {}
+            for key in payload:
+                if key not in self.codes and key not in self._raw_index:
+                    self._add_key(key, raw=key in self.raw_fields)
+
+            row = self.rows[str(point.id)]
+            self._vectors[row] = vector
+            for column in self.codes.values():
+                column[row] = 0
+            for index in self._raw_index.values():
+                index[row] = (0, 0)
+            for key, value in payload.items():
+                if key in self._raw_index:
+                    self._write_raw(key, row, value)
+                else:
+                    self.codes[key][row] = self._encode(key, value, entry) + 1
+            self._alive[row] = 1
+
+        self._row_index.clear()
+        if entry["ids"] or entry["vocab"]:
+            self._pending.append(entry)
+
+    def delete(self, rows: np.ndarray) -> None:
+        rows = [int(row) for row in rows]
+        for row in rows:
+            self._alive[row] = 0
+            self.rows.pop(str(self.ids[row]), None)
+        self._row_index.clear()
+        if rows:
+            self._pending.append({"deleted": rows})
+
+    def vacuum(self) -> int:
+        """Rewrite the live rows into the next generation; returns the number of rows reclaimed"""
+        live = np.array(sorted(self.rows.values()), dtype=np.int64)
+        reclaimed = len(self.ids) - len(live)
+        if not reclaimed:
+            return 0
+
+        capacity = INITIAL_CAPACITY
+        while capacity < len(live):
+            capacity *= 2
+        meta = {**self.meta, "generation": self.meta["generation"] + 1, "capacity": capacity}
+        directory = self.path / f"g{meta['generation']}"
+        if directory.exists():
+            shutil.rmtree(directory)  # Left over from an interrupted vacuum
+        self._size_files(directory, meta)
+
+        entry: Dict = {"ids": [self.ids[row] for row in live], "vocab": {}}
+        target = _Collection(self.path, self.raw_fields, meta=meta)
+        target._vectors[:len(live)] = self._vectors[live]
+        target._alive[:len(live)] = 1
+        for key, column in self.codes.items():
+            codes = np.asarray(column[live])
+            used = np.unique(codes[codes > 0])
+            target.codes[key][:len(live)] = np.where(codes > 0, np.searchsorted(used, codes) + 1, 0)
+            entry["vocab"][key] = [self.vocab[key][code - 1] for code in used.tolist()]
+        for key in self._raw_index:
+            for new_row, row in enumerate(live.tolist()):
+                value = self._raw_value(key, row)
+                if value is not _MISSING:
+                    target._write_raw(key, new_row, value)
+        target._pending.append(entry)
+        target.save()
+        target.close()
+        del target
+
+        old_directory = self._dir
+        self._write_meta(self.path, meta)
+        shutil.rmtree(old_directory)  # Readers elsewhere keep their open maps until they see the new generation
+        self._load()
+        return reclaimed
+
+    # --- Reads ------------------------------------------------------------- #
+
+    def _rows_for(self, key: str, code: int) -> np.ndarray:
+        """Row index for an indexed payload field (e.g. all rows of one child)"""
+        index = self._row_index.get(key)
+        if index is None:
+            column = np.asarray(self.codes[key][:len(self.ids)])
+            order = np.argsort(column, kind="stable")
+            values, starts = np.unique(column[order], return_index=True)
+            index = {int(v): rows for v, rows in zip(values, np.split(order, starts[1:]))}
+            self._row_index[key] = index
+        return index.get(code, np.zeros(0, dtype=np.int64))
+
+    def _condition_mask(self, condition, rows: np.ndarray) -> np.ndarray:
+        if not isinstance(condition, FieldCondition) or condition.match is None:
+            raise NotImplementedError(f"Unsupported filter condition: {condition!r}")
+        if isinstance(condition.match, MatchValue):
+            values = [condition.match.value]
+        elif isinstance(condition.match, MatchAny):
+            values = condition.match.any
+        else:
+            raise NotImplementedError(f"Unsupported match: {condition.match!r}")
+        if condition.key in self._raw_index:
+            # Not dictionary-encoded: compare the stored values row by row
+            return np.array([self._raw_value(condition.key, row) in values for row in rows.tolist()], dtype=bool)
+        column = self.codes.get(condition.key)
+        if column is None:
+            return np.zeros(len(rows), dtype=bool)
+        wanted = [c for c in (self._code_of(condition.key, v) for v in values) if c is not None]
+        return np.isin(column[rows], wanted)
+
+    @staticmethod
+    def _conditions(conditions) -> List:
+        if conditions is None:
+            return []
+        return list(conditions) if isinstance(conditions, list) else [conditions]
+
+    def select(self, query_filter: Optional[Filter]) -> np.ndarray:
+        """Return the live rows matching a filter, in insertion order"""
+        query_filter = query_filter or Filter()
+        if query_filter.should or query_filter.min_should:
+            raise NotImplementedError("'should' filters are not supported by the NumPy store")
+        must = self._conditions(query_filter.must)
+
+        # Start from a row index when the filter pins an indexed field
+        rows = None
+        for condition in must:
+            if (
+                isinstance(condition, FieldCondition)
+                and condition.key in self.meta["indexes"]
+                and condition.key in self.codes
+                and isinstance(condition.match, MatchValue)
+            ):
+                code = self._code_of(condition.key, condition.match.value)
+                rows = self._rows_for(condition.key, code) if code is not None else np.zeros(0, dtype=np.int64)
+                must.remove(condition)
+                break
+        if rows is None:
+            rows = np.arange(len(self.ids))
+
+        rows = rows[self._alive[rows] == 1]
+        for condition in must:
+            rows = rows[self._condition_mask(condition, rows)]
+        for condition in self._conditions(query_filter.must_not):
+            rows = rows[~self._condition_mask(condition, rows)]
+        return rows
+
+    def scores(self, rows: np.ndarray, query: Sequence[float]) -> np.ndarray:
+        q = np.asarray(query, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm > 0:
+            q = q / norm
+        block = self._vectors[rows]
+        if self.meta["quantization"] == "int8":
+            return (block.astype(np.float32) @ q) / INT8_SCALE
+        return block @ q
+
+
+class NumpyVectorStore:
+    """
+    Qdrant-compatible vector store backed by NumPy memory maps.
+    Implements the subset of the QdrantClient API that qdrant_manager uses,
+    with brute-force cosine top-k over per-child row indexes. Several
+    processes may open the same path: reads share the mapped pages, and
+    writes are serialized with a file lock.
+    """
+
+    def __init__(self, path: str, quantization: str = "float32", raw_fields: Sequence[str] = RAW_FIELDS):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.quantization = quantization
+        self.raw_fields = tuple(raw_fields)
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.path / ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _collection(self, collection_name: str) -> _Collection:
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            path = self.path / collection_name
+            if not (path / "meta.json").exists():
+                raise ValueError(f"Collection {collection_name} not found")
+            collection = _Collection(path, self.raw_fields)
+            self._collections[collection_name] = collection
+        else:
+            collection.refresh()
+        return collection
+
+    @contextmanager
+    def _writing(self, collection_name: str):
+        with self._lock, self._file_lock():
+            collection = self._collection(collection_name)
+            try:
+                yield collection
+            except Exception:
+                # Throw away the half-applied change
+                collection.reload()
+                raise
+            collection.save()
+
+    @staticmethod
+    def _done() -> UpdateResult:
+        return UpdateResult(operation_id=0, status=UpdateStatus.COMPLETED)
+
+    # --- Collections ------------------------------------------------------- #
+
+    @staticmethod
+    def _is_collection(path: Path) -> bool:
+        return (path / "meta.json").exists()
+
+    def get_collections(self) -> CollectionsResponse:
+        names = sorted(p.name for p in self.path.iterdir() if self._is_collection(p))
+        return CollectionsResponse(collections=[CollectionDescription(name=n) for n in names])
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return self._is_collection(self.path / collection_name)
+
+    def create_collection(self, collection_name: str, vectors_config, **kwargs) -> bool:
+        with self._lock, self._file_lock():
+            self._collections[collection_name] = _Collection.create(
+                self.path / collection_name,
+                size=vectors_config.size,
+                quantization=self.quantization,
+                raw_fields=self.raw_fields,
+            )
+        return True
+
+    def delete_collection(self, collection_name: str, **kwargs) -> bool:
+        with self._lock, self._file_lock():
+            collection = self._collections.pop(collection_name, None)
+            if collection is not None:
+                collection.close()
+            path = self.path / collection_name
+            if not path.exists():
+                return False
+            shutil.rmtree(path)
+        return True
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, **kwargs) -> UpdateResult:
+        with self._writing(collection_name) as collection:
+            if field_name not in collection.meta["indexes"]:
+                collection.meta["indexes"].append(field_name)
+                collection._meta_dirty = True
+        return self._done()
+
+    # --- Points ------------------------------------------------------------ #
+
+    def upsert(self, collection_name: str, points, **kwargs) -> UpdateResult:
+        with self._writing(collection_name) as collection:
+            collection.upsert(points)
+        return self._done()
+
+    def delete(self, collection_name: str, points_selector, **kwargs) -> UpdateResult:
+        with self._writing(collection_name) as collection:
+            if isinstance(points_selector, (FilterSelector, Filter)):
+                query_filter = points_selector.filter if isinstance(points_selector, FilterSelector) else points_selector
+                rows = collection.select(query_filter)
+            else:
+                ids = points_selector.points if isinstance(points_selector, PointIdsList) else points_selector
+                rows = np.array([collection.rows[str(i)] for i in ids if str(i) in collection.rows], dtype=np.int64)
+            collection.delete(rows)
+        return self._done()
+
+    def vacuum(self, collection_name: str) -> int:
+        """Reclaim the space of deleted points (e.g. after compaction); returns the rows reclaimed"""
+        with self._lock, self._file_lock():
+            return self._collection(collection_name).vacuum()
+
+    def _record(self, collection: _Collection, row: int, with_payload, with_vectors) -> Record:
+        return Record(
+            id=collection.ids[row],
+            payload=collection.payload(row, with_payload),
+            vector=collection.vector(row) if with_vectors else None,
+        )
+
+    def retrieve(self, collection_name: str, ids, with_payload=True, with_vectors=False, **kwargs) -> List[Record]:
+        with self._lock:
+            collection = self._collection(collection_name)
+            rows = [collection.rows[str(i)] for i in ids if str(i) in collection.rows]
+            return [self._record(collection, row, with_payload, with_vectors) for row in rows]
+
+    def count(self, collection_name: str, count_filter: Optional[Filter] = None, exact: bool = True, **kwargs) -> CountResult:
+        with self._lock:
+            return CountResult(count=len(self._collection(collection_name).select(count_filter)))
+
+    def scroll(
+        self,
+        collection_name: str,
+        scroll_filter: Optional[Filter] = None,
+        limit: int = 10,
+        offset=None,
+        with_payload=True,
+        with_vectors=False,
+        **kwargs,
+    ):
+        with self._lock:
+            collection = self._collection(collection_name)
+            rows = collection.select(scroll_filter)
+            if offset is not None:
+                start = collection.rows.get(str(offset))
+                rows = rows[rows >= start] if start is not None else rows[:0]
+            page = rows[:limit]
+            next_offset = collection.ids[rows[limit]] if len(rows) > limit else None
+            return [self._record(collection, row, with_payload, with_vectors) for row in page], next_offset
+
+    def query_points(
+        self,
+        collection_name: str,
+        query=None,
+        query_filter: Optional[Filter] = None,
+        limit: int = 10,
+        with_payload=True,
+        with_vectors=False,
+        score_threshold: Optional[float] = None,
+        **kwargs,
+    ) -> QueryResponse:
+        with self._lock:
+            collection = self._collection(collection_name)
+            rows = collection.select(query_filter)
+            if query is None:
+                top, scores = rows[:limit], np.zeros(min(limit, len(rows)), dtype=np.float32)
+            else:
+                scores = collection.scores(rows, query)
+                if score_threshold is not None:
+                    keep = scores >= score_threshold
+                    rows, scores = rows[keep], scores[keep]
+                if len(rows) > limit:
+                    best = np.argpartition(-scores, limit - 1)[:limit]
+                    rows, scores = rows[best], scores[best]
+                order = np.argsort(-scores, kind="stable")
+                top, scores = rows[order], scores[order]
+
+            return QueryResponse(points=[
+                ScoredPoint(
+                    id=collection.ids[row],
+                    version=0,
+                    score=float(score),
+                    payload=collection.payload(row, with_payload),
+                    vector=collection.vector(row) if with_vectors else None,
+                )
+                for row, score in zip(top, scores)
+            ])
+
+    def query_batch_points(self, collection_name: str, requests, **kwargs) -> List[QueryResponse]:
+        return [
+            self.query_points(
+                collection_name,
+                query=request.query,
+                query_filter=request.filter,
+                limit=request.limit or 10,
+                with_payload=request.with_payload if request.with_payload is not None else False,
+                with_vectors=bool(request.with_vector),
+                score_threshold=request.score_threshold,
+            )
+            for request in requests
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
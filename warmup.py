@@ -0,0 +1,146 @@
+"""
+Audio warm-up for EchoMind
+Pre-renders speech for common phrases into the audio cache so the first tap
+on a fresh process is as fast as every later one
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import tts
+from phrases import CATEGORY_CONFIGS, OFFLINE_PHRASES
+from resilience import RateLimiter
+
+WARMUP_PHRASES_FILE = Path(os.getenv("TTS_WARMUP_FILE", Path(__file__).resolve().parent / "warmup_phrases.json"))
+WARMUP_CHILDREN = [c.strip() for c in os.getenv("TTS_WARMUP_CHILDREN", "demo_child").split(",") if c.strip()]
+WARMUP_AT_STARTUP = os.getenv("TTS_WARMUP_AT_STARTUP", "0") == "1"
+WARMUP_WORKERS = int(os.getenv("TTS_WARMUP_WORKERS", "4"))
+WARMUP_RPM = float(os.getenv("TTS_WARMUP_RPM", "60"))  # Backend calls per minute; cache hits are free
+WARMUP_TOP_LIMIT = 5
+
+_warmup_thread: Optional[threading.Thread] = None
+
+
+def _load_phrase_file(path: Path) -> Dict[str, List[str]]:
+    """Load the language -> phrases list of extra phrases to warm up"""
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"Error reading warm-up phrases file: {e}")
+        return {}
+
+
+def collect_phrases(
+    languages: Iterable[str] = CATEGORY_CONFIGS,
+    child_ids: Iterable[str] = WARMUP_CHILDREN,
+    phrase_file: Path = WARMUP_PHRASES_FILE,
+) -> List[Tuple[str, str]]:
+    """Unique (text, language) pairs: offline phrases, each child's top phrases, then the phrase file"""
+    languages, child_ids = list(languages), list(child_ids)
+    collected: Dict[Tuple[str, str], None] = {}
+
+    for language in languages:
+        for phrases in OFFLINE_PHRASES.get(language, {}).values():
+            for phrase in phrases:
+                collected[(phrase["text"], language)] = None
+
+    if child_ids:
+        try:
+            # Imported here so a locked local Qdrant store only costs the personalized phrases
+            import qdrant_manager
+
+            for language in languages:
+                for category in CATEGORY_CONFIGS.get(language, {}):
+                    for child_id in child_ids:
+                        for text in qdrant_manager.get_top_phrases_in_category(child_id, category, limit=WARMUP_TOP_LIMIT):
+                            collected[(text, language)] = None
+        except Exception as e:
+            print(f"Warm-up skipping personalized phrases: {e}")
+
+    configured = _load_phrase_file(phrase_file)
+    for language in languages:
+        for text in configured.get(language, []):
+            collected[(text, language)] = None
+
+    return [(text, language) for text, language in collected if text and text.strip()]
+
+
+def warm_up(
+    phrases: List[Tuple[str, str]],
+    workers: int = WARMUP_WORKERS,
+    per_minute: float = WARMUP_RPM,
+) -> Dict[str, float]:
+    """Synthesize every (text, language) into the audio cache; returns counts and elapsed seconds"""
+    limiter = RateLimiter("tts-warmup", per_minute, burst=workers)
+    # A background job can wait as long as the whole run takes at the paced rate
+    max_wait = 60 + (len(phrases) * 60 / per_minute if per_minute > 0 else 0)
+    counts = {"phrases": len(phrases), "cached": 0, "synthesized": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def render(text: str, language: str) -> None:
+        if tts.synthesizer.cached(text, language) is not None:
+            outcome = "cached"
+        else:
+            try:
+                # Only backend calls are paced
+                limiter.acquire(timeout=max_wait)
+                tts.synthesize(text, language)
+                outcome = "synthesized"
+            except Exception as e:
+                print(f"Warm-up failed for {text!r} ({language}): {e}")
+                outcome = "failed"
+        with lock:
+            counts[outcome] += 1
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="tts-warmup") as executor:
+        for text, language in phrases:
+            executor.submit(render, text, language)
+    counts["seconds"] = round(time.monotonic() - started, 2)
+    print(
+        f"Audio warm-up: {counts['synthesized']} synthesized, {counts['cached']} already cached, "
+        f"{counts['failed']} failed in {counts['seconds']}s"
+    )
+    return counts
+
+
+def start_warm_up(**collect_kwargs) -> None:
+    """Collect and warm up phrases on a daemon thread (once per process)"""
+    global _warmup_thread
+    if _warmup_thread is not None:
+        return
+
+    def run():
+        try:
+            warm_up(collect_phrases(**collect_kwargs))
+        except Exception as e:
+            print(f"Error warming up audio: {e}")
+
+    _warmup_thread = threading.Thread(target=run, name="tts-warmup", daemon=True)
+    _warmup_thread.start()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-render speech for common phrases into the audio cache")
+    parser.add_argument("--language", action="append", choices=list(CATEGORY_CONFIGS), help="language to warm up (repeatable; default all)")
+    parser.add_argument("--child", action="append", help="child whose top phrases to warm up (repeatable; default TTS_WARMUP_CHILDREN)")
+    parser.add_argument("--file", type=Path, default=WARMUP_PHRASES_FILE, help="JSON file of extra phrases per language")
+    parser.add_argument("--workers", type=int, default=WARMUP_WORKERS, help="concurrent synthesis jobs")
+    parser.add_argument("--rpm", type=float, default=WARMUP_RPM, help="backend calls per minute (0 = unlimited)")
+    args = parser.parse_args()
+
+    phrases = collect_phrases(
+        languages=args.language or CATEGORY_CONFIGS,
+        child_ids=WARMUP_CHILDREN if args.child is None else args.child,
+        phrase_file=args.file,
+    )
+    warm_up(phrases, workers=args.workers, per_minute=args.rpm)